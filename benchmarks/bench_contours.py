@@ -0,0 +1,102 @@
+"""Поиск контуров: findContours + approxPolyDP против субпиксельных изолиний
+
+Для каждого уровня яркости findContours получает изображение, бинаризованное
+по этому уровню, изолинии - само изображение стиля. Эталон качества - все
+границы бинаризованного изображения (как в автоподборе).
+
+Запуск из корня проекта:
+    python -m benchmarks.bench_contours image.jpg [--styles sketch pencil] [--levels 128]
+"""
+import argparse
+import time
+
+import cv2
+import numpy as np
+
+from core.auto_tuner import fidelity_score, rasterize_contours, reference_mask
+from core.image_processor import ImageProcessor
+from core.path_set import PathSet
+from core.style_converter import StyleConverter
+from utils.config import AppConfig
+
+
+def extract(processor, gray, levels):
+    """Контуры всех уровней и время поиска вместе с упрощением"""
+    start = time.perf_counter()
+    if processor.uses_isolines():
+        paths = processor.find_contours(gray)
+    else:
+        paths = PathSet.concatenate([processor.find_contours(np.where(gray > level, 255, 0)
+                                                             .astype(np.uint8))
+                                     for level in levels])
+    return paths, time.perf_counter() - start
+
+
+def measure(processor, gray, levels, reference, repeat, tolerance):
+    """Лучшее время из repeat повторов, размер результата и качество"""
+    best = float('inf')
+    for _ in range(repeat):
+        paths, elapsed = extract(processor, gray, levels)
+        best = min(best, elapsed)
+    drawn = rasterize_contours(paths, gray.shape, closed=processor.contours_closed())
+    return {
+        'contours': len(paths),
+        'points': len(paths.points),
+        'time': best,
+        'fidelity': fidelity_score(reference, drawn, tolerance)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк поиска контуров")
+    parser.add_argument("image", help="Путь к изображению")
+    parser.add_argument("--styles", nargs="+", help="Стили (по умолчанию все растровые)")
+    parser.add_argument("--levels", nargs="+", type=float, default=[128],
+                        help="Уровни яркости изолиний")
+    parser.add_argument("--smoothing", type=float,
+                        default=AppConfig.IMAGE_CONFIG["iso_smoothing"],
+                        help="Сигма размытия перед изолиниями, пиксели")
+    parser.add_argument("--min-length", type=float,
+                        default=AppConfig.IMAGE_CONFIG["min_contour_length"],
+                        help="Минимальная длина контура, пиксели")
+    parser.add_argument("--repeat", type=int, default=5, help="Повторов на замер")
+    parser.add_argument("--tolerance", type=float, default=2, help="Допуск качества, пиксели")
+    args = parser.parse_args()
+
+    config = AppConfig.IMAGE_CONFIG.copy()
+    config['GCODE_CONFIG'] = AppConfig.GCODE_CONFIG
+    config['STYLE_CONFIG'] = AppConfig.STYLE_CONFIG
+    config['iso_levels'] = tuple(args.levels)
+    config['iso_smoothing'] = args.smoothing
+    config['min_contour_length'] = args.min_length
+    processors = {
+        name: ImageProcessor(None, {**config, 'contour_extractor': name})
+        for name in ("findContours", "isolines")
+    }
+    try:
+        image = processors["findContours"].load_image(args.image)
+    except ValueError as e:
+        raise SystemExit(str(e))
+
+    styles = args.styles or [style for style in StyleConverter.STYLES
+                             if style not in StyleConverter.VECTOR_STYLES]
+    print(f"Изображение {image.shape[1]}x{image.shape[0]}, уровни {args.levels}, "
+          f"epsilon_factor {config['epsilon_factor']}, мин. длина {args.min_length}")
+    print(f"{'стиль':14s} {'способ':13s} {'контуров':>9s} {'точек':>8s} {'время':>10s} "
+          f"{'качество':>9s}")
+    for style in styles:
+        styled = processors["findContours"].apply_style(image, style)
+        gray = styled if styled.ndim == 2 else cv2.cvtColor(styled, cv2.COLOR_BGR2GRAY)
+        reference = np.zeros(gray.shape, dtype=np.uint8)
+        for level in args.levels:
+            reference |= reference_mask(np.where(gray > level, 255, 0).astype(np.uint8))
+
+        for name, processor in processors.items():
+            result = measure(processor, gray, args.levels, reference, args.repeat,
+                             args.tolerance)
+            print(f"{style:14s} {name:13s} {result['contours']:9d} {result['points']:8d} "
+                  f"{result['time'] * 1000:7.1f} мс {result['fidelity']:9.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+"""Замер времени и выделений памяти стилей: холодный пул против прогретого
+
+Запуск из корня проекта:
+    python -m benchmarks.bench_styles image.jpg [--repeat 20] [--size 1000]
+"""
+import argparse
+import time
+import tracemalloc
+
+import cv2
+
+from core.buffer_pool import BufferPool
+from core.style_converter import StyleConverter
+from utils.helpers import resize_to_fit
+
+
+def measure(converter, style, image, repeat, fresh_pool):
+    """Среднее время и пиковый прирост памяти за вызов (в байтах)"""
+    total_time = 0.0
+    peak_growth = 0
+    for _ in range(repeat):
+        if fresh_pool:
+            converter.pool = BufferPool()
+        tracemalloc.reset_peak()
+        start_memory = tracemalloc.get_traced_memory()[0]
+        start = time.perf_counter()
+        result = converter.styles[style](image)
+        total_time += time.perf_counter() - start
+        peak_growth = max(peak_growth, tracemalloc.get_traced_memory()[1] - start_memory)
+        del result
+    return total_time / repeat, peak_growth
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк стилей обработки")
+    parser.add_argument("image", help="Путь к изображению")
+    parser.add_argument("--repeat", type=int, default=20, help="Вызовов на стиль")
+    parser.add_argument("--size", type=int, default=1000, help="Длинная сторона, px")
+    args = parser.parse_args()
+
+    image = cv2.imread(args.image)
+    if image is None:
+        raise SystemExit(f"Не удалось загрузить изображение: {args.image}")
+    image = resize_to_fit(image, args.size)
+    result_bytes = image.shape[0] * image.shape[1]
+
+    converter = StyleConverter(pool=BufferPool())
+    tracemalloc.start()
+    print(f"Изображение {image.shape[1]}x{image.shape[0]}, результат {result_bytes / 1024:.0f} КБ")
+    print(f"{'стиль':14s} {'холодный':>20s} {'прогретый':>20s} {'новых буферов':>14s}")
+    for style in converter.styles:
+        cold_time, cold_peak = measure(converter, style, image, args.repeat, True)
+
+        converter.pool = BufferPool()
+        converter.styles[style](image)
+        allocations = converter.pool.allocations
+        warm_time, warm_peak = measure(converter, style, image, args.repeat, False)
+        new_buffers = converter.pool.allocations - allocations
+
+        print(f"{style:14s} {cold_time * 1000:7.1f} мс {cold_peak / 1024:7.0f} КБ "
+              f"{warm_time * 1000:7.1f} мс {warm_peak / 1024:7.0f} КБ {new_buffers:14d}")
+    tracemalloc.stop()
+
+
+if __name__ == "__main__":
+    main()
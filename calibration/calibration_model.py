@@ -0,0 +1,206 @@
+import csv
+import json
+import numpy as np
+
+FORMAT_NAME = "drawlerximik-calibration"
+FORMAT_VERSION = 1
+
+
+def load_points_csv(path):
+    """Читает точки, сохранённые CalibrationGUI.save_csv (mm_x, mm_y, steps_x, steps_y)"""
+    points_mm = []
+    points_steps = []
+    with open(path, newline='') as f:
+        for row in csv.DictReader(f):
+            points_mm.append((float(row["mm_x"]), float(row["mm_y"])))
+            points_steps.append((float(row["steps_x"]), float(row["steps_y"])))
+    return np.array(points_mm, dtype=np.float64), np.array(points_steps, dtype=np.float64)
+
+
+def _fit_affine(src, dst):
+    """Аффинная матрица 3x3 методом наименьших квадратов"""
+    design = np.column_stack([src, np.ones(len(src))])
+    solution, *_ = np.linalg.lstsq(design, dst, rcond=None)
+    matrix = np.eye(3)
+    matrix[:2, :] = solution.T
+    return matrix
+
+
+def _fit_homography(src, dst):
+    """Гомография 3x3 (DLT с нормализацией точек)"""
+    def normalizer(points):
+        center = points.mean(axis=0)
+        spread = np.sqrt(((points - center) ** 2).sum(axis=1)).mean() or 1.0
+        s = np.sqrt(2) / spread
+        return np.array([[s, 0, -s * center[0]], [0, s, -s * center[1]], [0, 0, 1]])
+
+    t_src = normalizer(src)
+    t_dst = normalizer(dst)
+    src_n = _project(t_src, src)
+    dst_n = _project(t_dst, dst)
+
+    x, y = src_n[:, 0], src_n[:, 1]
+    u, v = dst_n[:, 0], dst_n[:, 1]
+    zeros = np.zeros_like(x)
+    ones = np.ones_like(x)
+    rows_u = np.column_stack([x, y, ones, zeros, zeros, zeros, -u * x, -u * y, -u])
+    rows_v = np.column_stack([zeros, zeros, zeros, x, y, ones, -v * x, -v * y, -v])
+    _, _, vt = np.linalg.svd(np.vstack([rows_u, rows_v]))
+    h_n = vt[-1].reshape(3, 3)
+
+    matrix = np.linalg.inv(t_dst) @ h_n @ t_src
+    return matrix / matrix[2, 2]
+
+
+def _project(matrix, points):
+    """Применяет матрицу 3x3 ко всем точкам (N, 2) за один вызов"""
+    projected = points @ matrix[:2, :2].T + matrix[:2, 2]
+    if matrix[2, 0] or matrix[2, 1]:
+        w = points @ matrix[2, :2] + matrix[2, 2]
+        projected /= w[:, None]
+    return projected
+
+
+def _poly_terms(points, degree):
+    """Мономы x^i * y^j степени 2..degree для поправки нелинейности"""
+    x, y = points[:, 0], points[:, 1]
+    terms = [x ** i * y ** (d - i) for d in range(2, degree + 1) for i in range(d + 1)]
+    if not terms:
+        return np.zeros((len(points), 0))
+    return np.column_stack(terms)
+
+
+class CalibrationModel:
+    """Модель калибровки мм → координаты станка: матрица, нелинейность и люфт"""
+
+    def __init__(self, matrix=None, transform="affine", degree=1, poly_coeffs=None,
+                 norm_center=(0.0, 0.0), norm_scale=1.0, backlash=(0.0, 0.0)):
+        self.matrix = np.eye(3) if matrix is None else np.asarray(matrix, dtype=np.float64)
+        self.transform = transform
+        self.degree = degree
+        self.poly_coeffs = (np.zeros((0, 2)) if poly_coeffs is None
+                            else np.asarray(poly_coeffs, dtype=np.float64).reshape(-1, 2))
+        self.norm_center = np.asarray(norm_center, dtype=np.float64)
+        self.norm_scale = float(norm_scale)
+        self.backlash = np.asarray(backlash, dtype=np.float64)
+
+    @classmethod
+    def fit(cls, points_mm, points_steps, transform="affine", degree=1, backlash=(0.0, 0.0)):
+        """Подгоняет модель по парам точек (мм → шаги)"""
+        src = np.asarray(points_mm, dtype=np.float64).reshape(-1, 2)
+        dst = np.asarray(points_steps, dtype=np.float64).reshape(-1, 2)
+        min_points = 4 if transform == "homography" else 3
+        if len(src) < min_points:
+            raise ValueError(f"Недостаточно точек для модели '{transform}': "
+                             f"{len(src)} < {min_points}")
+
+        if transform == "homography":
+            matrix = _fit_homography(src, dst)
+        elif transform == "affine":
+            matrix = _fit_affine(src, dst)
+        else:
+            raise ValueError(f"Неизвестный тип преобразования: {transform}")
+
+        model = cls(matrix, transform, degree, backlash=backlash)
+        model.norm_center = src.mean(axis=0)
+        model.norm_scale = float(np.abs(src - model.norm_center).max()) or 1.0
+
+        # Остаточная нелинейность - полиномиальная поправка по обеим осям
+        if degree >= 2:
+            terms = _poly_terms(model._normalize(src), degree)
+            if len(src) <= terms.shape[1] + 2:
+                raise ValueError(f"Недостаточно точек для нелинейности степени {degree}")
+            residuals = dst - _project(matrix, src)
+            model.poly_coeffs, *_ = np.linalg.lstsq(terms, residuals, rcond=None)
+        return model
+
+    @classmethod
+    def from_csv(cls, path, **kwargs):
+        """Подгоняет модель по CSV из CalibrationGUI"""
+        points_mm, points_steps = load_points_csv(path)
+        return cls.fit(points_mm, points_steps, **kwargs)
+
+    def _normalize(self, points):
+        return (points - self.norm_center) / self.norm_scale
+
+    def _map(self, flat):
+        """Матрица и нелинейность для точек (N, 2), без люфта"""
+        result = _project(self.matrix, flat)
+        if self.poly_coeffs.size:
+            result += _poly_terms(self._normalize(flat), self.degree) @ self.poly_coeffs
+        return result
+
+    def apply(self, points, initial_direction=(0, 0)):
+        """Преобразует весь путь (N, 2) или (N, 1, 2) в координаты станка"""
+        return self.apply_directed(points, initial_direction)[0]
+
+    def apply_directed(self, points, initial_direction=(0, 0)):
+        """apply() и направление движения по осям в конце пути
+
+        Направление - начальное для следующего пути: люфт зависит от того,
+        куда ось двигалась до него.
+        """
+        points = np.asarray(points, dtype=np.float64)
+        shape = points.shape
+        result = self._map(points.reshape(-1, 2))
+        final_direction = list(initial_direction)
+
+        # Компенсация люфта: смещение на половину люфта в сторону движения
+        if self.backlash.any() and len(result):
+            for axis in range(2):
+                if self.backlash[axis] == 0:
+                    continue
+                direction = self._directions(result[:, axis], initial_direction[axis])
+                result[:, axis] += direction * (self.backlash[axis] / 2.0)
+                final_direction[axis] = direction[-1]
+        return result.reshape(shape), tuple(final_direction)
+
+    @staticmethod
+    def _directions(values, initial):
+        """Направление движения в каждой точке (последний ненулевой знак приращения)"""
+        steps = np.sign(np.diff(values))
+        indices = np.where(steps != 0, np.arange(len(steps)), -1)
+        indices = np.maximum.accumulate(indices)
+        directions = np.where(indices >= 0, steps[np.maximum(indices, 0)], initial)
+        return np.concatenate([[initial], directions])
+
+    def residuals(self, points_mm, points_steps):
+        """Ошибка модели на контрольных точках (в шагах)
+
+        Люфт не учитывается: контрольные точки - не путь, направления у них нет.
+        """
+        predicted = self._map(np.asarray(points_mm, dtype=np.float64).reshape(-1, 2))
+        return np.asarray(points_steps, dtype=np.float64).reshape(-1, 2) - predicted
+
+    def to_dict(self):
+        return {
+            "format": FORMAT_NAME,
+            "version": FORMAT_VERSION,
+            "transform": self.transform,
+            "matrix": self.matrix.tolist(),
+            "degree": self.degree,
+            "poly_coeffs": self.poly_coeffs.tolist(),
+            "norm_center": self.norm_center.tolist(),
+            "norm_scale": self.norm_scale,
+            "backlash": self.backlash.tolist()
+        }
+
+    def save(self, path):
+        """Сохраняет модель в JSON с версией формата"""
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.to_dict(), f, indent=2)
+
+    @classmethod
+    def load(cls, path):
+        """Загружает модель, проверяя формат и версию"""
+        with open(path, encoding='utf-8') as f:
+            data = json.load(f)
+        if data.get("format") != FORMAT_NAME:
+            raise ValueError(f"Файл не является моделью калибровки: {path}")
+        if data.get("version", 0) > FORMAT_VERSION:
+            raise ValueError(f"Неподдерживаемая версия модели калибровки: {data.get('version')}")
+        return cls(matrix=data["matrix"], transform=data.get("transform", "affine"),
+                   degree=data.get("degree", 1), poly_coeffs=data.get("poly_coeffs"),
+                   norm_center=data.get("norm_center", (0.0, 0.0)),
+                   norm_scale=data.get("norm_scale", 1.0),
+                   backlash=data.get("backlash", (0.0, 0.0)))
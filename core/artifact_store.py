@@ -0,0 +1,171 @@
+import hashlib
+import json
+import os
+import sqlite3
+import tempfile
+import time
+from contextlib import closing
+from pathlib import Path
+
+_CHUNK = 1024 * 1024
+
+
+def hash_file(path):
+    """SHA-256 содержимого файла (читается кусками)"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(_CHUNK), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def verify_object(path):
+    """Файл хранилища цел: есть на диске и его хеш совпадает с именем"""
+    path = Path(path)
+    return path.exists() and hash_file(path) == path.stem
+
+
+def hash_params(params):
+    """Стабильный хеш параметров: JSON с сортировкой ключей"""
+    text = json.dumps(params, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+class ArtifactStore:
+    """Хранилище файлов по хешу содержимого
+
+    Файл лежит в objects/ab/cd/<sha256>.<ext> - два уровня каталогов держат
+    их размер маленьким и при сотнях тысяч файлов. Запись атомарная:
+    временный файл в том же разделе и os.replace, поэтому параллельные
+    процессы не видят недописанных файлов, а одинаковое содержимое
+    хранится один раз. Готовый файл - только для чтения: его содержимое
+    и есть его имя.
+    """
+
+    def __init__(self, root):
+        self.root = Path(root)
+        self.objects = self.root / "objects"
+        self.tmp = self.root / "tmp"
+        self.objects.mkdir(parents=True, exist_ok=True)
+        self.tmp.mkdir(parents=True, exist_ok=True)
+
+    def path_for(self, digest, extension):
+        return self.objects / digest[:2] / digest[2:4] / f"{digest}.{extension}"
+
+    def _place(self, temp_path, target):
+        target.parent.mkdir(parents=True, exist_ok=True)
+        os.chmod(temp_path, 0o444)
+        os.replace(temp_path, target)
+
+    def temp_path(self, extension):
+        """Уникальный временный файл внутри хранилища (для записи потоком)"""
+        fd, path = tempfile.mkstemp(suffix=f".{extension}", dir=self.tmp)
+        os.close(fd)
+        return Path(path)
+
+    def ingest(self, temp_path, extension):
+        """Переносит готовый временный файл на место по его хешу, возвращает (хеш, путь)"""
+        digest = hash_file(temp_path)
+        target = self.path_for(digest, extension)
+        if verify_object(target):
+            os.remove(temp_path)   # Такое содержимое уже есть
+        else:
+            self._place(temp_path, target)   # Новый файл или замена испорченного
+        return digest, target
+
+    def put_bytes(self, data, extension):
+        digest = hashlib.sha256(data).hexdigest()
+        target = self.path_for(digest, extension)
+        if not verify_object(target):
+            temp_path = self.temp_path(extension)
+            with open(temp_path, 'wb') as f:
+                f.write(data)
+            self._place(temp_path, target)
+        return digest, target
+
+    def write(self, extension, writer):
+        """Пишет файл функцией writer(path) и кладёт его в хранилище"""
+        temp_path = self.temp_path(extension)
+        try:
+            writer(temp_path)
+            return self.ingest(temp_path, extension)
+        except BaseException:
+            if temp_path.exists():
+                os.remove(temp_path)
+            raise
+
+
+class JobIndex:
+    """Индекс заданий в SQLite: вход, параметры, время этапов и результаты
+
+    Соединение открывается на каждый вызов, поэтому индекс можно
+    использовать из разных потоков и процессов (журнал WAL).
+    """
+
+    def __init__(self, db_path):
+        self.db_path = str(db_path)
+        with closing(self._connect()) as conn, conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS jobs (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    job_key TEXT NOT NULL,
+                    input_hash TEXT NOT NULL,
+                    input_name TEXT,
+                    style TEXT,
+                    params TEXT NOT NULL,
+                    timings TEXT,
+                    outputs TEXT NOT NULL,
+                    summary TEXT,
+                    created REAL NOT NULL
+                )""")
+            conn.execute("CREATE INDEX IF NOT EXISTS jobs_key ON jobs (job_key)")
+            conn.execute("CREATE INDEX IF NOT EXISTS jobs_input ON jobs (input_hash)")
+
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    @staticmethod
+    def job_key(input_hash, params):
+        return hash_params({'input': input_hash, 'params': params})
+
+    def _row_to_job(self, row):
+        job = dict(row)
+        for key in ('params', 'timings', 'outputs', 'summary'):
+            job[key] = json.loads(job[key]) if job[key] else {}
+        return job
+
+    def lookup(self, job_key):
+        """Последнее задание с таким ключом, все результаты которого на диске и целы"""
+        with closing(self._connect()) as conn:
+            rows = conn.execute("SELECT * FROM jobs WHERE job_key = ? ORDER BY id DESC",
+                                (job_key,)).fetchall()
+        for row in rows:
+            job = self._row_to_job(row)
+            if all(verify_object(path) for path in job['outputs'].values()):
+                return job
+        return None
+
+    def record(self, job_key, input_hash, params, outputs, timings=None,
+               input_name=None, style=None, summary=None):
+        """Записывает задание; outputs - {имя: путь в хранилище}, summary - любые итоги"""
+        with closing(self._connect()) as conn, conn:
+            cursor = conn.execute(
+                "INSERT INTO jobs (job_key, input_hash, input_name, style, params, timings, "
+                "outputs, summary, created) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (job_key, input_hash, input_name, style,
+                 json.dumps(params, sort_keys=True, ensure_ascii=False, default=str),
+                 json.dumps(timings or {}),
+                 json.dumps({name: str(path) for name, path in outputs.items()}),
+                 json.dumps(summary or {}, ensure_ascii=False, default=str),
+                 time.time()))
+            return cursor.lastrowid
+
+    def jobs_for_input(self, input_hash):
+        """Все задания по одному исходному изображению (новые первыми)"""
+        with closing(self._connect()) as conn:
+            rows = conn.execute("SELECT * FROM jobs WHERE input_hash = ? ORDER BY id DESC",
+                                (input_hash,)).fetchall()
+        return [self._row_to_job(row) for row in rows]
@@ -0,0 +1,219 @@
+import argparse
+import itertools
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import cv2
+import numpy as np
+
+from .image_processor import ImageProcessor
+from .path_set import PathSet
+from .style_converter import StyleConverter
+from utils.helpers import estimate_gcode_time
+
+# Состояние процесса-воркера (заполняется в _init_worker)
+_worker = {}
+
+
+def rasterize_contours(contours, shape, thickness=1, closed=None):
+    """Рисует контуры так, как их нарисует плоттер (маска 0/255)
+
+    closed - как у GCodeGenerator: None - замкнуты пути с ненулевой площадью.
+    """
+    canvas = np.zeros(shape[:2], dtype=np.uint8)
+    paths = PathSet.from_contours(contours)
+    paths = paths.filter(paths.counts >= 2)
+    if not len(paths):
+        return canvas
+    rounded = PathSet(np.round(paths.points).astype(np.int32), paths.offsets)
+    if closed is None:
+        closed = rounded.geometry()['areas'] != 0
+    else:
+        closed = np.full(len(rounded), bool(closed))
+    # Замкнутые и открытые пути - по одному вызову на группу
+    for is_closed in (True, False):
+        group = rounded.filter(closed == is_closed)
+        if len(group):
+            cv2.polylines(canvas, group.to_contours(), is_closed, 255, thickness)
+    return canvas
+
+
+def reference_mask(processed_image):
+    """Эталон: все границы обработанного изображения без упрощения и фильтрации"""
+    contours, _ = cv2.findContours(processed_image, cv2.RETR_LIST, cv2.CHAIN_APPROX_NONE)
+    canvas = np.zeros(processed_image.shape[:2], dtype=np.uint8)
+    cv2.drawContours(canvas, contours, -1, 255, 1)
+    return canvas
+
+
+def fidelity_score(reference, drawn, tolerance=2):
+    """F1-мера совпадения линий с допуском tolerance пикселей (0..1)"""
+    ref_pixels = reference > 0
+    drawn_pixels = drawn > 0
+    if not ref_pixels.any() or not drawn_pixels.any():
+        return 0.0
+
+    # Расстояние до ближайшего пикселя линии
+    dist_to_ref = cv2.distanceTransform(np.where(ref_pixels, 0, 255).astype(np.uint8),
+                                        cv2.DIST_L2, 3)
+    dist_to_drawn = cv2.distanceTransform(np.where(drawn_pixels, 0, 255).astype(np.uint8),
+                                          cv2.DIST_L2, 3)
+
+    precision = float(np.mean(dist_to_ref[drawn_pixels] <= tolerance))
+    recall = float(np.mean(dist_to_drawn[ref_pixels] <= tolerance))
+    if precision + recall == 0:
+        return 0.0
+    return 2 * precision * recall / (precision + recall)
+
+
+def pareto_front(results):
+    """Оставляет недоминируемые варианты: меньше время и выше качество"""
+    front = []
+    best_fidelity = -1.0
+    for result in sorted(results, key=lambda r: (r['time'], -r['fidelity'])):
+        if result['fidelity'] > best_fidelity:
+            front.append(result)
+            best_fidelity = result['fidelity']
+    return front
+
+
+def _init_worker(image, style, base_config, tolerance, line_overhead):
+    """Загружает изображение и эталон один раз на процесс"""
+    _worker['image'] = image
+    _worker['style'] = style
+    _worker['base_config'] = base_config
+    _worker['tolerance'] = tolerance
+    _worker['line_overhead'] = line_overhead
+    _worker['styled'] = {}
+
+    processor = ImageProcessor(None, base_config)
+    _worker['reference'] = reference_mask(processor.apply_style(image, style))
+
+
+def _styled_image(style_params):
+    """Кэширует обработанное изображение для набора параметров стиля"""
+    key = tuple(sorted(style_params.items()))
+    if key not in _worker['styled']:
+        config = dict(_worker['base_config'])
+        config['STYLE_CONFIG'] = {**config.get('STYLE_CONFIG', {}), **style_params}
+        processor = ImageProcessor(None, config)
+        _worker['styled'][key] = processor.apply_style(_worker['image'], _worker['style'])
+    return _worker['styled'][key]
+
+
+def _evaluate(candidate):
+    """Оценивает один вариант параметров: время печати и качество"""
+    style_params = {k: v for k, v in candidate.items() if k in StyleConverter.DEFAULT_PARAMS}
+    config = dict(_worker['base_config'])
+    config.update({k: v for k, v in candidate.items() if k not in style_params})
+
+    processed_image = _styled_image(style_params)
+    processor = ImageProcessor(None, config)
+    contours = processor.find_contours(processed_image)
+    processor.fit_gcode_scale(processed_image)
+    gcode_commands = processor.gcode_generator.contours_to_gcode(contours)
+
+    gcode_config = processor.gcode_generator.config
+    stats = estimate_gcode_time(gcode_commands,
+                                default_feed=gcode_config['feed_rate_drawing'],
+                                line_overhead=_worker['line_overhead'])
+    drawn = rasterize_contours(contours, processed_image.shape,
+                               closed=processor.contours_closed())
+
+    return {
+        'params': candidate,
+        'time': stats['time'],
+        'fidelity': fidelity_score(_worker['reference'], drawn, _worker['tolerance']),
+        'contours_count': len(contours),
+        'commands_count': len(gcode_commands),
+        'draw_distance': stats['draw_distance'],
+        'travel_distance': stats['travel_distance']
+    }
+
+
+class AutoTuner:
+    """Перебирает параметры обработки и строит фронт Парето время/качество"""
+
+    def __init__(self, config, tune_config, style="sketch"):
+        self.config = config
+        self.tune_config = tune_config
+        self.style = style
+
+    def candidates(self):
+        """Все комбинации параметров из сетки"""
+        grid = dict(self.tune_config.get('grid', {}))
+        grid.update(self.tune_config.get('style_grid', {}).get(self.style, {}))
+        if not grid:
+            return [{}]
+        keys = sorted(grid)
+        return [dict(zip(keys, values)) for values in itertools.product(*(grid[k] for k in keys))]
+
+    def run(self, image):
+        """Оценивает все варианты параллельно, возвращает список результатов"""
+        candidates = self.candidates()
+        workers = self.tune_config.get('workers') or os.cpu_count() or 1
+        workers = min(workers, len(candidates))
+        init_args = (image, self.style, self.config,
+                     self.tune_config.get('tolerance', 2),
+                     self.tune_config.get('line_overhead', 0.0))
+
+        # Варианты с одинаковыми параметрами стиля идут подряд - кэш воркера срабатывает чаще
+        chunksize = max(1, len(candidates) // (workers * 4))
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=init_args) as executor:
+            return list(executor.map(_evaluate, candidates, chunksize=chunksize))
+
+    @staticmethod
+    def best_for_target(results, min_fidelity):
+        """Самый быстрый вариант с качеством не ниже заданного"""
+        suitable = [r for r in results if r['fidelity'] >= min_fidelity]
+        if not suitable:
+            return None
+        return min(suitable, key=lambda r: r['time'])
+
+
+def main():
+    from utils.config import AppConfig
+
+    parser = argparse.ArgumentParser(description="Автоподбор параметров обработки")
+    parser.add_argument("image", help="Путь к изображению")
+    parser.add_argument("--style", default="sketch", help="Стиль обработки")
+    parser.add_argument("--target", type=float, default=0.9, help="Минимальное качество (0..1)")
+    parser.add_argument("--workers", type=int, default=None, help="Число процессов")
+    parser.add_argument("--output", help="Сохранить результаты в JSON")
+    args = parser.parse_args()
+
+    config = AppConfig.IMAGE_CONFIG.copy()
+    config['GCODE_CONFIG'] = AppConfig.GCODE_CONFIG
+    config['STYLE_CONFIG'] = AppConfig.STYLE_CONFIG
+    tune_config = dict(AppConfig.AUTOTUNE_CONFIG)
+    if args.workers:
+        tune_config['workers'] = args.workers
+
+    try:
+        image = ImageProcessor(None, config).load_image(args.image)
+    except ValueError as e:
+        raise SystemExit(str(e))
+
+    tuner = AutoTuner(config, tune_config, args.style)
+    results = tuner.run(image)
+    front = pareto_front(results)
+    best = tuner.best_for_target(results, args.target)
+
+    print(f"Проверено вариантов: {len(results)}, на фронте Парето: {len(front)}")
+    for result in front:
+        print(f"  {result['time']:8.1f} с  качество {result['fidelity']:.3f}  {result['params']}")
+    if best:
+        print(f"Лучший для качества >= {args.target}: {best['params']} ({best['time']:.1f} с)")
+    else:
+        print(f"Нет вариантов с качеством >= {args.target}")
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump({'results': results, 'pareto_front': front, 'best': best},
+                      f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
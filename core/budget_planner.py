@@ -0,0 +1,184 @@
+import cv2
+import numpy as np
+from scipy.spatial import cKDTree
+from .path_set import PathSet
+from utils.helpers import move_time
+from utils.metrics import metrics
+
+# Соседей в первом запросе к KD-дереву при жадном обходе
+_NEIGHBORS = 8
+
+
+def greedy_path_order(starts, ends, origin=(0.0, 0.0)):
+    """Жадный обход путей: от конца текущего - к ближайшему началу непосещённого
+
+    Возвращает порядок индексов и длину холостых перемещений (мм), включая
+    подход от origin и возврат в origin.
+    """
+    count = len(starts)
+    if count == 0:
+        return np.zeros(0, dtype=np.int64), 0.0
+    tree = cKDTree(starts)
+    visited = np.zeros(count, dtype=bool)
+    order = np.empty(count, dtype=np.int64)
+    current = np.asarray(origin, dtype=np.float64)
+    travel = 0.0
+    for step in range(count):
+        k = _NEIGHBORS
+        nearest = -1
+        while k <= 256 and nearest < 0:
+            distances, indices = tree.query(current, k=min(k, count))
+            distances, indices = np.atleast_1d(distances), np.atleast_1d(indices)
+            free = ~visited[indices]
+            if free.any():
+                first = int(np.argmax(free))
+                nearest, distance = int(indices[first]), float(distances[first])
+            k *= 4
+        if nearest < 0:
+            # Все соседи уже посещены - полный перебор оставшихся
+            remaining = np.flatnonzero(~visited)
+            offsets = starts[remaining] - current
+            squared = np.einsum('ij,ij->i', offsets, offsets)
+            best = int(np.argmin(squared))
+            nearest, distance = int(remaining[best]), float(np.sqrt(squared[best]))
+        visited[nearest] = True
+        order[step] = nearest
+        travel += distance
+        current = ends[nearest]
+    travel += float(np.hypot(*(current - np.asarray(origin, dtype=np.float64))))
+    return order, travel
+
+
+def contour_contrast(image, contours):
+    """Контраст под каждым контуром: средний градиент яркости в его точках, 0..1
+
+    Контур по резкой границе важнее контура по слабому перепаду тона.
+    """
+    paths = PathSet.from_contours(contours)
+    if not len(paths):
+        return np.zeros(0)
+    gray = image if image.ndim == 2 else cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    gray = gray.astype(np.float32)
+    magnitude = cv2.magnitude(cv2.Sobel(gray, cv2.CV_32F, 1, 0, ksize=3),
+                              cv2.Sobel(gray, cv2.CV_32F, 0, 1, ksize=3))
+    points = np.rint(paths.points).astype(np.int64)
+    xs = np.clip(points[:, 0], 0, gray.shape[1] - 1)
+    ys = np.clip(points[:, 1], 0, gray.shape[0] - 1)
+    samples = magnitude[ys, xs]
+
+    counts = paths.counts
+    sums = np.zeros(len(paths))
+    nonempty = counts > 0
+    sums[nonempty] = np.add.reduceat(samples, paths.offsets[:-1][nonempty])
+    contrast = sums / np.maximum(counts, 1)
+    # Нормировка по почти максимальному контрасту - единичные выбросы не сжимают шкалу
+    scale = np.percentile(contrast, 95) if len(contrast) else 0.0
+    if scale <= 0:
+        return np.ones(len(paths))
+    return np.clip(contrast / scale, 0.0, 1.0)
+
+
+class BudgetPlanner:
+    """Лучший рисунок, который успеет нарисоваться за заданное время
+
+    Ценность контура - его длина плюс вклад площади (крупная замкнутая форма
+    заметнее того же количества штриховки), умноженные на контраст под ним,
+    если он известен. Цена - время по модели плоттера (helpers.move_time):
+    рисование с подачей feed_rate_drawing или с подачами генератора
+    (draw_times), задержки пера и холостой подход.
+
+    Контуры ранжируются по ценности на секунду (жадный рюкзак; подход до
+    обхода оценивается расстоянием до ближайшего соседа), затем бинарным
+    поиском выбирается самый длинный префикс ранжирования, время которого
+    с настоящим порядком обхода (жадный, от конца к ближайшему началу)
+    укладывается в бюджет.
+    """
+
+    def __init__(self, config=None):
+        self.config = {
+            "time_budget": None,         # Минут на рисунок
+            "budget_area_weight": 0.5,   # Вклад sqrt(площади) в ценность относительно длины
+            "feed_rate_drawing": 500,
+            "feed_rate_travel": 2000,
+            "pen_up_delay": 0.3,
+            "pen_down_delay": 0.3,
+            "start_delay": 1.0           # Пауза в заголовке программы (G4 P1), сек
+        }
+        if config:
+            self.config.update(config)
+        self.report = {}
+
+    def plan(self, paths, closed_flags, weights=None, draw_times=None):
+        """Порядок выбранных путей (индексы paths) в координатах станка, мм
+
+        closed_flags - массив bool: путь замыкается на начало.
+        draw_times - время рисования каждого пути, сек, если подача не
+        постоянная (адаптивная подача генератора).
+        """
+        with metrics.stage("budget_plan", len(paths)):
+            return self._plan(paths, np.asarray(closed_flags, dtype=bool), weights, draw_times)
+
+    def _plan(self, paths, closed, weights, draw_times):
+        budget = self.config["time_budget"] * 60.0
+        geometry = paths.geometry()
+        lengths = np.where(closed, geometry['closed_lengths'], geometry['open_lengths'])
+        starts = paths.points[paths.offsets[:-1]].astype(np.float64)
+        ends = np.where(closed[:, None], starts,
+                        paths.points[np.maximum(paths.offsets[1:] - 1, 0)])
+
+        value = lengths + self.config["budget_area_weight"] * np.sqrt(np.abs(geometry['areas']))
+        if weights is not None:
+            value = value * np.asarray(weights, dtype=np.float64)
+        if draw_times is None:
+            draw_times = move_time(lengths, self.config["feed_rate_drawing"])
+        draw_time = (np.asarray(draw_times, dtype=np.float64)
+                     + self.config["pen_up_delay"] + self.config["pen_down_delay"])
+
+        if len(paths) > 1:
+            distances, _ = cKDTree(starts).query(starts, k=2)
+            travel_guess = move_time(distances[:, 1], self.config["feed_rate_travel"])
+        else:
+            travel_guess = np.zeros(len(paths))
+        rank = np.argsort(-value / np.maximum(draw_time + travel_guess, 1e-9), kind='stable')
+
+        def plot_time(count):
+            chosen = rank[:count]
+            order, travel = greedy_path_order(starts[chosen], ends[chosen])
+            seconds = (self.config["start_delay"] + draw_time[chosen].sum()
+                       + move_time(travel, self.config["feed_rate_travel"]))
+            return chosen[order], seconds
+
+        full_order, full_time = plot_time(len(paths))
+        if full_time <= budget:
+            order, seconds = full_order, full_time
+        else:
+            # Самый длинный префикс ранжирования, который укладывается в бюджет
+            low, high = 0, len(paths) - 1
+            order, seconds = plot_time(0)
+            while low < high:
+                middle = (low + high + 1) // 2
+                candidate, candidate_time = plot_time(middle)
+                if candidate_time <= budget:
+                    low, order, seconds = middle, candidate, candidate_time
+                else:
+                    high = middle - 1
+
+        total_length = float(lengths.sum())
+        total_value = float(value.sum())
+        self.report = {
+            'budget': budget,
+            'time': seconds,
+            'full_time': full_time,
+            'contours_kept': len(order),
+            'contours_total': len(paths),
+            'ink_kept': float(lengths[order].sum()) / total_length if total_length else 1.0,
+            'value_kept': float(value[order].sum()) / total_value if total_value else 1.0
+        }
+        return order
+
+
+def format_report(report):
+    return (f"Бюджет {report['budget'] / 60:.1f} мин: {report['time'] / 60:.1f} мин "
+            f"(всё - {report['full_time'] / 60:.1f} мин), контуров "
+            f"{report['contours_kept']}/{report['contours_total']}, "
+            f"чернил {report['ink_kept']:.0%}, ценности {report['value_kept']:.0%}")
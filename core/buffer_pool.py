@@ -0,0 +1,88 @@
+import threading
+from collections import OrderedDict
+import numpy as np
+
+
+class BufferPool:
+    """Пул переиспользуемых массивов, ключ - (имя, форма, тип)
+
+    Промежуточные результаты стилей пишутся в буферы пула через dst= OpenCV,
+    поэтому повторный вызов для изображения того же размера не выделяет память.
+    Пул не потокобезопасен - на поток свой пул (см. local_pool).
+    """
+
+    def __init__(self, max_buffers=64):
+        self.max_buffers = max_buffers
+        self.buffers = OrderedDict()
+        self.allocations = 0   # Сколько раз пришлось выделить новый массив
+
+    def get(self, name, shape, dtype=np.uint8):
+        """Буфер с мусором внутри - вызывающий код обязан его перезаписать"""
+        key = (name, tuple(shape), np.dtype(dtype).str)
+        buffer = self.buffers.get(key)
+        if buffer is not None:
+            self.buffers.move_to_end(key)
+            return buffer
+        buffer = np.empty(shape, dtype=dtype)
+        self._store(key, buffer)
+        return buffer
+
+    def _store(self, key, buffer):
+        self.allocations += 1
+        self.buffers[key] = buffer
+        # Старые размеры (например, после смены изображения) вытесняются
+        while len(self.buffers) > self.max_buffers:
+            self.buffers.popitem(last=False)
+
+    def noise(self, sigma, seed, shape):
+        """Нормальный шум как uint8 с переполнением - как np.random.normal(...).astype(np.uint8)
+
+        Текстура int8 строится один раз для (sigma, seed, shape) и дальше только читается.
+        """
+        key = ("noise", float(sigma), seed, tuple(shape), "u1")
+        texture = self.buffers.get(key)
+        if texture is None:
+            rng = np.random.default_rng(seed)
+            values = rng.standard_normal(shape, dtype=np.float32)
+            values *= sigma
+            np.trunc(values, out=values)
+            np.clip(values, -128, 127, out=values)
+            texture = values.astype(np.int8).view(np.uint8)
+            self._store(key, texture)
+        else:
+            self.buffers.move_to_end(key)
+        return texture
+
+    def uniform(self, seed, shape):
+        """Равномерный шум uint8 = floor(255 * U[0, 1))
+
+        Для целой яркости v условие texture < v выполняется с вероятностью ровно v / 255.
+        """
+        key = ("uniform", seed, tuple(shape), "u1")
+        texture = self.buffers.get(key)
+        if texture is None:
+            values = np.random.default_rng(seed).random(shape, dtype=np.float32)
+            values *= 255
+            texture = values.astype(np.uint8)
+            self._store(key, texture)
+        else:
+            self.buffers.move_to_end(key)
+        return texture
+
+    @property
+    def nbytes(self):
+        return sum(buffer.nbytes for buffer in self.buffers.values())
+
+    def clear(self):
+        self.buffers.clear()
+
+
+_local = threading.local()
+
+
+def local_pool():
+    """Общий пул текущего потока"""
+    pool = getattr(_local, "pool", None)
+    if pool is None:
+        pool = _local.pool = BufferPool()
+    return pool
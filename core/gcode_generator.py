@@ -1,6 +1,12 @@
 import random
 import cv2
-from utils.helpers import validate_gcode_line
+import numpy as np
+from calibration.calibration_model import CalibrationModel
+from .budget_planner import BudgetPlanner
+from .overdraw import OverdrawRemover
+from .path_set import PathSet
+from utils.helpers import move_time, validate_gcode_line
+from utils.metrics import metrics
 
 class GCodeGenerator:
     def __init__(self, config=None):
@@ -15,11 +21,27 @@ class GCodeGenerator:
             "pen_up_delay": 0.3,
             "pen_down_delay": 0.3,
             "randomize_contours": False,  # Новый параметр для контроля случайности
-            "add_noise": False           # Новый параметр для контроля шума
+            "add_noise": False,          # Новый параметр для контроля шума
+            "calibration_file": None,    # Модель калибровки (CalibrationModel.save)
+            "remove_overdraw": False,    # Убирать повторное рисование по тем же линиям
+            "pen_width": 0.5,            # Ширина линии пера, мм (допуск совпадения)
+            "adaptive_feed": False,      # Подача по кривизне: быстрее на прямых, медленнее в углах
+            "feed_rate_min": 300,        # Подача в самых острых углах, мм/мин
+            "feed_rate_max": 1500,       # Подача на длинных прямых, мм/мин
+            "feed_corner_angle": 90,     # Поворот (градусы), при котором подача минимальна
+            "feed_straight_length": 5.0, # Длина отрезка (мм), с которой он считается прямой
+            "feed_step": 100,            # Шаг квантования подачи - меньшие изменения не пишутся
+            "time_budget": None,         # Минут на рисунок: лучшие контуры, успевающие за это время
+            "budget_area_weight": 0.5    # Вклад площади контура в его ценность (см. BudgetPlanner)
         }
         # Обновляем конфиг переданными значениями
         if config:
             self.config.update(config)
+        
+        self.report = {}
+        self.calibration = None
+        if self.config.get("calibration_file"):
+            self.calibration = CalibrationModel.load(self.config["calibration_file"])
     
     def generate_header(self):
         return [
@@ -40,105 +62,298 @@ class GCodeGenerator:
             "M30",        # Конец программы
         ]
     
-    def validate_gcode(self, gcode_lines):
-        """Валидирует G-code команды"""
-        valid_lines = []
+    def iter_validated(self, gcode_lines):
+        """Пропускает только валидные строки, не накапливая их"""
         for line_text in gcode_lines:
             if validate_gcode_line(line_text):
-                valid_lines.append(line_text)
+                yield line_text
             else:
                 print(f"Invalid G-code line skipped: {line_text}")
-        return valid_lines
+    
+    def validate_gcode(self, gcode_lines):
+        """Валидирует G-code команды"""
+        return list(self.iter_validated(gcode_lines))
     
     def _sort_contours_by_area(self, contours):
         """Сортирует контуры по площади (от большего к меньшему)"""
         return sorted(contours, key=cv2.contourArea, reverse=True)
     
+    def _spatial_order(self, centroids):
+        """Порядок обхода по центрам масс (слева направо, сверху вниз)"""
+        # Группируем по областям 50x50 пикселей, сортируем по Y, затем по X
+        cells = np.trunc(centroids).astype(np.int64) // 50
+        return np.lexsort((cells[:, 0], cells[:, 1]))
+    
     def _sort_contours_spatially(self, contours):
         """Сортирует контуры пространственно (слева направо, сверху вниз)"""
-        if not contours:
+        if not len(contours):
             return contours
-            
-        # Находим центры масс контуров
-        moments = [cv2.moments(cnt) for cnt in contours]
-        centers = []
-        for i, M in enumerate(moments):
-            if M["m00"] != 0:
-                cx = int(M["m10"] / M["m00"])
-                cy = int(M["m01"] / M["m00"])
-                centers.append((cx, cy, i))
-            else:
-                centers.append((0, 0, i))
+        paths = PathSet.from_contours(contours)
+        return paths.take(self._spatial_order(paths.geometry()['centroids']))
+    
+    def _budget_order(self, paths, closed_flags, weights):
+        """Выбор и порядок контуров под time_budget (отчёт - в report['budget'])"""
+        planner = BudgetPlanner(self.config)
+        machine = paths.transform(self._machine_scale(), self._machine_offset())
+        draw_times = None
+        if self.config.get("adaptive_feed", False):
+            draw_times = self._adaptive_draw_times(machine, closed_flags)
+        order = planner.plan(machine, closed_flags, weights, draw_times)
+        self.report['budget'] = planner.report
+        return order
+    
+    def _adaptive_draw_times(self, machine, closed_flags):
+        """Время рисования путей (мм) с адаптивной подачей - как при выводе, сек"""
+        times = np.zeros(len(machine))
+        for index, (base, closed) in enumerate(zip(machine, closed_flags)):
+            base = base.reshape(-1, 2)
+            path = np.vstack([base[:1], base, base[:1]] if closed else [base[:1], base])
+            feeds, lengths = self._segment_feeds(path)
+            times[index] = float(np.sum(move_time(lengths, feeds)))
+        return times
+    
+    def _remove_overdraw(self, contours, closed_flags):
+        """Вырезает участки, повторяющие уже нарисованные линии"""
+        scale = (self.config["scale_x"] * self.config["scale_y"]) ** 0.5
+        remover = OverdrawRemover(self.config["pen_width"] / scale)
+        contours, report = remover.remove(contours, closed_flags)
         
-        # Сортируем по Y, затем по X
-        centers.sort(key=lambda x: (x[1] // 50, x[0] // 50))  # Группируем по областям 50x50 пикселей
-        return [contours[i] for _, _, i in centers]
+        # Длины в отчёте - в мм
+        for key in ('original_length', 'kept_length', 'saved_length'):
+            report[key] *= scale
+        self.report['overdraw'] = report
+        return contours
     
-    def contours_to_gcode(self, contours):
-        """Конвертирует контуры в G-code команды"""
-        gcode_commands = []
+    def _contour_to_machine(self, contour, closed=None):
+        """Переводит контур в координаты станка одним векторным вызовом
+        
+        Возвращает путь в мм и в координатах станка (см. _machine_path).
+        """
+        points = np.asarray(contour, dtype=np.float64).reshape(-1, 2)
+        base = points * self._machine_scale() + self._machine_offset()
+        if closed is None:
+            closed = cv2.contourArea(np.asarray(contour, dtype=np.float32).reshape(-1, 1, 2)) != 0
+        return self._machine_path(base, closed)
+    
+    def _machine_scale(self):
+        return np.array([self.config["scale_x"], self.config["scale_y"]])
+    
+    def _machine_offset(self):
+        return np.array([self.config["offset_x"], self.config["offset_y"]])
+    
+    def _machine_path(self, base, closed):
+        """Путь (N, 2), уже переведённый масштабом и сдвигом: шум, замыкание, калибровка
+        
+        Путь - точка подхода, точки рисования и у замкнутого точка замыкания.
+        Возвращает его в мм (до калибровки - по нему считаются подачи) и в
+        координатах станка.
+        """
+        # Добавляем небольшой шум только если включено и только для длинных контуров
+        drawn = base
+        if self.config.get("add_noise", False) and len(base) > 10:
+            drawn = base + np.random.uniform(-0.1, 0.1, base.shape)  # Уменьшенный диапазон шума
+        
+        # Замкнуть контур, если он не замкнут
+        path_mm = np.vstack([base[:1], drawn, base[:1]] if closed else [base[:1], drawn])
+        return path_mm, self._calibrate(path_mm)
+    
+    def _calibrate(self, path_mm):
+        """Калибровка пути; люфт продолжает направление с прошлого пути
+        
+        Подход от конца прошлого пути - тоже движение: его точка идёт в
+        калибровку первой, и направление по осям переходит от пути к пути.
+        """
+        if self.calibration is None:
+            return path_mm
+        path, self._direction = self.calibration.apply_directed(
+            np.vstack([self._position[None], path_mm]), self._direction)
+        self._position = path_mm[-1]
+        return path[1:]
+    
+    def _segment_feeds(self, path):
+        """Подача для каждого отрезка ломаной path (N, 2) - одним проходом NumPy
+        
+        Подача растёт с длиной отрезка и падает с углом поворота в его концах
+        (в пределах feed_rate_min..feed_rate_max), затем округляется до feed_step,
+        чтобы мелкие колебания не плодили команды F.
+        """
+        deltas = np.diff(path, axis=0)
+        lengths = np.hypot(deltas[:, 0], deltas[:, 1])
+        headings = np.arctan2(deltas[:, 1], deltas[:, 0])
+        
+        # Угол поворота между соседними отрезками (нулевые отрезки не поворачивают)
+        turns = np.abs((np.diff(headings) + np.pi) % (2 * np.pi) - np.pi)
+        moving = lengths > 0
+        turns[~(moving[1:] & moving[:-1])] = 0.0
+        corner = np.zeros(len(lengths))
+        corner[:-1] = turns                      # Угол в конце отрезка
+        corner[1:] = np.maximum(corner[1:], turns)  # и в его начале
+        
+        # Длинный отрезок разгоняется до максимальной подачи, но острый угол в любом его
+        # конце тянет подачу к минимальной независимо от длины: разворот в конце
+        # длинной прямой на полной подаче срывает перо
+        sharpness = np.clip(np.degrees(corner) / self.config["feed_corner_angle"], 0, 1)
+        length_factor = np.clip(lengths / self.config["feed_straight_length"], 0, 1)
+        low = self.config["feed_rate_min"]
+        high = self.config["feed_rate_max"]
+        base = self.config["feed_rate_drawing"]
+        straight = base + (high - base) * length_factor
+        feeds = straight - (straight - low) * sharpness
+        
+        step = self.config["feed_step"]
+        feeds = np.clip(np.round(feeds / step) * step, low, high)
+        
+        # Нулевые отрезки (например, первая точка на месте подхода) берут подачу следующего
+        moving_index = np.flatnonzero(moving)
+        if 0 < len(moving_index) < len(feeds):
+            following = np.searchsorted(moving_index, np.arange(len(feeds)))
+            feeds = feeds[moving_index[np.minimum(following, len(moving_index) - 1)]]
+        return feeds, lengths
+    
+    def _iter_drawing_moves(self, path_mm, path, stats):
+        """Строки рисования контура с адаптивной подачей (F пишется только при смене)
+        
+        Подачи и статистика - по пути в мм, координаты строк - по пути станка.
+        """
+        feeds, lengths = self._segment_feeds(path_mm)
+        targets = path[1:]
+        
+        stats['segments'] += len(feeds)
+        stats['length'] += float(lengths.sum())
+        stats['time_constant'] += move_time(float(lengths.sum()), self.config['feed_rate_drawing'])
+        stats['time_adaptive'] += float(np.sum(move_time(lengths, feeds)))
+        
+        current = int(feeds[0])
+        yield f"G1 F{current}"
+        for (x, y), feed in zip(targets.tolist(), feeds.astype(int).tolist()):
+            if feed != current:
+                current = feed
+                stats['feed_changes'] += 1
+                yield f"G1 X{x:.2f} Y{y:.2f} F{feed}"
+            else:
+                yield f"G1 X{x:.2f} Y{y:.2f}"
+    
+    def _iter_raw_gcode(self, contours, closed=None, weights=None):
+        """Генерирует строки G-code по одной
+
+        closed - замыкать ли контуры: None - по площади, False - все пути открытые
+        (векторные стили сами отдают готовые незамкнутые пути).
+        weights - важность контуров (например, контраст под ними) для time_budget.
+        """
+        self.report = {}
+        # Откуда начинается первый путь (G0 X0 Y0 заголовка) - для люфта калибровки
+        self._position = np.zeros(2)
+        self._direction = (0, 0)
         
         # Заголовок
-        gcode_commands.extend(self.generate_header())
-        gcode_commands.append(f"G1 F{self.config['feed_rate_travel']}")
+        yield from self.generate_header()
+        yield f"G1 F{self.config['feed_rate_travel']}"
         
         # Сортировка контуров для оптимального пути
-        if self.config.get("randomize_contours", False):
-            random.shuffle(contours)
-        else:
-            # Сортируем контуры пространственно для минимизации перемещений
-            contours = self._sort_contours_spatially(contours)
-        
-        for contour in contours:
-            if len(contour) < 2:
+        paths = PathSet.from_contours(contours)
+        with metrics.stage("gcode_sort", len(paths)):
+            # Площади и центры масс всех контуров - одним проходом
+            geometry = paths.geometry()
+            # Незамкнутый контур имеет нулевую площадь
+            if closed is None:
+                all_closed = geometry['areas'] != 0
+            else:
+                all_closed = np.full(len(paths), bool(closed))
+            if self.config.get("time_budget"):
+                # Только то, что успеет нарисоваться, в порядке короткого обхода
+                order = self._budget_order(paths, all_closed, weights)
+            elif self.config.get("randomize_contours", False):
+                order = list(range(len(paths)))
+                random.shuffle(order)
+            else:
+                # Сортируем контуры пространственно для минимизации перемещений
+                order = self._spatial_order(geometry['centroids'])
+            paths = paths.take(order)
+            closed_flags = all_closed[order].tolist()
+        
+        # После удаления повторов замыкание уже включено в полилинии
+        if self.config.get("remove_overdraw", False):
+            with metrics.stage("gcode_overdraw", len(paths)):
+                paths = PathSet.from_contours(self._remove_overdraw(paths, closed_flags))
+            closed_flags = [False] * len(paths)
+        
+        # Масштаб и сдвиг - сразу для всех точек
+        machine = paths.transform(self._machine_scale(), self._machine_offset())
+        
+        adaptive = self.config.get("adaptive_feed", False)
+        feed_stats = {'segments': 0, 'feed_changes': 0, 'length': 0.0,
+                      'time_constant': 0.0, 'time_adaptive': 0.0}
+        
+        for base, closed in zip(machine, closed_flags):
+            if len(base) < 2:
                 continue
             
-            # Начало контура
-            start_point = contour[0][0]
-            start_x = start_point[0] * self.config["scale_x"] + self.config["offset_x"]
-            start_y = start_point[1] * self.config["scale_y"] + self.config["offset_y"]
+            path_mm, path = self._machine_path(base.reshape(-1, 2), closed)
+            start = path[0]
             
             # Перемещение к началу контура
-            gcode_commands.append(f"G0 X{start_x:.2f} Y{start_y:.2f}")
+            yield f"G0 X{start[0]:.2f} Y{start[1]:.2f}"
             
             # Опустить перо
-            gcode_commands.append("M3 S0")
+            yield "M3 S0"
             
             if self.config["pen_down_delay"] > 0:
-                gcode_commands.append(f"G4 P{self.config['pen_down_delay']}")
-            
-            # Установить скорость рисования
-            gcode_commands.append(f"G1 F{self.config['feed_rate_drawing']}")
+                yield f"G4 P{self.config['pen_down_delay']}"
             
-            # Рисование контура
-            for i, point in enumerate(contour):
-                x = point[0][0] * self.config["scale_x"] + self.config["offset_x"]
-                y = point[0][1] * self.config["scale_y"] + self.config["offset_y"]
-                
-                # Добавляем небольшой шум только если включено и только для длинных контуров
-                if self.config.get("add_noise", False) and len(contour) > 10:
-                    x += random.uniform(-0.1, 0.1)  # Уменьшенный диапазон шума
-                    y += random.uniform(-0.1, 0.1)
+            if adaptive:
+                yield from self._iter_drawing_moves(path_mm, path, feed_stats)
+            else:
+                # Установить скорость рисования
+                yield f"G1 F{self.config['feed_rate_drawing']}"
                 
-                gcode_commands.append(f"G1 X{x:.2f} Y{y:.2f}")
-            
-            # Замкнуть контур, если он не замкнут
-            if not cv2.contourArea(contour) == 0:  # Если контур не замкнут
-                end_x = contour[0][0][0] * self.config["scale_x"] + self.config["offset_x"]
-                end_y = contour[0][0][1] * self.config["scale_y"] + self.config["offset_y"]
-                gcode_commands.append(f"G1 X{end_x:.2f} Y{end_y:.2f}")
+                # Рисование контура (и замыкание, если оно есть)
+                yield from (f"G1 X{x:.2f} Y{y:.2f}" for x, y in path[1:].tolist())
             
             # Поднять перо
-            gcode_commands.append(f"G1 F{self.config['feed_rate_travel']}")
-            gcode_commands.append("M5")
+            yield f"G1 F{self.config['feed_rate_travel']}"
+            yield "M5"
             
             if self.config["pen_up_delay"] > 0:
-                gcode_commands.append(f"G4 P{self.config['pen_up_delay']}")
-        
-        # Завершение
-        gcode_commands.extend(self.generate_footer())
+                yield f"G4 P{self.config['pen_up_delay']}"
         
-        # Валидация всего G-code
-        validated_commands = self.validate_gcode(gcode_commands)
+        if adaptive:
+            feed_stats['time_saved'] = feed_stats['time_constant'] - feed_stats['time_adaptive']
+            self.report['adaptive_feed'] = feed_stats
         
-        return validated_commands
\ No newline at end of file
+        # Завершение
+        yield from self.generate_footer()
+    
+    def iter_gcode(self, contours, closed=None, weights=None):
+        """Потоковая генерация валидированных строк G-code"""
+        return self.iter_validated(self._iter_raw_gcode(contours, closed, weights))
+    
+    def iter_gcode_chunks(self, contours, chunk_lines=4096, encoding=None, closed=None,
+                          weights=None):
+        """Отдаёт G-code блоками по chunk_lines строк (bytes, если задана кодировка)"""
+        batch = []
+        for line_text in self.iter_gcode(contours, closed, weights):
+            batch.append(line_text)
+            if len(batch) >= chunk_lines:
+                chunk = '\n'.join(batch) + '\n'
+                yield chunk.encode(encoding) if encoding else chunk
+                batch = []
+        if batch:
+            chunk = '\n'.join(batch) + '\n'
+            yield chunk.encode(encoding) if encoding else chunk
+    
+    def write_gcode(self, contours, path, chunk_lines=4096, closed=None, weights=None):
+        """Пишет G-code в файл блоками, возвращает число строк"""
+        lines_count = 0
+        with metrics.stage("gcode_write") as stage:
+            with open(path, 'w', encoding='utf-8', buffering=1024 * 1024) as f:
+                for chunk in self.iter_gcode_chunks(contours, chunk_lines, closed=closed,
+                                                    weights=weights):
+                    f.write(chunk)
+                    lines_count += chunk.count('\n')
+            stage.count(lines_count)
+        return lines_count
+    
+    @metrics.timed("gcode_generate")
+    def contours_to_gcode(self, contours, closed=None, weights=None):
+        """Конвертирует контуры в G-code команды"""
+        return list(self.iter_gcode(contours, closed, weights))
@@ -0,0 +1,285 @@
+import argparse
+import os
+
+from utils.helpers import GCodeTimeEstimator, parse_gcode_words
+from utils.metrics import metrics
+
+# Слова, которые может содержать строка перемещения, доступная для слияния
+_MOVE_WORDS = frozenset("GXYF")
+
+
+class GCodeOptimizer:
+    """Потоковый оптимизатор готового G-code
+
+    Читает строки по одной и держит в памяти только текущую серию точек:
+    - сливает подряд идущие почти коллинеарные перемещения (отклонение <= tolerance, мм);
+    - выбрасывает перемещения нулевой длины;
+    - выбрасывает повторные M3/M5 и строки "G1 F", не меняющие подачу
+      (подача выводится только перед ближайшим перемещением, если она изменилась).
+    Оставленные строки выводятся без изменений, как в исходном файле.
+    """
+
+    def __init__(self, config=None):
+        self.config = {
+            "tolerance": None,        # Допуск слияния коллинеарных отрезков, мм (None - полшага сетки)
+            "grid_step": 0.5,         # Шаг сетки координат программы (scale_x/scale_y генератора), мм
+            "min_move": 1e-6,         # Перемещения короче считаются нулевыми, мм
+            "max_merge": 256,         # Предел точек в одной серии (ограничивает проверку)
+            "default_feed": 500.0,    # Подача до первой команды F (для оценки времени)
+            "line_overhead": 0.0      # Задержка на строку при обмене с контроллером, сек
+        }
+        if config:
+            self.config.update(config)
+        self.report = {}
+
+    def _reset(self):
+        # Лесенка генератора отклоняется от прямой на полшага сетки -
+        # меньший допуск не сливает наклонные линии вовсе
+        self.tolerance = self.config["tolerance"]
+        if self.tolerance is None:
+            self.tolerance = self.config["grid_step"] / 2
+        self.position = None          # Последняя выведенная точка (None - неизвестна)
+        self.relative = False         # G91: слияние отключается до G90
+        self.pen_down = None          # None - состояние пера неизвестно
+        self.feed = None              # Подача, действующая на станке
+        self.wanted_feed = None       # Подача, которую нужно выставить перед движением
+        self.feed_line = None         # Строка, которой её выставить
+        self.run = None               # Текущая серия: [G-код, начало, промежуточные точки]
+        self.pending = None           # Последняя точка серии: (x, y, строка)
+        self.dropped = {'collinear': 0, 'zero_length': 0, 'modal': 0}
+
+    def _flush(self):
+        """Выводит последнюю точку серии"""
+        if self.pending is None:
+            return []
+        x, y, line_text = self.pending
+        self.position = (x, y)
+        self.run = None
+        self.pending = None
+        return [line_text]
+
+    def _emit_feed(self):
+        if self.wanted_feed is not None and self.wanted_feed != self.feed:
+            self.feed = self.wanted_feed
+            line_text = self.feed_line
+            self.feed_line = None
+            return [line_text]
+        if self.feed_line is not None:
+            self.dropped['modal'] += 1
+            self.feed_line = None
+        return []
+
+    def _can_extend(self, code, x, y):
+        """Укладываются ли все точки серии в допуск от отрезка начало - (x, y)"""
+        run_code, (ax, ay), points = self.run
+        if code != run_code or len(points) >= self.config["max_merge"]:
+            return False
+        # Холостые перемещения с поднятым пером можно схлопнуть в одно
+        if code == 0 and self.pen_down is False:
+            return True
+
+        dx = x - ax
+        dy = y - ay
+        length_sq = dx * dx + dy * dy
+        if length_sq <= self.config["min_move"] ** 2:
+            return False
+        tolerance = self.tolerance
+        limit = tolerance * tolerance * length_sq
+        previous_t = 0.0
+        for px, py in points + [self.pending[:2]]:
+            rx = px - ax
+            ry = py - ay
+            cross = dx * ry - dy * rx
+            if cross * cross > limit:
+                return False
+            # Точки должны идти вперёд вдоль отрезка, без возвратов
+            t = (rx * dx + ry * dy) / length_sq
+            if t < previous_t or t > 1.0:
+                return False
+            previous_t = t
+        return True
+
+    def _move(self, code, words, line_text):
+        x = words.get('X', self.pending[0] if self.pending else self.position[0])
+        y = words.get('Y', self.pending[1] if self.pending else self.position[1])
+        output = []
+
+        # Смена подачи не должна попасть на уже накопленные отрезки
+        if self.wanted_feed is not None and self.wanted_feed != self.feed:
+            output += self._flush()
+        output += self._emit_feed()
+
+        last = self.pending[:2] if self.pending else self.position
+        if abs(x - last[0]) <= self.config["min_move"] and \
+                abs(y - last[1]) <= self.config["min_move"]:
+            self.dropped['zero_length'] += 1
+            return output
+
+        if self.run is not None and self._can_extend(code, x, y):
+            self.run[2].append(self.pending[:2])
+            self.dropped['collinear'] += 1
+        else:
+            output += self._flush()
+            self.run = [code, self.position, []]
+        self.pending = (x, y, line_text)
+        return output
+
+    def _line(self, line_text):
+        """Обрабатывает одну строку, возвращает список строк для вывода"""
+        words = parse_gcode_words(line_text)
+        if not words:
+            return self._flush() + [line_text] if line_text.strip() else []
+        code = words.get('G')
+
+        if self.relative or self.position is None or \
+                code not in (0, 1) or not set(words) <= _MOVE_WORDS:
+            if words.get('M') in (3, 4, 5):
+                return self._pen(words['M'] != 5, line_text)
+            return self._passthrough(words, line_text)
+
+        if 'F' not in words:
+            return self._move(code, words, line_text)
+
+        if 'X' not in words and 'Y' not in words:
+            # Только смена подачи - отложим до ближайшего перемещения
+            if self.feed_line is not None:
+                self.dropped['modal'] += 1
+            self.wanted_feed = words['F']
+            self.feed_line = line_text
+            return []
+
+        # Подача и перемещение в одной строке
+        if self.feed_line is not None:
+            self.dropped['modal'] += 1
+        self.wanted_feed = None
+        self.feed_line = None
+        if words['F'] == self.feed:
+            return self._move(code, words, line_text)
+        # Строка меняет подачу - её нельзя слить с соседними
+        output = self._flush()
+        self.feed = words['F']
+        self.position = (words.get('X', self.position[0]), words.get('Y', self.position[1]))
+        return output + [line_text]
+
+    def _pen(self, down, line_text):
+        """M3/M5: повтор текущего состояния пера выбрасывается"""
+        if down == self.pen_down:
+            self.dropped['modal'] += 1
+            return []
+        self.pen_down = down
+        return self._flush() + [line_text]
+
+    def _passthrough(self, words, line_text):
+        """Строка без оптимизации: выводится как есть, состояние обновляется"""
+        output = self._flush()
+        code = words.get('G')
+        moves = code in (0, 1, 2, 3, 28, 30) or any(axis in words for axis in "XYZ")
+        # Отложенная подача нужна только перед движением
+        if moves or 'F' in words:
+            output += self._emit_feed()
+        if 'F' in words:
+            self.feed = words['F']
+            self.wanted_feed = None
+
+        if code == 91:
+            self.relative = True
+        elif code == 90:
+            self.relative = False
+
+        if code in (28, 30, 92) or (moves and self.relative):
+            self.position = None
+        elif moves and code in (0, 1):
+            if self.position is not None:
+                self.position = (words.get('X', self.position[0]),
+                                 words.get('Y', self.position[1]))
+            elif 'X' in words and 'Y' in words:
+                self.position = (words['X'], words['Y'])
+        output.append(line_text)
+        return output
+
+    def optimize(self, gcode_lines):
+        """Генератор оптимизированных строк; отчёт - в self.report после исчерпания"""
+        self._reset()
+        source = GCodeTimeEstimator(self.config["default_feed"], self.config["line_overhead"])
+        result = GCodeTimeEstimator(self.config["default_feed"], self.config["line_overhead"])
+
+        for line_text in gcode_lines:
+            line_text = line_text.rstrip('\r\n')
+            source.add(line_text)
+            for out_line in self._line(line_text):
+                result.add(out_line)
+                yield out_line
+        for out_line in self._flush():
+            result.add(out_line)
+            yield out_line
+        if self.feed_line is not None:
+            self.dropped['modal'] += 1   # Подача в конце файла никому не нужна
+
+        before = source.result()
+        after = result.result()
+        self.report = {
+            'before': before,
+            'after': after,
+            'lines_saved': before['lines'] - after['lines'],
+            'distance_saved': (before['draw_distance'] + before['travel_distance']
+                               - after['draw_distance'] - after['travel_distance']),
+            'time_saved': before['time'] - after['time'],
+            'dropped': dict(self.dropped)
+        }
+
+    def optimize_file(self, input_path, output_path, chunk_lines=4096):
+        """Оптимизирует файл потоково, возвращает отчёт"""
+        with metrics.stage("gcode_optimize") as stage:
+            with open(input_path, encoding='utf-8') as src, \
+                    open(output_path, 'w', encoding='utf-8', buffering=1024 * 1024) as dst:
+                batch = []
+                for line_text in self.optimize(src):
+                    batch.append(line_text)
+                    if len(batch) >= chunk_lines:
+                        dst.write('\n'.join(batch) + '\n')
+                        batch = []
+                if batch:
+                    dst.write('\n'.join(batch) + '\n')
+            stage.count(self.report['before']['lines'])
+        return self.report
+
+
+def format_report(report):
+    """Строки отчёта для вывода в консоль или лог"""
+    before, after = report['before'], report['after']
+    dropped = report['dropped']
+    return [
+        f"Строк: {before['lines']} -> {after['lines']} (-{report['lines_saved']})",
+        f"  коллинеарных: {dropped['collinear']}, нулевой длины: {dropped['zero_length']}, "
+        f"лишних модальных: {dropped['modal']}",
+        f"Рисование: {before['draw_distance']:.1f} -> {after['draw_distance']:.1f} мм, "
+        f"холостые: {before['travel_distance']:.1f} -> {after['travel_distance']:.1f} мм",
+        f"Оценка времени: {before['time']:.1f} -> {after['time']:.1f} с "
+        f"(-{report['time_saved']:.1f} с)"
+    ]
+
+
+def main():
+    from utils.config import AppConfig
+
+    parser = argparse.ArgumentParser(description="Оптимизация готового G-code")
+    parser.add_argument("gcode", help="Файл G-code")
+    parser.add_argument("--output", help="Куда сохранить (по умолчанию <имя>_opt.gcode)")
+    parser.add_argument("--tolerance", type=float, help="Допуск слияния, мм")
+    args = parser.parse_args()
+
+    config = dict(AppConfig.GCODE_OPTIMIZER_CONFIG)
+    config["default_feed"] = AppConfig.GCODE_CONFIG["feed_rate_drawing"]
+    config["grid_step"] = min(AppConfig.GCODE_CONFIG["scale_x"], AppConfig.GCODE_CONFIG["scale_y"])
+    if args.tolerance is not None:
+        config["tolerance"] = args.tolerance
+    output = args.output or os.path.splitext(args.gcode)[0] + "_opt.gcode"
+
+    report = GCodeOptimizer(config).optimize_file(args.gcode, output)
+    for line in format_report(report):
+        print(line)
+    print(f"Сохранено: {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+import numpy as np
+
+
+def pack_contours(contours, dtype=np.float64):
+    """Склеивает контуры в один массив точек (M, 2) и массив смещений (K + 1)"""
+    counts = np.fromiter((len(c) for c in contours), dtype=np.int64, count=len(contours))
+    offsets = np.zeros(len(contours) + 1, dtype=np.int64)
+    np.cumsum(counts, out=offsets[1:])
+    if len(contours) == 0:
+        return np.zeros((0, 2), dtype=dtype), offsets
+    points = np.concatenate([np.asarray(c).reshape(-1, 2) for c in contours]).astype(dtype,
+                                                                                       copy=False)
+    return points, offsets
+
+
+def packed_geometry(points, offsets):
+    """Длины, площади и центры масс всех контуров за один проход NumPy
+
+    Возвращает словарь массивов длины K:
+    open_lengths - длина ломаной, closed_lengths - с замыкающим отрезком,
+    areas - площадь (со знаком, как у формулы Гаусса), centroids - (K, 2).
+    """
+    count = len(offsets) - 1
+    if count == 0 or len(points) == 0:
+        empty = np.zeros(count)
+        return {'open_lengths': empty, 'closed_lengths': empty.copy(),
+                'areas': empty.copy(), 'centroids': np.zeros((count, 2))}
+
+    starts = offsets[:-1]
+    ends = offsets[1:] - 1
+
+    # Следующая точка внутри своего контура (последняя замыкается на первую)
+    next_index = np.arange(1, len(points) + 1)
+    next_index[ends] = starts
+    x, y = points[:, 0], points[:, 1]
+    nx, ny = x[next_index], y[next_index]
+
+    segment_lengths = np.hypot(nx - x, ny - y)
+    closed_lengths = np.add.reduceat(segment_lengths, starts)
+    open_lengths = closed_lengths - segment_lengths[ends]
+
+    cross = x * ny - nx * y
+    doubled_area = np.add.reduceat(cross, starts)
+    moment_x = np.add.reduceat((x + nx) * cross, starts)
+    moment_y = np.add.reduceat((y + ny) * cross, starts)
+
+    centroids = np.zeros((count, 2))
+    nonzero = doubled_area != 0
+    centroids[nonzero, 0] = moment_x[nonzero] / (3.0 * doubled_area[nonzero])
+    centroids[nonzero, 1] = moment_y[nonzero] / (3.0 * doubled_area[nonzero])
+
+    return {'open_lengths': open_lengths, 'closed_lengths': closed_lengths,
+            'areas': doubled_area / 2.0, 'centroids': centroids}
+
+
+def contour_geometry(contours):
+    """То же для списка контуров OpenCV"""
+    return packed_geometry(*pack_contours(contours))
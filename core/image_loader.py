@@ -0,0 +1,96 @@
+import cv2
+import numpy as np
+from PIL import Image
+
+# Тег EXIF Orientation
+_ORIENTATION_TAG = 0x0112
+
+# Уменьшение при декодировании: (во сколько раз, цветной флаг, серый флаг)
+_REDUCED_FLAGS = [
+    (8, cv2.IMREAD_REDUCED_COLOR_8, cv2.IMREAD_REDUCED_GRAYSCALE_8),
+    (4, cv2.IMREAD_REDUCED_COLOR_4, cv2.IMREAD_REDUCED_GRAYSCALE_4),
+    (2, cv2.IMREAD_REDUCED_COLOR_2, cv2.IMREAD_REDUCED_GRAYSCALE_2)
+]
+
+
+def image_info(path):
+    """Размер и ориентация EXIF из заголовка - без декодирования пикселей"""
+    try:
+        with Image.open(path) as img:
+            orientation = img.getexif().get(_ORIENTATION_TAG, 1)
+            return img.size, orientation
+    except (OSError, ValueError):
+        return None, 1
+
+
+def apply_orientation(image, orientation):
+    """Поворачивает/отражает изображение по значению EXIF Orientation (1-8)"""
+    if orientation == 2:
+        return cv2.flip(image, 1)
+    if orientation == 3:
+        return cv2.rotate(image, cv2.ROTATE_180)
+    if orientation == 4:
+        return cv2.flip(image, 0)
+    if orientation == 5:
+        return cv2.transpose(image)
+    if orientation == 6:
+        return cv2.rotate(image, cv2.ROTATE_90_CLOCKWISE)
+    if orientation == 7:
+        return cv2.rotate(cv2.transpose(image), cv2.ROTATE_180)
+    if orientation == 8:
+        return cv2.rotate(image, cv2.ROTATE_90_COUNTERCLOCKWISE)
+    return image
+
+
+def read_image(path, max_side=None, grayscale=False):
+    """Читает изображение, по возможности сразу уменьшенным в 2/4/8 раз
+
+    Коэффициент выбирается так, чтобы бо́льшая сторона осталась не меньше
+    max_side - окончательный ресайз делает вызывающий. JPEG при этом
+    декодируется сразу в малом размере (масштабирование в libjpeg), что
+    экономит и время, и память. Ориентация EXIF применяется явно, пути с
+    не-ASCII символами читаются через np.fromfile. None - файл не прочитан.
+    """
+    size, orientation = image_info(path)
+    flags = cv2.IMREAD_GRAYSCALE if grayscale else cv2.IMREAD_COLOR
+    if max_side and size:
+        for factor, color_flag, gray_flag in _REDUCED_FLAGS:
+            if max(size) / factor >= max_side:
+                flags = gray_flag if grayscale else color_flag
+                break
+
+    try:
+        data = np.fromfile(path, dtype=np.uint8)
+    except OSError:
+        return None
+    image = cv2.imdecode(data, flags | cv2.IMREAD_IGNORE_ORIENTATION)
+    if image is None:
+        return None
+    return apply_orientation(image, orientation)
+
+
+def fit_to_box(image, box, mode="pad", pad_value=255):
+    """Приводит изображение к рамке box = (ширина, высота)
+
+    fit - вписать с сохранением пропорций (размер может быть меньше рамки);
+    pad - вписать и добавить поля цвета бумаги до точного размера рамки;
+    stretch - растянуть без сохранения пропорций.
+    """
+    box_w, box_h = box
+    if mode == "stretch":
+        return cv2.resize(image, (box_w, box_h))
+
+    h, w = image.shape[:2]
+    scale = min(box_w / w, box_h / h)
+    new_size = (max(1, round(w * scale)), max(1, round(h * scale)))
+    interpolation = cv2.INTER_AREA if scale < 1 else cv2.INTER_LINEAR
+    resized = cv2.resize(image, new_size, interpolation=interpolation)
+    if mode != "pad":
+        return resized
+
+    left = (box_w - new_size[0]) // 2
+    top = (box_h - new_size[1]) // 2
+    value = pad_value if image.ndim == 2 else (pad_value,) * image.shape[2]
+    return cv2.copyMakeBorder(resized, top, box_h - new_size[1] - top,
+                              left, box_w - new_size[0] - left,
+                              cv2.BORDER_CONSTANT, value=value)
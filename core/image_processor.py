@@ -1,41 +1,195 @@
+import os
+import time
 import cv2
 import numpy as np
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
+from .artifact_store import JobIndex, hash_file
+from .budget_planner import contour_contrast
+from .geometry import contour_geometry
+from .image_loader import fit_to_box, read_image
+from .isolines import find_isolines
+from .path_set import PathSet
 from .style_converter import StyleConverter
+from .vector_import import VectorImporter
 from .gcode_generator import GCodeGenerator
+from utils.helpers import resize_to_fit
+from utils.metrics import metrics
+
+# Версия конвейера в ключе кэша: увеличить, если тот же вход начинает давать другой результат
+PIPELINE_VERSION = 3
+
+# Настройки, не влияющие на результат (не входят в ключ кэша)
+_CACHE_IGNORED = ("GCODE_CONFIG", "STYLE_CONFIG", "VECTOR_CONFIG", "contour_workers",
+                  "contour_batch_size", "preview_size")
 
 class ImageProcessor:
     def __init__(self, project_manager, config):
         self.pm = project_manager
         self.config = config
-        self.style_converter = StyleConverter()
+        self.style_converter = StyleConverter(config.get('STYLE_CONFIG'))
         
         # Извлекаем настройки G-code из конфига или используем значения по умолчанию
         gcode_config = config.get('GCODE_CONFIG', {})
         self.gcode_generator = GCodeGenerator(gcode_config)
+        # Масштаб из настроек - для изображения размера image_size
+        self.gcode_scale = (self.gcode_generator.config["scale_x"],
+                            self.gcode_generator.config["scale_y"])
+        self._executor = None
+    
+    def _simplify_batch(self, contours, epsilons, closed=True):
+        """Упрощает пачку контуров (OpenCV отпускает GIL - пачки идут параллельно)
+        
+        closed - одно значение для всех или по флагу на контур. Замкнутый путь
+        с повторённой первой точкой упрощается как цикл, повтор сохраняется.
+        """
+        if isinstance(closed, bool):
+            return [cv2.approxPolyDP(contour, epsilon, closed)
+                    for contour, epsilon in zip(contours, epsilons)]
+        simplified = []
+        for contour, epsilon, is_closed in zip(contours, epsilons, closed):
+            if is_closed:
+                approx = cv2.approxPolyDP(contour[:-1], epsilon, True)
+                simplified.append(np.concatenate([approx, approx[:1]]))
+            else:
+                simplified.append(cv2.approxPolyDP(contour, epsilon, False))
+        return simplified
+    
+    def _get_executor(self):
+        if self._executor is None:
+            workers = self.config.get('contour_workers') or os.cpu_count() or 1
+            self._executor = ThreadPoolExecutor(max_workers=workers)
+        return self._executor
+    
+    def uses_isolines(self):
+        """Контуры - субпиксельные изолинии (явно замкнутые или открытые пути)"""
+        return self.config.get('contour_extractor', 'findContours') == 'isolines'
+    
+    def contours_closed(self):
+        """closed для генератора G-code: изолинии замыкаются сами, иначе - по площади"""
+        return False if self.uses_isolines() else None
     
     def find_contours(self, image):
-        """Находит и упрощает контуры на изображении"""
-        # Используем RETR_EXTERNAL для получения только внешних контуров
-        # или RETR_LIST для всех контуров
-        contours, _ = cv2.findContours(image, cv2.RETR_LIST, cv2.CHAIN_APPROX_SIMPLE)
+        """Находит и упрощает контуры на изображении (результат - PathSet)"""
+        isolines = self.uses_isolines()
+        if isolines:
+            with metrics.stage("find_isolines") as stage:
+                paths = find_isolines(image, self.config.get('iso_levels', (128,)),
+                                      self.config.get('iso_smoothing', 0.0))
+                contours = paths.to_contours()
+                geometry = paths.geometry()
+                stage.count(len(contours))
+        else:
+            # Используем RETR_EXTERNAL для получения только внешних контуров
+            # или RETR_LIST для всех контуров
+            with metrics.stage("find_contours") as stage:
+                contours, _ = cv2.findContours(image, cv2.RETR_LIST, cv2.CHAIN_APPROX_SIMPLE)
+                geometry = contour_geometry(contours)
+                stage.count(len(contours))
         
-        min_length = self.config.get('min_contour_length', 5)  # Увеличим минимальную длину
-        filtered_contours = [cnt for cnt in contours if cv2.arcLength(cnt, False) > min_length]
+        with metrics.stage("simplify_contours") as stage:
+            # Длины всех контуров считаются один раз и сразу для фильтра и epsilon
+            min_length = self.config.get('min_contour_length', 5)  # Увеличим минимальную длину
+            keep = np.flatnonzero(geometry['open_lengths'] > min_length)
+            
+            # Изолиния замкнута явно (первая точка повторена) - её длина без замыкания
+            epsilon_factor = self.config.get('epsilon_factor', 0.005)  # Уменьшим фактор упрощения
+            lengths = geometry['open_lengths'] if isolines else geometry['closed_lengths']
+            epsilons = (epsilon_factor * lengths[keep]).tolist()
+            filtered_contours = [contours[i] for i in keep]
+            if isolines:
+                # Замкнута изолиния, у которой последняя точка повторяет первую
+                counts = paths.counts[keep]
+                first = paths.points[paths.offsets[keep]]
+                last = paths.points[paths.offsets[keep] + counts - 1]
+                closed = ((counts > 3) & (first == last).all(axis=1)).tolist()
+            else:
+                closed = True
+            
+            # Упрощение - пачками в пуле потоков, если контуров много
+            batch_size = self.config.get('contour_batch_size', 2000)
+            if len(filtered_contours) > batch_size:
+                executor = self._get_executor()
+                futures = [executor.submit(self._simplify_batch,
+                                           filtered_contours[i:i + batch_size],
+                                           epsilons[i:i + batch_size],
+                                           closed[i:i + batch_size] if isolines else closed)
+                           for i in range(0, len(filtered_contours), batch_size)]
+                approximated = [approx for future in futures for approx in future.result()]
+            else:
+                approximated = self._simplify_batch(filtered_contours, epsilons, closed)
+            
+            # Минимум 2 точки для линии
+            simplified = PathSet.from_contours(approximated,
+                                               np.float32 if isolines else np.int32)
+            simplified = simplified.filter(simplified.counts >= 2)
+            stage.count(len(simplified))
         
-        simplified_contours = []
-        epsilon_factor = self.config.get('epsilon_factor', 0.005)  # Уменьшим фактор упрощения
+        return simplified
+    
+    def prepare_image(self, image, max_side=None):
+        """Приводит изображение к рабочему разрешению (с сохранением пропорций)"""
+        max_side = max_side or self.config.get('working_size')
+        if max_side:
+            return resize_to_fit(image, max_side)
+        return fit_to_box(image, self.config.get('image_size', (400, 400)),
+                          self.config.get('fit_mode', 'pad'))
+    
+    def read_image(self, image_path):
+        """Читает изображение не крупнее, чем нужно для рабочего разрешения"""
+        max_side = self.config.get('working_size') or max(self.config.get('image_size', (400, 400)))
+        with metrics.stage("imread"):
+            image = read_image(str(image_path), max_side)
+        if image is None:
+            raise ValueError(f"Не удалось загрузить изображение: {image_path}")
+        return image
+    
+    def load_image(self, image_path):
+        """Изображение в рабочем разрешении: быстрое чтение и ресайз"""
+        image = self.read_image(image_path)
+        with metrics.stage("resize"):
+            return self.prepare_image(image)
+    
+    def fit_gcode_scale(self, image=None):
+        """Подгоняет масштаб G-code под разрешение изображения
         
-        for contour in filtered_contours:
-            epsilon = epsilon_factor * cv2.arcLength(contour, True)
-            approx = cv2.approxPolyDP(contour, epsilon, True)
-            if len(approx) >= 2:  # Минимум 2 точки для линии
-                simplified_contours.append(approx)
+        scale_x/scale_y подобраны для image_size; в рабочем разрешении масштаб
+        делится так, чтобы бо́льшая сторона рисунка на станке осталась того же
+        размера. image=None - масштаб из настроек (пути уже в мм).
+        """
+        factor = 1.0
+        if image is not None and self.config.get('working_size'):
+            factor = max(self.config.get('image_size', (400, 400))) / max(image.shape[:2])
+        self.gcode_generator.config["scale_x"] = self.gcode_scale[0] * factor
+        self.gcode_generator.config["scale_y"] = self.gcode_scale[1] * factor
+    
+    def make_proxy(self, image):
+        """Маленькая копия изображения для быстрых превью стилей"""
+        return resize_to_fit(image, self.config.get('preview_size', 320))
+    
+    def proxy_style_converter(self, proxy, image):
+        """Конвертер стилей для прокси: пиксельные параметры - в масштабе прокси"""
+        return self.style_converter.scaled(max(proxy.shape[:2]) / max(image.shape[:2]))
+    
+    def apply_style(self, image, style):
+        """Применяет стиль и выравнивает гистограмму для поиска контуров"""
+        processed_image = self.style_converter.apply_style(image, style)
         
-        return simplified_contours
+        # Улучшаем контраст для лучшего выделения контуров
+        if len(processed_image.shape) == 2:  # Если изображение в градациях серого
+            with metrics.stage("equalize_hist"):
+                processed_image = cv2.equalizeHist(processed_image)
+        return processed_image
     
-    def create_preview(self, original_image, processed_image, contours, output_path):
-        """Создает превью с контурами"""
+    def contour_weights(self, image, contours):
+        """Важность контуров для time_budget - контраст исходного изображения под ними"""
+        if not self.gcode_generator.config.get("time_budget"):
+            return None
+        with metrics.stage("contour_contrast", len(contours)):
+            return contour_contrast(image, contours)
+    
+    def create_preview(self, original_image, processed_image, contours, output_path, closed=True):
+        """Создает превью с контурами (closed=False - пути рисуются незамкнутыми)"""
         if len(original_image.shape) == 2:
             preview = cv2.cvtColor(original_image, cv2.COLOR_GRAY2BGR)
         else:
@@ -51,60 +205,262 @@ class ImageProcessor:
             (255, 255, 0)   # Голубой
         ]
         
-        for i, contour in enumerate(contours):
-            color = colors[i % len(colors)]
-            cv2.drawContours(preview, [contour], -1, color, 2)
+        paths = PathSet.from_contours(contours, np.int32)
+        if paths.points.dtype != np.int32:
+            # Субпиксельные пути (изолинии) - к ближайшим пикселям
+            paths = PathSet(np.rint(paths.points).astype(np.int32), paths.offsets)
+        starts = paths.points[paths.offsets[:-1]]
+        start_mask = np.zeros(preview.shape[:2], dtype=np.uint8)
+        dot = cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (7, 7))
+        
+        # Контуры одного цвета (каждый len(colors)-й) рисуются одним вызовом
+        for i, color in enumerate(colors):
+            group = paths[i::len(colors)]
+            if not len(group):
+                continue
+            if closed:
+                cv2.drawContours(preview, group.to_contours(), -1, color, 2)
+            else:
+                cv2.polylines(preview, group.to_contours(), False, color, 2)
             
-            # Помечаем начало контура
-            if len(contour) > 0:
-                start_point = tuple(contour[0][0])
-                cv2.circle(preview, start_point, 3, color, -1)
+            # Помечаем начало контура: точки начала, расширенные до кружков радиуса 3
+            group_starts = starts[i::len(colors)]
+            inside = ((group_starts >= 0) & (group_starts < preview.shape[1::-1])).all(axis=1)
+            group_starts = group_starts[inside]
+            start_mask.fill(0)
+            start_mask[group_starts[:, 1], group_starts[:, 0]] = 255
+            cv2.dilate(start_mask, dot, dst=start_mask)
+            preview[start_mask > 0] = color
         
-        cv2.imwrite(str(output_path), preview)
+        with metrics.stage("preview_write"):
+            cv2.imwrite(str(output_path), preview)
         return output_path
     
-    def process_image(self, image_path, output_name=None, style=None):
-        """Обрабатывает изображение и генерирует G-code"""
+    def job_params(self, style):
+        """Всё, от чего зависит результат process_image - из этого строится ключ кэша"""
+        gcode_config = dict(self.gcode_generator.config)
+        # Подогнанный масштаб следует из изображения и настроек - в ключ идёт исходный
+        gcode_config['scale_x'], gcode_config['scale_y'] = self.gcode_scale
+        if gcode_config.get('calibration_file'):
+            gcode_config['calibration_hash'] = hash_file(gcode_config['calibration_file'])
+        return {
+            'version': PIPELINE_VERSION,
+            'style': style,
+            'image': {k: v for k, v in self.config.items() if k not in _CACHE_IGNORED},
+            'gcode': gcode_config,
+            'style_params': self.style_converter.params
+        }
+    
+    def _is_deterministic(self):
+        """Случайный порядок, шум или незаданное зерно текстур - результат не повторяется"""
+        gcode_config = self.gcode_generator.config
+        return not (gcode_config.get('randomize_contours') or gcode_config.get('add_noise')
+                    or self.style_converter.params.get('noise_seed') is None)
+    
+    def process_image(self, image_path, output_name=None, style=None, use_cache=True):
+        """Обрабатывает изображение и генерирует G-code
+        
+        Результаты кладутся в хранилище проекта по хешу содержимого, задание -
+        в индекс. Повтор с тем же изображением и параметрами берётся из индекса.
+        """
         if output_name is None:
             output_name = Path(image_path).stem
+        if style is None:
+            style = "sketch"
         
-        original = cv2.imread(image_path)
-        if original is None:
-            raise ValueError(f"Не удалось загрузить изображение: {image_path}")
+        started = time.perf_counter()
+        with metrics.stage("input_hash"):
+            input_hash = hash_file(image_path)
+        params = self.job_params(style)
+        job_key = JobIndex.job_key(input_hash, params)
+        use_cache = use_cache and self._is_deterministic()
         
-        # Ресайз изображения
-        image_size = self.config.get('image_size', (400, 400))
-        original = cv2.resize(original, image_size)
+        if use_cache:
+            job = self.pm.jobs.lookup(job_key)
+            if job is not None:
+                return self._cached_result(job, f"{output_name}_{style}")
         
-        if style is None:
-            style = "sketch"
+        timings = {}
+        # Чтение сразу в уменьшенном виде и ресайз до рабочего разрешения
+        mark = time.perf_counter()
+        original = self.load_image(image_path)
+        self.fit_gcode_scale(original)
+        timings['load'] = time.perf_counter() - mark
         
         # Применение стиля
-        processed_image = self.style_converter.apply_style(original, style)
-        
-        # Улучшаем контраст для лучшего выделения контуров
-        if len(processed_image.shape) == 2:  # Если изображение в градациях серого
-            processed_image = cv2.equalizeHist(processed_image)
+        mark = time.perf_counter()
+        vector = style in StyleConverter.VECTOR_STYLES
+        if vector:
+            # Векторный стиль сразу даёт незамкнутые пути - контуры не ищем
+            processed_image, contours = self.style_converter.apply_vector_style(original, style)
+        else:
+            processed_image = self.apply_style(original, style)
+        timings['style'] = time.perf_counter() - mark
         
         # Находим контуры
-        contours = self.find_contours(processed_image)
+        mark = time.perf_counter()
+        if not vector:
+            contours = self.find_contours(processed_image)
+        closed = False if vector else self.contours_closed()
+        timings['contours'] = time.perf_counter() - mark
+        
+        store = self.pm.store
         
         # Создание превью
-        preview_path = self.pm.get_unique_filename(f"{output_name}_{style}", "png", "previews")
-        self.create_preview(original, processed_image, contours, preview_path)
+        mark = time.perf_counter()
+        with metrics.stage("preview"):
+            _, preview_artifact = store.write("png", lambda path: self.create_preview(
+                original, processed_image, contours, path, closed=closed is None))
+        _, processed_artifact = store.write("png", lambda path: cv2.imwrite(str(path),
+                                                                            processed_image))
+        timings['preview'] = time.perf_counter() - mark
         
-        # Генерация G-code
-        gcode_commands = self.gcode_generator.contours_to_gcode(contours)
-        gcode_path = self.pm.get_unique_filename(f"{output_name}_{style}", "gcode", "gcode")
+        # Генерация G-code потоком прямо в файл
+        mark = time.perf_counter()
+        weights = None if vector else self.contour_weights(original, contours)
+        written = {}
+        _, gcode_artifact = store.write("gcode", lambda path: written.update(
+            count=self.gcode_generator.write_gcode(contours, path,
+                                                   closed=closed, weights=weights)))
+        timings['gcode'] = time.perf_counter() - mark
+        timings['total'] = time.perf_counter() - started
         
-        with open(gcode_path, 'w', encoding='utf-8') as f:
-            for command in gcode_commands:
-                f.write(command + '\n')
+        # Копии с понятными именами, как раньше
+        preview_path = self.pm.publish(preview_artifact, f"{output_name}_{style}", "png",
+                                       "previews")
+        gcode_path = self.pm.publish(gcode_artifact, f"{output_name}_{style}", "gcode", "gcode")
+        
+        summary = {
+            'contours_count': len(contours),
+            'commands_count': written['count'],
+            'report': self.gcode_generator.report,
+            'published': {'preview': str(preview_path), 'gcode': str(gcode_path)}
+        }
+        self.pm.jobs.record(job_key, input_hash, params,
+                            {'preview': preview_artifact, 'gcode': gcode_artifact,
+                             'processed': processed_artifact},
+                            timings=timings, input_name=str(image_path), style=style,
+                            summary=summary)
         
         return {
             'preview': preview_path,
             'gcode': gcode_path,
             'contours_count': len(contours),
-            'commands_count': len(gcode_commands),
-            'processed_image': processed_image
-        }
\ No newline at end of file
+            'commands_count': written['count'],
+            'processed_image': processed_image,
+            'report': self.gcode_generator.report,
+            'metrics': metrics.to_dict(),
+            'cached': False
+        }
+    
+    def render_paths(self, paths):
+        """Пути в мм -> (чертёж в оттенках серого, пути в пикселях чертежа)"""
+        if not len(paths.points):
+            return np.full((1, 1), 255, dtype=np.uint8), paths
+        low = paths.points.min(axis=0)
+        size_mm = float((paths.points.max(axis=0) - low).max())
+        px_per_mm = self.config.get('working_size', 1000) / max(size_mm, 1e-6)
+        pixel_paths = PathSet(np.rint((paths.points - low) * px_per_mm).astype(np.int32),
+                              paths.offsets)
+        width, height = pixel_paths.points.max(axis=0) + 1
+        image = np.full((int(height), int(width)), 255, dtype=np.uint8)
+        cv2.polylines(image, pixel_paths.to_contours(), False, 0, 1, cv2.LINE_AA)
+        return image, pixel_paths
+    
+    def process_vector(self, vector_path, output_name=None, use_cache=True):
+        """SVG/DXF сразу в G-code, без растра и поиска контуров
+        
+        Пути импортируются в мм и делятся на масштаб генератора, поэтому
+        после его scale_x/scale_y размеры на станке совпадают с чертежом.
+        """
+        if output_name is None:
+            output_name = Path(vector_path).stem
+        importer = VectorImporter(self.config.get('VECTOR_CONFIG'))
+        
+        started = time.perf_counter()
+        with metrics.stage("input_hash"):
+            input_hash = hash_file(vector_path)
+        params = self.job_params("vector")
+        params['image'] = {}
+        params['vector'] = importer.config
+        job_key = JobIndex.job_key(input_hash, params)
+        use_cache = use_cache and self._is_deterministic()
+        
+        if use_cache:
+            job = self.pm.jobs.lookup(job_key)
+            if job is not None:
+                return self._cached_result(job, f"{output_name}_vector")
+        
+        timings = {}
+        mark = time.perf_counter()
+        paths = importer.load(vector_path)
+        timings['load'] = time.perf_counter() - mark
+        
+        mark = time.perf_counter()
+        processed_image, pixel_paths = self.render_paths(paths)
+        store = self.pm.store
+        with metrics.stage("preview"):
+            _, preview_artifact = store.write("png", lambda path: self.create_preview(
+                processed_image, processed_image, pixel_paths, path, closed=False))
+        _, processed_artifact = store.write("png", lambda path: cv2.imwrite(str(path),
+                                                                            processed_image))
+        timings['preview'] = time.perf_counter() - mark
+        
+        mark = time.perf_counter()
+        self.fit_gcode_scale()
+        config = self.gcode_generator.config
+        contours = paths.transform((1.0 / config["scale_x"], 1.0 / config["scale_y"]))
+        written = {}
+        _, gcode_artifact = store.write("gcode", lambda path: written.update(
+            count=self.gcode_generator.write_gcode(contours, path, closed=False)))
+        timings['gcode'] = time.perf_counter() - mark
+        timings['total'] = time.perf_counter() - started
+        
+        preview_path = self.pm.publish(preview_artifact, f"{output_name}_vector", "png",
+                                       "previews")
+        gcode_path = self.pm.publish(gcode_artifact, f"{output_name}_vector", "gcode", "gcode")
+        
+        summary = {
+            'contours_count': len(paths),
+            'commands_count': written['count'],
+            'report': self.gcode_generator.report,
+            'published': {'preview': str(preview_path), 'gcode': str(gcode_path)}
+        }
+        self.pm.jobs.record(job_key, input_hash, params,
+                            {'preview': preview_artifact, 'gcode': gcode_artifact,
+                             'processed': processed_artifact},
+                            timings=timings, input_name=str(vector_path), style="vector",
+                            summary=summary)
+        
+        return {
+            'preview': preview_path,
+            'gcode': gcode_path,
+            'contours_count': len(paths),
+            'commands_count': written['count'],
+            'processed_image': processed_image,
+            'report': self.gcode_generator.report,
+            'import_report': importer.report,
+            'metrics': metrics.to_dict(),
+            'cached': False
+        }
+    
+    def _cached_result(self, job, base_name):
+        """Результат ранее выполненного задания из хранилища
+        
+        Копии публикуются заново из проверенных объектов хранилища: прежние
+        копии (summary['published']) могли удалить или поправить руками.
+        """
+        summary = job['summary']
+        outputs = job['outputs']
+        preview_path = self.pm.publish(outputs['preview'], base_name, "png", "previews")
+        gcode_path = self.pm.publish(outputs['gcode'], base_name, "gcode", "gcode")
+        return {
+            'preview': preview_path,
+            'gcode': gcode_path,
+            'contours_count': summary['contours_count'],
+            'commands_count': summary['commands_count'],
+            'processed_image': cv2.imread(job['outputs']['processed'], cv2.IMREAD_GRAYSCALE),
+            'report': summary['report'],
+            'metrics': metrics.to_dict(),
+            'cached': True
+        }
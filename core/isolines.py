@@ -0,0 +1,146 @@
+import cv2
+import numpy as np
+from scipy.sparse import coo_matrix
+from scipy.sparse.csgraph import connected_components
+from .path_set import PathSet
+
+
+def _chain_rank(previous):
+    """Начало цепочки и номер в ней для каждого узла (previous без циклов, -1 - начало)
+
+    Удвоение указателей: за шаг узел прыгает к предку своего предка и
+    прибавляет пройденное расстояние. Узел, дошедший до начала, из работы
+    выходит - короткие цепочки не ждут самую длинную.
+    """
+    index = np.arange(len(previous))
+    head = previous < 0
+    parent = np.where(head, index, previous)
+    rank = (~head).astype(np.int64)
+    active = np.flatnonzero(~head[parent])
+    while len(active):
+        up = parent[active]
+        rank[active] += rank[up]
+        parent[active] = parent[up]
+        active = active[~head[parent[active]]]
+    return parent, rank
+
+
+def marching_squares(field, level):
+    """Изолинии поля на уровне level с субпиксельной точностью (PathSet, float32)
+
+    Ячейка - квадрат из четырёх соседних пикселей; её случай (какие углы выше
+    уровня) определяется сразу для всего изображения. Точка изолинии лежит на
+    ребре ячейки, где значение пересекает уровень, - по линейной интерполяции.
+
+    Отрезки ориентированы (выше уровня - всегда по одну сторону), поэтому у
+    каждой точки не больше одного следующего и одного предыдущего отрезка, и
+    цепочки собираются без обхода в Python: циклы - по компонентам связности,
+    порядок точек - удвоением указателей. Замкнутая изолиния повторяет первую
+    точку в конце, открытая упирается в край.
+    """
+    field = np.asarray(field, dtype=np.float32)
+    height, width = field.shape
+    if height < 2 or width < 2:
+        return PathSet.empty(np.float32)
+
+    inside = field > level
+    # Углы ячейки по часовой стрелке: левый верхний, правый верхний, правый нижний, левый нижний
+    corners = np.stack([inside[:-1, :-1], inside[:-1, 1:], inside[1:, 1:], inside[1:, :-1]])
+    case = np.einsum('kij,k->ij', corners, np.array([1, 2, 4, 8], dtype=np.uint8))
+    active = np.flatnonzero((case != 0) & (case != 15))
+    if not len(active):
+        return PathSet.empty(np.float32)
+
+    cy, cx = np.divmod(active, width - 1)
+    corners = corners.reshape(4, -1)[:, active]
+    case = case.ravel()[active]
+    # Седло (углы выше уровня по диагонали) разрешается по среднему ячейки
+    saddle = (case == 5) | (case == 10)
+    values = (field[cy, cx] + field[cy, cx + 1] + field[cy + 1, cx + 1] + field[cy + 1, cx]) / 4
+    center_inside = saddle & (values > level)
+
+    # Номера рёбер: сначала все горизонтальные, затем вертикальные
+    horizontal = height * (width - 1)
+    edge_ids = np.stack([cy * (width - 1) + cx,              # верх
+                         horizontal + cy * width + cx + 1,   # право
+                         (cy + 1) * (width - 1) + cx,        # низ
+                         horizontal + cy * width + cx])      # лево
+
+    # Ребро k между углами k и k+1: вход изолинии - угол k ниже уровня, k+1 выше
+    following = np.roll(corners, -1, axis=0)
+    entry = ~corners & following
+    exit_ = corners & ~following
+    sources, targets = [], []
+    for k in range(4):
+        cells = np.flatnonzero(entry[k])
+        # Выход - первое ребро-выход по часовой стрелке; в седле с центром выше
+        # уровня - предыдущее ребро (изолинии огибают углы ниже уровня)
+        out = np.where(exit_[(k + 1) % 4, cells], k + 1,
+                       np.where(exit_[(k + 2) % 4, cells], k + 2, k + 3)) % 4
+        out[center_inside[cells]] = (k + 3) % 4
+        sources.append(edge_ids[k, cells])
+        targets.append(edge_ids[out, cells])
+    sources = np.concatenate(sources)
+    targets = np.concatenate(targets)
+
+    # Точки - только на пересечённых рёбрах; номер ребра -> номер точки по таблице
+    crossed = np.zeros(horizontal + (height - 1) * width, dtype=bool)
+    crossed[sources] = True
+    crossed[targets] = True
+    nodes = np.flatnonzero(crossed)
+    node_of_edge = np.empty(len(crossed), dtype=np.int64)
+    node_of_edge[nodes] = np.arange(len(nodes))
+    is_vertical = nodes >= horizontal
+    y, x = np.divmod(np.where(is_vertical, nodes - horizontal, nodes),
+                     np.where(is_vertical, width, width - 1))
+    start_values = field[y, x]
+    end_values = field[y + is_vertical, x + ~is_vertical]
+    t = (level - start_values) / (end_values - start_values)
+    points = np.column_stack([x + np.where(is_vertical, 0, t),
+                              y + np.where(is_vertical, t, 0)]).astype(np.float32)
+
+    count = len(nodes)
+    previous = np.full(count, -1, dtype=np.int64)
+    previous[node_of_edge[targets]] = node_of_edge[sources]
+
+    # Цикл (компонента связности без начала) разрезается на наименьшем узле,
+    # копия узла становится концом цепочки
+    index = np.arange(count)
+    has_previous = previous >= 0
+    graph = coo_matrix((np.ones(len(sources), dtype=np.int8),
+                        (previous[has_previous], index[has_previous])),
+                       shape=(count, count)).tocsr()
+    components, labels = connected_components(graph, directed=True, connection='weak')
+    cyclic = np.ones(components, dtype=bool)
+    cyclic[labels[~has_previous]] = False
+    lowest = np.full(components, count, dtype=np.int64)
+    np.minimum.at(lowest, labels, index)
+    cut = lowest[cyclic]
+    points = np.concatenate([points, points[cut]])
+    previous = np.concatenate([previous, previous[cut]])
+    previous[cut] = -1
+
+    root, rank = _chain_rank(previous)
+    head = previous < 0
+    # Место точки в общем массиве - начало её цепочки плюс номер, без сортировки
+    heads = np.flatnonzero(head)
+    offsets = np.zeros(len(heads) + 1, dtype=np.int64)
+    np.cumsum(np.bincount(root, minlength=len(root))[heads], out=offsets[1:])
+    chain_start = np.zeros(len(root), dtype=np.int64)
+    chain_start[heads] = offsets[:-1]
+    ordered = np.empty_like(points)
+    ordered[chain_start[root] + rank] = points
+    return PathSet(ordered, offsets)
+
+
+def find_isolines(image, levels=(128,), smoothing=0.0):
+    """Изолинии изображения в оттенках серого на уровнях levels (PathSet, float32)
+
+    smoothing - сигма гауссова размытия перед поиском, пиксели: на бинарных
+    изображениях без него изолинии повторяют лесенку пикселей.
+    """
+    field = image if image.ndim == 2 else cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    field = field.astype(np.float32)
+    if smoothing > 0:
+        field = cv2.GaussianBlur(field, (0, 0), smoothing)
+    return PathSet.concatenate([marching_squares(field, level) for level in levels])
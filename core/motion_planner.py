@@ -0,0 +1,430 @@
+import argparse
+import math
+import struct
+from collections import namedtuple
+
+from utils.helpers import parse_gcode_words
+
+# Блок шагов: смещения по осям в шагах, профиль скорости в шагах/с ведущей оси
+StepBlock = namedtuple("StepBlock", [
+    "kind",              # BLOCK_MOVE / BLOCK_DWELL / BLOCK_END
+    "steps",             # (sx, sy, sz) со знаком
+    "pen_down",          # Состояние пера во время блока
+    "entry_rate",        # Скорость входа, шаг/с
+    "nominal_rate",      # Крейсерская скорость, шаг/с
+    "exit_rate",         # Скорость выхода, шаг/с
+    "acceleration",      # Ускорение, шаг/с²
+    "accelerate_until",  # Номер шага конца разгона
+    "decelerate_after",  # Номер шага начала торможения
+    "dwell_ms"           # Пауза (для BLOCK_DWELL)
+])
+
+BLOCK_MOVE = 1
+BLOCK_DWELL = 2
+BLOCK_END = 3
+
+# Формат потока: SYNC, тип, флаги, данные, контрольная сумма (XOR)
+SYNC_BYTE = 0xA5
+TYPE_MOVE_SHORT = 0x01   # dx, dy в int8, без Z
+TYPE_MOVE = 0x02         # dx, dy, dz в int16
+TYPE_DWELL = 0x03
+TYPE_END = 0x04
+FLAG_PEN_DOWN = 0x01
+
+_PROFILE = struct.Struct("<6H")
+_SHORT_STEPS = struct.Struct("<2b")
+_LONG_STEPS = struct.Struct("<3h")
+_DWELL = struct.Struct("<H")
+_MAX_BLOCK_STEPS = 32767
+_MAX_U16 = 65535
+
+# Текущая прошивка: оси по очереди, полупериод шага 2 мс
+LEGACY_STEP_TIME = 0.004
+
+
+class MotionPlanner:
+    """Планировщик согласованного движения: G-code → блоки шагов Брезенхэма"""
+
+    def __init__(self, config=None):
+        self.config = {
+            "steps_per_mm": (10.0, 10.0, 100.0),   # Как в calibration.conversion_utils
+            "max_step_rate": (500, 500, 500),      # Предельная частота шагов по осям, шаг/с
+            "acceleration": 50.0,                  # мм/с²
+            "junction_deviation": 0.05,            # мм, допуск скорости в углах
+            "start_step_rate": 250,                # Скорость старта/остановки без разгона, шаг/с
+            "pen_z_mm": 0.0,                       # Ход пера по Z (0 - только флаг)
+            "default_feed": 500.0,                 # мм/мин до первой команды F
+            "honor_feed": True                     # False - рисовать на предельной скорости осей
+        }
+        if config:
+            self.config.update(config)
+
+    def _parse_moves(self, gcode_lines):
+        """Переводит программу в список движений в целых шагах"""
+        spm = self.config["steps_per_mm"]
+        pen_z = round(self.config["pen_z_mm"] * spm[2])
+        moves = []
+        position = [0, 0, 0]
+        target_mm = [0.0, 0.0, 0.0]
+        feed = self.config["default_feed"]
+        pen_down = False
+
+        for line_text in gcode_lines:
+            words = parse_gcode_words(line_text)
+            code = words.get('G')
+            if 'F' in words:
+                feed = words['F']
+
+            if 'M' in words and words['M'] in (3, 5):
+                new_pen = words['M'] == 3
+                if new_pen != pen_down and pen_z:
+                    dz = pen_z if new_pen else -pen_z
+                    position[2] += dz
+                    moves.append({'steps': (0, 0, dz), 'feed': None, 'pen_down': new_pen})
+                pen_down = new_pen
+                continue
+
+            if code == 4:
+                moves.append({'dwell': words.get('P', 0.0), 'pen_down': pen_down})
+                continue
+            if code not in (0, 1):
+                continue
+
+            for axis, letter in enumerate("XY"):
+                if letter in words:
+                    target_mm[axis] = words[letter]
+            # Округляем абсолютные позиции, чтобы ошибка не накапливалась
+            target = [round(target_mm[0] * spm[0]), round(target_mm[1] * spm[1]), position[2]]
+            steps = tuple(t - p for t, p in zip(target, position))
+            if not any(steps):
+                continue
+            position = target
+            moves.append({'steps': steps, 'feed': None if code == 0 else feed,
+                          'pen_down': pen_down})
+        return moves
+
+    def _split(self, moves):
+        """Делит длинные движения, чтобы смещения помещались в int16"""
+        result = []
+        for move in moves:
+            steps = move.get('steps')
+            longest = max(abs(s) for s in steps) if steps else 0
+            parts = -(-longest // _MAX_BLOCK_STEPS)
+            if parts <= 1:
+                result.append(move)
+                continue
+            done = [0, 0, 0]
+            for part in range(1, parts + 1):
+                target = [s * part // parts for s in steps]
+                piece = tuple(t - d for t, d in zip(target, done))
+                done = target
+                result.append({**move, 'steps': piece})
+        return result
+
+    def _move_geometry(self, move):
+        """Длина (мм), единичный вектор и предельная скорость движения"""
+        spm = self.config["steps_per_mm"]
+        max_rate = self.config["max_step_rate"]
+        delta = [s / k for s, k in zip(move['steps'], spm)]
+        length = math.sqrt(sum(d * d for d in delta))
+        unit = [d / length for d in delta]
+
+        # Скорость ограничена самой медленной осью с учётом её доли в движении
+        speed = min(max_rate[a] / (spm[a] * abs(unit[a])) for a in range(3) if unit[a])
+        if move['feed'] and self.config["honor_feed"]:
+            speed = min(speed, move['feed'] / 60.0)
+        return length, unit, speed
+
+    def _junction_speed(self, prev_unit, unit, limit):
+        """Максимальная скорость прохода угла (метод junction deviation)"""
+        cos_theta = -sum(p * u for p, u in zip(prev_unit, unit))
+        if cos_theta >= 0.999999:
+            return 0.0  # Разворот на 180°
+        if cos_theta <= -0.999999:
+            return limit  # Прямая линия
+        sin_half = math.sqrt(0.5 * (1.0 - cos_theta))
+        accel = self.config["acceleration"]
+        deviation = self.config["junction_deviation"]
+        return min(limit, math.sqrt(accel * deviation * sin_half / (1.0 - sin_half)))
+
+    def plan(self, gcode_lines):
+        """Строит блоки с трапецеидальным профилем скорости"""
+        moves = self._split(self._parse_moves(gcode_lines))
+        accel = self.config["acceleration"]
+
+        # Геометрия и скорости в углах (в мм/с)
+        for i, move in enumerate(moves):
+            if 'dwell' in move:
+                continue
+            move['length'], move['unit'], move['nominal'] = self._move_geometry(move)
+            prev = moves[i - 1] if i > 0 else None
+            if (prev is None or 'dwell' in prev or prev['pen_down'] != move['pen_down']
+                    or (prev['feed'] is None) != (move['feed'] is None)):
+                move['entry_max'] = 0.0
+            else:
+                limit = min(prev['nominal'], move['nominal'])
+                move['entry_max'] = self._junction_speed(prev['unit'], move['unit'], limit)
+
+        # Обратный проход: успеть затормозить к следующему блоку
+        next_entry = 0.0
+        for move in reversed(moves):
+            if 'dwell' in move:
+                next_entry = 0.0
+                continue
+            move['exit'] = next_entry
+            move['entry'] = min(move['entry_max'],
+                                math.sqrt(next_entry ** 2 + 2 * accel * move['length']))
+            next_entry = move['entry']
+
+        # Прямой проход: успеть разогнаться
+        prev_exit = 0.0
+        for move in moves:
+            if 'dwell' in move:
+                prev_exit = 0.0
+                continue
+            move['entry'] = min(move['entry'], prev_exit)
+            reachable = math.sqrt(move['entry'] ** 2 + 2 * accel * move['length'])
+            move['exit'] = min(move['exit'], reachable)
+            prev_exit = move['exit']
+
+        blocks = [self._make_block(move) for move in moves]
+        blocks.append(StepBlock(BLOCK_END, (0, 0, 0), False, 0, 0, 0, 0, 0, 0, 0))
+        return blocks
+
+    def _make_block(self, move):
+        """Переводит движение в блок шагов ведущей оси"""
+        if 'dwell' in move:
+            dwell_ms = min(_MAX_U16, round(move['dwell'] * 1000))
+            return StepBlock(BLOCK_DWELL, (0, 0, 0), move['pen_down'], 0, 0, 0, 0, 0, 0, dwell_ms)
+
+        steps = move['steps']
+        events = max(abs(s) for s in steps)
+        steps_per_unit = events / move['length']
+
+        def to_rate(value):
+            return max(0, min(_MAX_U16, round(value * steps_per_unit)))
+
+        entry = to_rate(move['entry'])
+        nominal = max(1, to_rate(move['nominal']))
+        exit_rate = to_rate(move['exit'])
+        accel = max(1, to_rate(self.config["acceleration"]))
+        # Мотор трогается и останавливается на стартовой скорости без разгона
+        start_rate = min(nominal, self.config["start_step_rate"])
+        entry = min(max(entry, start_rate), nominal)
+        exit_rate = min(max(exit_rate, start_rate), nominal)
+
+        accel_steps = math.ceil((nominal ** 2 - entry ** 2) / (2.0 * accel))
+        decel_steps = math.floor((nominal ** 2 - exit_rate ** 2) / (2.0 * accel))
+        if accel_steps + decel_steps > events:
+            # Треугольный профиль: крейсерская скорость не достигается
+            accel_steps = math.ceil((exit_rate ** 2 - entry ** 2 + 2.0 * accel * events)
+                                    / (4.0 * accel))
+            accel_steps = max(0, min(events, accel_steps))
+            decel_steps = events - accel_steps
+
+        return StepBlock(BLOCK_MOVE, steps, move['pen_down'], entry, nominal, exit_rate,
+                         accel, accel_steps, events - decel_steps, 0)
+
+
+def block_time(block):
+    """Аналитическое время выполнения блока, секунды"""
+    if block.kind == BLOCK_DWELL:
+        return block.dwell_ms / 1000.0
+    if block.kind != BLOCK_MOVE:
+        return 0.0
+    events = max(abs(s) for s in block.steps)
+    a = block.acceleration
+    accel_steps = block.accelerate_until
+    decel_steps = events - block.decelerate_after
+
+    peak = min(block.nominal_rate, math.sqrt(block.entry_rate ** 2 + 2.0 * a * accel_steps))
+    decel_start = min(peak, math.sqrt(block.exit_rate ** 2 + 2.0 * a * decel_steps))
+    # Путь разгона и торможения до/от пиковой скорости, остаток - на пиковой скорости
+    accel_distance = (peak ** 2 - block.entry_rate ** 2) / (2.0 * a)
+    decel_distance = (decel_start ** 2 - block.exit_rate ** 2) / (2.0 * a)
+    cruise_distance = max(0.0, events - accel_distance - decel_distance)
+    return ((peak - block.entry_rate) / a
+            + cruise_distance / peak
+            + (decel_start - block.exit_rate) / a)
+
+
+def legacy_time(blocks):
+    """Время той же работы на текущей прошивке (оси по очереди, 4 мс на шаг)"""
+    total = 0.0
+    for block in blocks:
+        if block.kind == BLOCK_MOVE:
+            total += sum(abs(s) for s in block.steps) * LEGACY_STEP_TIME
+        elif block.kind == BLOCK_DWELL:
+            total += block.dwell_ms / 1000.0
+    return total
+
+
+def _checksum(data):
+    value = 0
+    for byte in data:
+        value ^= byte
+    return value
+
+
+def encode_blocks(blocks):
+    """Кодирует блоки в компактный двоичный поток"""
+    out = bytearray()
+    for block in blocks:
+        flags = FLAG_PEN_DOWN if block.pen_down else 0
+        if block.kind == BLOCK_MOVE:
+            sx, sy, sz = block.steps
+            if sz == 0 and -128 <= sx <= 127 and -128 <= sy <= 127:
+                payload = bytes((TYPE_MOVE_SHORT, flags)) + _SHORT_STEPS.pack(sx, sy)
+            else:
+                payload = bytes((TYPE_MOVE, flags)) + _LONG_STEPS.pack(sx, sy, sz)
+            payload += _PROFILE.pack(block.entry_rate, block.nominal_rate, block.exit_rate,
+                                     block.acceleration, block.accelerate_until,
+                                     block.decelerate_after)
+        elif block.kind == BLOCK_DWELL:
+            payload = bytes((TYPE_DWELL, flags)) + _DWELL.pack(block.dwell_ms)
+        else:
+            payload = bytes((TYPE_END, flags))
+        out.append(SYNC_BYTE)
+        out += payload
+        out.append(_checksum(payload))
+    return bytes(out)
+
+
+def _require(data, pos, size, block_pos):
+    if pos + size > len(data):
+        raise ValueError(f"Поток оборван внутри блока в позиции {block_pos}")
+
+
+def decode_blocks(data):
+    """Эталонный декодер потока (так же должна разбирать прошивка)
+
+    Оборванный или испорченный поток - ValueError с позицией блока.
+    """
+    blocks = []
+    pos = 0
+    while pos < len(data):
+        if data[pos] != SYNC_BYTE:
+            raise ValueError(f"Нет байта синхронизации в позиции {pos}")
+        _require(data, pos, 3, pos)
+        block_type, flags = data[pos + 1], data[pos + 2]
+        start = pos + 1
+        pos += 3
+        pen_down = bool(flags & FLAG_PEN_DOWN)
+
+        if block_type in (TYPE_MOVE_SHORT, TYPE_MOVE):
+            steps_format = _SHORT_STEPS if block_type == TYPE_MOVE_SHORT else _LONG_STEPS
+            _require(data, pos, steps_format.size + _PROFILE.size, start - 1)
+            if block_type == TYPE_MOVE_SHORT:
+                steps = _SHORT_STEPS.unpack_from(data, pos) + (0,)
+                pos += _SHORT_STEPS.size
+            else:
+                steps = _LONG_STEPS.unpack_from(data, pos)
+                pos += _LONG_STEPS.size
+            profile = _PROFILE.unpack_from(data, pos)
+            pos += _PROFILE.size
+            block = StepBlock(BLOCK_MOVE, steps, pen_down, *profile, 0)
+        elif block_type == TYPE_DWELL:
+            _require(data, pos, _DWELL.size, start - 1)
+            (dwell_ms,) = _DWELL.unpack_from(data, pos)
+            pos += _DWELL.size
+            block = StepBlock(BLOCK_DWELL, (0, 0, 0), pen_down, 0, 0, 0, 0, 0, 0, dwell_ms)
+        elif block_type == TYPE_END:
+            block = StepBlock(BLOCK_END, (0, 0, 0), pen_down, 0, 0, 0, 0, 0, 0, 0)
+        else:
+            raise ValueError(f"Неизвестный тип блока {block_type:#x} в позиции {start - 1}")
+
+        _require(data, pos, 1, start - 1)
+        if _checksum(data[start:pos]) != data[pos]:
+            raise ValueError(f"Неверная контрольная сумма блока в позиции {start - 1}")
+        pos += 1
+        blocks.append(block)
+    return blocks
+
+
+def simulate(blocks):
+    """Пошаговая симуляция Брезенхэма с профилем скорости
+
+    Возвращает итоговое время, позицию в шагах и число шагов по осям.
+    """
+    position = [0, 0, 0]
+    axis_steps = [0, 0, 0]
+    total_time = 0.0
+
+    for block in blocks:
+        if block.kind == BLOCK_DWELL:
+            total_time += block.dwell_ms / 1000.0
+            continue
+        if block.kind != BLOCK_MOVE:
+            continue
+
+        deltas = [abs(s) for s in block.steps]
+        signs = [1 if s > 0 else -1 for s in block.steps]
+        events = max(deltas)
+        errors = [-(events // 2)] * 3
+        a = block.acceleration
+        entry_sq = block.entry_rate ** 2
+        exit_sq = block.exit_rate ** 2
+        peak = min(block.nominal_rate, math.sqrt(entry_sq + 2.0 * a * block.accelerate_until))
+
+        for k in range(events):
+            # Скорость в начале и конце шага по профилю блока
+            if k < block.accelerate_until:
+                start_rate = math.sqrt(entry_sq + 2.0 * a * k)
+                end_rate = math.sqrt(entry_sq + 2.0 * a * (k + 1))
+            elif k >= block.decelerate_after:
+                start_rate = math.sqrt(exit_sq + 2.0 * a * (events - k))
+                end_rate = math.sqrt(exit_sq + 2.0 * a * (events - k - 1))
+            else:
+                start_rate = end_rate = peak
+            start_rate = min(start_rate, peak)
+            end_rate = min(end_rate, peak)
+            # Равноускоренное движение на один шаг: t = 1 / средняя скорость
+            total_time += 2.0 / (start_rate + end_rate)
+
+            # Все оси шагают одновременно по Брезенхэму
+            for axis in range(3):
+                errors[axis] += deltas[axis]
+                if errors[axis] > 0:
+                    errors[axis] -= events
+                    position[axis] += signs[axis]
+                    axis_steps[axis] += 1
+
+    return {'time': total_time, 'position': tuple(position), 'axis_steps': tuple(axis_steps)}
+
+
+def main():
+    from utils.config import AppConfig
+
+    parser = argparse.ArgumentParser(description="Планирование движения и кодирование блоков шагов")
+    parser.add_argument("gcode", help="Файл G-code")
+    parser.add_argument("--output", help="Сохранить двоичный поток блоков")
+    parser.add_argument("--simulate", action="store_true", help="Проверить время симуляцией")
+    parser.add_argument("--ignore-feed", action="store_true",
+                        help="Игнорировать F и рисовать на пределе осей, как текущая прошивка")
+    args = parser.parse_args()
+
+    with open(args.gcode, encoding='utf-8') as f:
+        lines = f.read().splitlines()
+
+    config = dict(AppConfig.MOTION_CONFIG)
+    if args.ignore_feed:
+        config['honor_feed'] = False
+    planner = MotionPlanner(config)
+    blocks = planner.plan(lines)
+    data = encode_blocks(blocks)
+    text_size = sum(len(line) + 1 for line in lines)
+
+    print(f"Блоков: {len(blocks)}, поток: {len(data)} байт (G-code: {text_size} байт)")
+    print(f"Время по плану: {sum(block_time(b) for b in blocks):.1f} с, "
+          f"на текущей прошивке: {legacy_time(blocks):.1f} с")
+    if args.simulate:
+        result = simulate(decode_blocks(data))
+        print(f"Симуляция: {result['time']:.1f} с, позиция {result['position']}")
+
+    if args.output:
+        with open(args.output, 'wb') as f:
+            f.write(data)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,263 @@
+import itertools
+import numpy as np
+from .path_set import PathSet
+
+
+def _expand(counts):
+    """Для групп размером counts: номер группы и номер внутри группы каждого элемента"""
+    group = np.repeat(np.arange(len(counts)), counts)
+    inside = np.arange(len(group)) - np.repeat(np.cumsum(counts) - counts, counts)
+    return group, inside
+
+
+class OverdrawRemover:
+    """Удаляет участки контуров, которые повторяют уже нарисованные линии
+
+    Все нарисованные отрезки хранятся в пространственном хеше - сетке ячеек
+    над всем рисунком: у ячейки номер последнего отрезка, у отрезка - номер
+    предыдущего в той же ячейке. Проверка точки стоит O(1), а весь проход -
+    почти линейный.
+
+    Контуры идут пачками по batch_samples точек, и каждая пачка проверяется
+    целиком операциями NumPy: отрезки прошлых пачек - проходом по спискам
+    ячеек сразу для всех точек, отрезки своей пачки - соединением по ключу
+    ячейки через сортировку. Внутри пачки повтором считается и кусок, который
+    рядом с вырезанным раньше куском: вырезанный сам лежит на нарисованной линии.
+    """
+
+    def __init__(self, tolerance, batch_samples=16384, max_cells=1 << 24):
+        self.tolerance = float(tolerance)
+        self.batch_samples = batch_samples
+        self.max_cells = max_cells
+        self.segments = np.zeros((1024, 4))   # x0, y0, x1, y1 нарисованных отрезков
+        self.next = np.zeros(1024, dtype=np.int64)   # предыдущий отрезок той же ячейки
+        self.count = 0
+
+    def _init_grid(self, samples):
+        """Сетка над всеми точками; края с запасом в ячейку под окно запроса"""
+        low, high = samples.min(axis=0), samples.max(axis=0)
+        # Отрезок индексируется по середине, поэтому ячейка не меньше 3*tol
+        # (окно запроса тогда до 2x2); на огромном листе ячейки крупнее
+        area = float(np.prod(high - low + 3.0 * self.tolerance))
+        self.cell = max(3.0 * self.tolerance, np.sqrt(area / self.max_cells))
+        self.origin = low - self.cell
+        self.rows = int((high[1] - low[1]) / self.cell) + 3
+        columns = int((high[0] - low[0]) / self.cell) + 3
+        self.head = np.full(columns * self.rows, -1, dtype=np.int64)
+
+    def _cell_keys(self, xy):
+        # Ячейка (cx, cy) -> номер в сетке
+        cells = np.floor((xy - self.origin) / self.cell).astype(np.int64)
+        return cells[:, 0] * self.rows + cells[:, 1]
+
+    def _query_keys(self, samples):
+        """Пары (точка, ячейка окна вокруг неё): окно 2*reach не больше ячейки - до 2x2"""
+        reach = 1.5 * self.tolerance
+        low = np.floor((samples - reach - self.origin) / self.cell).astype(np.int64)
+        high = np.floor((samples + reach - self.origin) / self.cell).astype(np.int64)
+        points, keys = [], []
+        for dx, dy in itertools.product((0, 1), (0, 1)):
+            index = np.flatnonzero((low[:, 0] + dx <= high[:, 0]) & (low[:, 1] + dy <= high[:, 1]))
+            points.append(index)
+            keys.append((low[index, 0] + dx) * self.rows + low[index, 1] + dy)
+        return np.concatenate(points), np.concatenate(keys)
+
+    @staticmethod
+    def _join(sorted_keys, values, keys):
+        """Все пары (номер запроса, значение) с равными ключами; sorted_keys отсортированы"""
+        first = np.searchsorted(sorted_keys, keys, 'left')
+        query, inside = _expand(np.searchsorted(sorted_keys, keys, 'right') - first)
+        return query, values[first[query] + inside]
+
+    def _near(self, samples, segments):
+        """Точки ближе tolerance к отрезкам (N, 4) - попарно"""
+        start = segments[:, :2]
+        delta = segments[:, 2:] - start
+        length_sq = np.einsum('ij,ij->i', delta, delta)
+        t = np.einsum('ij,ij->i', samples - start, delta) / np.where(length_sq > 0, length_sq, 1.0)
+        nearest = start + delta * np.clip(t, 0.0, 1.0)[:, None] - samples
+        return np.einsum('ij,ij->i', nearest, nearest) <= self.tolerance * self.tolerance
+
+    def _covered(self, samples, owner, arc, closed, total, segment_starts):
+        """Какие точки пачки лежат ближе tolerance к уже нарисованному
+
+        Свой контур тоже считается: отрезок раньше точки, дальше 3*tol по длине
+        (у замкнутого - по кругу, иначе замыкание "повторяло" бы начало).
+        owner, arc, closed, total - контур точки, длина до неё, замкнут ли
+        контур и его полная длина.
+        """
+        covered = np.zeros(len(samples), dtype=bool)
+        points, keys = self._query_keys(samples)
+
+        # Отрезки прошлых пачек - по спискам ячеек, шаг за шагом для всех
+        # точек сразу; точка выбывает, когда покрыта или список кончился
+        segment = self.head[keys]
+        active = segment >= 0
+        point, segment = points[active], segment[active]
+        while len(point):
+            hit = self._near(samples[point], self.segments[segment])
+            covered[point[hit]] = True
+            segment = self.next[segment]
+            active = (segment >= 0) & ~covered[point]
+            point, segment = point[active], segment[active]
+
+        # Отрезки своей пачки (отрезок i - от точки i к i + 1) - соединение по ключу
+        own_keys = self._cell_keys((samples[segment_starts] + samples[segment_starts + 1]) * 0.5)
+        order = np.argsort(own_keys, kind='stable')
+        pair, segment = self._join(own_keys[order], segment_starts[order], keys)
+        point = points[pair]
+
+        # Отрезок своего контура нарисован до проверки точки segment + 2 (как в
+        # проходе по порядку); отрезок прошлого контура пачки - всегда раньше
+        same = owner[segment] == owner[point]
+        distance = np.abs(arc[point] - arc[segment])
+        distance = np.where(closed[point], np.minimum(distance, total[point] - distance),
+                            distance)
+        candidate = np.where(same, (segment + 2 <= point) & (distance >= 3.0 * self.tolerance),
+                             owner[segment] < owner[point])
+        point, segment = point[candidate], segment[candidate]
+        hit = self._near(samples[point], np.hstack([samples[segment], samples[segment + 1]]))
+        covered[point[hit]] = True
+        return covered
+
+    def _insert(self, segments):
+        """Добавляет отрезки (N, 4) в хеш по ячейкам их середин"""
+        if self.count + len(segments) > len(self.segments):
+            size = max(2 * len(self.segments), self.count + len(segments))
+            grown = np.zeros((size, 4))
+            grown[:self.count] = self.segments[:self.count]
+            self.segments = grown
+            self.next = np.concatenate([self.next[:self.count],
+                                        np.zeros(size - self.count, dtype=np.int64)])
+        index = np.arange(self.count, self.count + len(segments))
+        self.segments[index] = segments
+        self.count += len(segments)
+        if not len(index):
+            return
+
+        # Отрезки одной ячейки сцепляются подряд, первый - с прежним началом списка
+        keys = self._cell_keys((segments[:, :2] + segments[:, 2:]) * 0.5)
+        order = np.argsort(keys, kind='stable')
+        keys, index = keys[order], index[order]
+        same = np.concatenate([[False], keys[1:] == keys[:-1]])
+        self.next[index] = np.where(same, np.roll(index, 1), self.head[keys])
+        last = np.concatenate([keys[1:] != keys[:-1], [True]])
+        self.head[keys[last]] = index[last]
+
+    def _resample(self, paths):
+        """Делит отрезки всех путей на куски не длиннее tolerance
+
+        Возвращает точки, смещения путей по точкам, признак исходной вершины
+        и длину от начала своего пути до каждой точки.
+        """
+        points, offsets = paths.points, paths.offsets
+        ends = offsets[1:] - 1
+        deltas = np.zeros_like(points)
+        deltas[:-1] = np.diff(points, axis=0)
+        lengths = np.hypot(deltas[:, 0], deltas[:, 1])
+        # Точка даёт pieces точек своего отрезка; последняя точка пути - только себя
+        pieces = np.maximum(1, np.ceil(lengths / self.tolerance).astype(np.int64))
+        pieces[ends] = 1
+        lengths[ends] = 0.0
+
+        owner, step = _expand(pieces)
+        t = step / pieces[owner]
+        samples = points[owner] + deltas[owner] * t[:, None]
+        is_vertex = step == 0
+        sample_offsets = np.concatenate([[0], np.cumsum(pieces)])[offsets]
+
+        advance = np.concatenate([[0.0], np.cumsum((lengths / pieces)[owner])])
+        arc = advance[:-1] - np.repeat(advance[sample_offsets[:-1]], np.diff(sample_offsets))
+        return samples, sample_offsets, is_vertex, arc
+
+    def remove(self, contours, closed_flags=None):
+        """Возвращает новые полилинии (PathSet, замыкание уже включено) и отчёт"""
+        paths = PathSet.from_contours(contours)
+        paths = PathSet(paths.points.astype(np.float64, copy=False), paths.offsets)
+        if closed_flags is None:
+            closed_flags = paths.geometry()['areas'] != 0
+        valid = paths.counts >= 2
+        paths = paths.filter(valid)
+        closed_paths = np.asarray(closed_flags, dtype=bool)[valid]
+
+        # Замкнутый путь получает копию первой точки в конце
+        counts = paths.counts + closed_paths
+        offsets = np.concatenate([[0], np.cumsum(counts)])
+        index, inside = _expand(counts)
+        source = paths.offsets[index] + np.where(inside < paths.counts[index], inside, 0)
+        samples, sample_offsets, is_vertex, arc = self._resample(
+            PathSet(paths.points[source], offsets))
+
+        owner = np.repeat(np.arange(len(paths)), np.diff(sample_offsets))
+        closed = closed_paths[owner]
+        path_length = arc[sample_offsets[1:] - 1]
+        total = path_length[owner]
+        if len(samples):
+            self._init_grid(samples)
+
+        pieces = []
+        dropped_contours = 0
+        kept_length = 0.0
+        first_path = 0
+        while first_path < len(paths):
+            # Пачка - целые контуры, примерно batch_samples точек
+            last_path = int(np.searchsorted(sample_offsets,
+                                            sample_offsets[first_path] + self.batch_samples,
+                                            'right')) - 1
+            last_path = min(max(last_path, first_path + 1), len(paths))
+            start, end = sample_offsets[first_path], sample_offsets[last_path]
+            batch = slice(start, end)
+            batch_owner = owner[batch]
+            segment_starts = np.flatnonzero(batch_owner[1:] == batch_owner[:-1])
+
+            covered = self._covered(samples[batch], batch_owner, arc[batch], closed[batch],
+                                    total[batch], segment_starts)
+            # Кусок пропускается, если оба его конца повторяют нарисованное
+            drawn = ~(covered[segment_starts] & covered[segment_starts + 1])
+            drawn_starts = segment_starts[drawn]
+            self._insert(np.hstack([samples[batch][drawn_starts],
+                                    samples[batch][drawn_starts + 1]]))
+
+            # Серии подряд нарисованных кусков: [first, last] по точкам пачки
+            flags = np.zeros(end - start + 1, dtype=np.int8)
+            flags[drawn_starts + 1] = 1
+            edges = np.diff(flags)
+            run_first = np.flatnonzero(edges == 1)
+            run_last = np.flatnonzero(edges == -1)
+            run_owner = batch_owner[run_first]
+            run_length = arc[batch][run_last] - arc[batch][run_first]
+
+            # Обрывки короче ширины пера не стоят подъёма пера
+            runs_per_path = np.bincount(run_owner - first_path,
+                                        minlength=last_path - first_path)
+            keep = ~((run_length < self.tolerance) & (runs_per_path[run_owner - first_path] > 1))
+            kept_paths = np.bincount(run_owner[keep] - first_path,
+                                     minlength=last_path - first_path)
+            dropped_contours += int(np.count_nonzero(kept_paths == 0))
+            kept_length += float(run_length[keep].sum())
+
+            # Из серии остаются концы и исходные вершины
+            run_first, run_last = run_first[keep], run_last[keep]
+            run, step = _expand(run_last - run_first + 1)
+            point = run_first[run] + step
+            retain = is_vertex[batch][point] | (step == 0) | (point == run_last[run])
+            pieces.append((samples[batch][point[retain]],
+                           np.bincount(run[retain], minlength=len(run_first))))
+            first_path = last_path
+
+        points = (np.concatenate([piece[0] for piece in pieces]) if pieces
+                  else np.zeros((0, 2)))
+        run_counts = (np.concatenate([piece[1] for piece in pieces]) if pieces
+                      else np.zeros(0, dtype=np.int64))
+        result = PathSet(points, np.concatenate([[0], np.cumsum(run_counts)]))
+
+        total_length = float(path_length.sum())
+        report = {
+            'original_length': total_length,
+            'kept_length': kept_length,
+            'saved_length': total_length - kept_length,
+            'contours_in': len(contours),
+            'contours_out': len(result),
+            'contours_dropped': dropped_contours
+        }
+        return result, report
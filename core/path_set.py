@@ -0,0 +1,109 @@
+import numpy as np
+from .geometry import pack_contours, packed_geometry
+
+
+class PathSet:
+    """Набор путей в упакованном виде (как CSR-матрица)
+
+    Все точки лежат в одном массиве points (M, 2), путь i - это строки
+    points[offsets[i]:offsets[i + 1]]. Вместо K отдельных массивов NumPy -
+    два, поэтому сортировка, фильтрация и преобразования делаются одним
+    векторным вызовом на весь набор.
+
+    Путь, полученный индексом или при переборе, - представление (N, 1, 2)
+    без копии, в том же виде, что контур OpenCV. Срез с шагом 1 тоже не
+    копирует точки.
+    """
+
+    __slots__ = ("points", "offsets")
+
+    def __init__(self, points, offsets):
+        self.points = points
+        self.offsets = offsets
+
+    @classmethod
+    def from_contours(cls, contours, dtype=None):
+        """Упаковывает список контуров (тип точек сохраняется, если dtype не задан)"""
+        if isinstance(contours, cls):
+            return contours
+        if dtype is None:
+            dtypes = {np.asarray(contour).dtype for contour in contours}
+            dtype = np.result_type(*dtypes) if dtypes else np.int32
+        return cls(*pack_contours(contours, dtype))
+
+    @classmethod
+    def empty(cls, dtype=np.int32):
+        return cls(np.zeros((0, 2), dtype=dtype), np.zeros(1, dtype=np.int64))
+
+    @classmethod
+    def concatenate(cls, sets, dtype=np.int32):
+        """Один набор из нескольких: пути идут подряд в порядке sets"""
+        sets = list(sets)
+        if not sets:
+            return cls.empty(dtype)
+        if len(sets) == 1:
+            return sets[0]
+        shifts = np.cumsum([0] + [len(paths.points) for paths in sets[:-1]])
+        offsets = np.concatenate([sets[0].offsets[:1]]
+                                 + [paths.offsets[1:] + shift for paths, shift in zip(sets, shifts)])
+        return cls(np.concatenate([paths.points for paths in sets]), offsets)
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __iter__(self):
+        points = self.points.reshape(-1, 1, 2)
+        bounds = self.offsets.tolist()
+        for start, end in zip(bounds[:-1], bounds[1:]):
+            yield points[start:end]
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            start, stop, step = key.indices(len(self))
+            if step == 1:
+                stop = max(start, stop)
+                offsets = self.offsets[start:stop + 1]
+                return PathSet(self.points[offsets[0]:offsets[-1]], offsets - offsets[0])
+            return self.take(np.arange(start, stop, step))
+        if isinstance(key, (int, np.integer)):
+            if key < 0:
+                key += len(self)
+            start, end = self.offsets[key], self.offsets[key + 1]
+            return self.points[start:end].reshape(-1, 1, 2)
+        return self.take(key)
+
+    @property
+    def counts(self):
+        """Число точек в каждом пути"""
+        return np.diff(self.offsets)
+
+    @property
+    def nbytes(self):
+        return self.points.nbytes + self.offsets.nbytes
+
+    def take(self, order):
+        """Новый набор из путей в порядке order (перестановка или выборка индексов)"""
+        order = np.asarray(order, dtype=np.int64)
+        counts = self.counts[order]
+        offsets = np.zeros(len(order) + 1, dtype=np.int64)
+        np.cumsum(counts, out=offsets[1:])
+        # Индекс каждой точки: начало её пути в старом массиве + номер внутри пути
+        shift = np.repeat(self.offsets[:-1][order] - offsets[:-1], counts)
+        return PathSet(self.points[np.arange(offsets[-1]) + shift], offsets)
+
+    def filter(self, mask):
+        """Пути, для которых mask истинна"""
+        return self.take(np.flatnonzero(mask))
+
+    def transform(self, scale=(1.0, 1.0), offset=(0.0, 0.0)):
+        """Масштаб и сдвиг всех точек одной операцией (результат - float64)"""
+        return PathSet(self.points * np.asarray(scale, dtype=np.float64)
+                       + np.asarray(offset, dtype=np.float64), self.offsets)
+
+    def geometry(self):
+        """Длины, площади и центры масс путей (см. geometry.packed_geometry)"""
+        return packed_geometry(self.points.astype(np.float64, copy=False), self.offsets)
+
+    def to_contours(self):
+        """Список контуров OpenCV (представления без копий)"""
+        return list(self)
@@ -1,23 +1,51 @@
+import os
+import shutil
 from pathlib import Path
 from datetime import datetime
+from .artifact_store import ArtifactStore, JobIndex
 
 class ProjectManager:
     def __init__(self, project_root="project"):
         self.project_root = Path(project_root)
         self.setup_directories()
-        
+        # Результаты по хешу содержимого и журнал заданий
+        self.store = ArtifactStore(self.project_root / "store")
+        self.jobs = JobIndex(self.project_root / "jobs.sqlite")
+
     def setup_directories(self):
         """Создает структуру папок проекта"""
         directories = ["images", "previews", "gcode", "outputs"]
         for directory in directories:
             (self.project_root / directory).mkdir(parents=True, exist_ok=True)
-    
+
     def get_unique_filename(self, base_name, extension, subfolder=""):
-        """Генерирует уникальное имя файла с timestamp"""
+        """Генерирует уникальное имя файла с timestamp
+
+        Имя сразу резервируется созданием пустого файла (O_EXCL), поэтому
+        параллельные процессы и повторы в ту же секунду не перезапишут друг друга.
+        """
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
         safe_name = base_name.replace(" ", "_").lower()
-        filename = f"{safe_name}_{timestamp}.{extension}"
-        
-        if subfolder:
-            return self.project_root / subfolder / filename
-        return self.project_root / filename
\ No newline at end of file
+        folder = self.project_root / subfolder if subfolder else self.project_root
+
+        counter = 0
+        while True:
+            suffix = f"_{counter}" if counter else ""
+            path = folder / f"{safe_name}_{timestamp}{suffix}.{extension}"
+            try:
+                os.close(os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+                return path
+            except FileExistsError:
+                counter += 1
+
+    def publish(self, artifact_path, base_name, extension, subfolder=""):
+        """Копия файла из хранилища под человекочитаемым именем
+
+        Именно копия, а не жёсткая ссылка: правка опубликованного файла
+        не должна менять объект хранилища.
+        """
+        path = self.get_unique_filename(base_name, extension, subfolder)
+        temp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+        shutil.copyfile(artifact_path, temp_path)
+        os.replace(temp_path, path)   # Поверх зарезервированного пустого файла
+        return path
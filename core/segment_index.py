@@ -0,0 +1,232 @@
+import numpy as np
+from utils.helpers import parse_gcode_words
+
+# Уровень детализации строится, пока отрезков заметно больше этого числа
+_LOD_MIN_SEGMENTS = 20000
+# Ячеек самого мелкого яруса сетки на сторону охвата
+_GRID_CELLS = 256
+
+
+def gcode_segments(gcode_lines):
+    """Отрезки программы: (рисование (N, 4), холостые (M, 4)) - x0, y0, x1, y1 в мм
+
+    Перо опущено между M3 и M5; если в файле нет M3/M5, рисованием считается G1.
+    Учитываются G90/G91 и модальный G0/G1.
+    """
+    draw = []
+    travel = []
+    x = y = 0.0
+    motion = None
+    pen = None
+    relative = False
+    for line_text in gcode_lines:
+        words = parse_gcode_words(line_text)
+        if not words:
+            continue
+        if words.get('M') in (3, 4):
+            pen = True
+            continue
+        if words.get('M') == 5:
+            pen = False
+            continue
+        code = words.get('G')
+        if code == 90:
+            relative = False
+        elif code == 91:
+            relative = True
+        elif code in (0, 1):
+            motion = code
+        elif code is not None:
+            continue
+        if motion is None or ('X' not in words and 'Y' not in words):
+            continue
+
+        if relative:
+            new_x = x + words.get('X', 0.0)
+            new_y = y + words.get('Y', 0.0)
+        else:
+            new_x = words.get('X', x)
+            new_y = words.get('Y', y)
+        if new_x != x or new_y != y:
+            drawing = motion == 1 and pen is not False
+            (draw if drawing else travel).append((x, y, new_x, new_y))
+        x, y = new_x, new_y
+
+    def to_array(segments):
+        return np.array(segments, dtype=np.float32).reshape(-1, 4)
+    return to_array(draw), to_array(travel)
+
+
+class SegmentGrid:
+    """Свободная (loose) иерархия сеток над отрезками - плоский аналог квадродерева
+
+    Отрезок лежит в ячейке своей середины на самом мелком ярусе, ячейка
+    которого не меньше его размаха; на ярусе j ячейка в 2^j раз крупнее
+    базовой. Ячейки яруса упорядочены по строкам и упакованы как CSR,
+    поэтому ячейки одной строки окна - один непрерывный срез массива.
+    Отрезки длиннее самой крупной ячейки проверяются по рамке векторно.
+    """
+
+    __slots__ = ("origin", "tiers", "long_segments")
+
+    def __init__(self, segments, origin, cell, extent):
+        self.origin = origin
+        span = np.maximum(np.abs(segments[:, 2] - segments[:, 0]),
+                          np.abs(segments[:, 3] - segments[:, 1]))
+        tier_of = np.ceil(np.log2(np.maximum(span / cell, 1.0))).astype(np.int64)
+        tiers_count = max(1, int(np.ceil(np.log2(max(extent / cell, 1.0)))) + 1)
+        self.long_segments = segments[tier_of >= tiers_count]
+
+        self.tiers = []
+        for tier in range(tiers_count):
+            members = segments[tier_of == tier]
+            if not len(members):
+                continue
+            size = cell * (1 << tier)
+            cols = int(extent / size) + 1
+            mid_x = (members[:, 0] + members[:, 2]) * 0.5
+            mid_y = (members[:, 1] + members[:, 3]) * 0.5
+            col = np.clip(((mid_x - origin[0]) / size).astype(np.int64), 0, cols - 1)
+            row = np.clip(((mid_y - origin[1]) / size).astype(np.int64), 0, cols - 1)
+            keys = row * cols + col
+            order = np.argsort(keys, kind='stable')
+            offsets = np.zeros(cols * cols + 1, dtype=np.int64)
+            np.cumsum(np.bincount(keys, minlength=cols * cols), out=offsets[1:])
+            self.tiers.append((size, cols, members[order], offsets))
+
+    def query(self, x0, y0, x1, y1):
+        """Отрезки, которые могут пересекать окно [x0, x1] x [y0, y1]"""
+        parts = []
+        for size, cols, members, offsets in self.tiers:
+            # Середина отрезка не дальше полуячейки от окна, если он его задевает
+            half = size * 0.5
+            c0 = max(0, int((x0 - half - self.origin[0]) // size))
+            c1 = min(cols - 1, int((x1 + half - self.origin[0]) // size))
+            r0 = max(0, int((y0 - half - self.origin[1]) // size))
+            r1 = min(cols - 1, int((y1 + half - self.origin[1]) // size))
+            if c0 > c1:
+                continue
+            for row in range(r0, r1 + 1):
+                start = offsets[row * cols + c0]
+                end = offsets[row * cols + c1 + 1]
+                if end > start:
+                    parts.append(members[start:end])
+
+        long_segments = self.long_segments
+        if len(long_segments):
+            inside = ((np.minimum(long_segments[:, 0], long_segments[:, 2]) <= x1)
+                      & (np.maximum(long_segments[:, 0], long_segments[:, 2]) >= x0)
+                      & (np.minimum(long_segments[:, 1], long_segments[:, 3]) <= y1)
+                      & (np.maximum(long_segments[:, 1], long_segments[:, 3]) >= y0))
+            parts.append(long_segments[inside])
+        if not parts:
+            return np.zeros((0, 4), dtype=np.float32)
+        return np.concatenate(parts)
+
+
+class SegmentIndex:
+    """Отрезки программы с уровнями детализации для просмотра
+
+    Уровень k - концы отрезков, привязанные к сетке с шагом 2^k * base, без
+    повторов и без отрезков нулевой длины. При отдалении, когда в пиксель
+    попадает много отрезков, берётся самый грубый уровень, шаг которого ещё
+    не больше пикселя, - на экране разницы нет, а отрезков в разы меньше.
+    """
+
+    def __init__(self, segments):
+        segments = np.asarray(segments, dtype=np.float32).reshape(-1, 4)
+        if len(segments):
+            low = np.minimum(segments[:, [0, 1]], segments[:, [2, 3]]).min(axis=0)
+            high = np.maximum(segments[:, [0, 1]], segments[:, [2, 3]]).max(axis=0)
+        else:
+            low = high = np.zeros(2, dtype=np.float32)
+        self.bounds = (float(low[0]), float(low[1]), float(high[0]), float(high[1]))
+        extent = max(float((high - low).max()), 1e-3)
+
+        self.count = len(segments)
+        self.levels = [(0.0, self._grid(segments, extent))]
+        step = extent / 4096.0
+        current = segments
+        while len(current) > _LOD_MIN_SEGMENTS and step < extent / 64.0:
+            simplified = self._snap(segments, step)
+            if len(simplified) < 0.8 * len(current):
+                self.levels.append((step, self._grid(simplified, extent)))
+                current = simplified
+            step *= 2.0
+
+    def _grid(self, segments, extent):
+        return SegmentGrid(segments, np.array(self.bounds[:2]), extent / _GRID_CELLS, extent)
+
+    def _snap(self, segments, step):
+        """Привязка концов к сетке step, без повторов и вырожденных отрезков"""
+        snapped = np.round((segments - np.tile(self.bounds[:2], 2)) / step).astype(np.int32)
+        # Направление не важно: (a, b) и (b, a) - один отрезок
+        swap = (snapped[:, 0] > snapped[:, 2]) | ((snapped[:, 0] == snapped[:, 2])
+                                                  & (snapped[:, 1] > snapped[:, 3]))
+        snapped[swap] = snapped[swap][:, [2, 3, 0, 1]]
+        snapped = snapped[(snapped[:, 0] != snapped[:, 2]) | (snapped[:, 1] != snapped[:, 3])]
+        # Повторы - по одному ключу int64 на отрезок (np.unique по строкам намного медленнее)
+        base = int(np.ceil((max(self.bounds[2] - self.bounds[0],
+                                self.bounds[3] - self.bounds[1])) / step)) + 2
+        wide = snapped.astype(np.int64)
+        keys = ((wide[:, 0] * base + wide[:, 1]) * base + wide[:, 2]) * base + wide[:, 3]
+        _, first = np.unique(keys, return_index=True)
+        return (snapped[first] * step + np.tile(self.bounds[:2], 2)).astype(np.float32)
+
+    def level_for(self, pixel_size):
+        """Самый грубый уровень, шаг которого не больше размера пикселя (мм)"""
+        best = 0
+        for level, (step, _) in enumerate(self.levels):
+            if step <= pixel_size:
+                best = level
+        return best
+
+    def query(self, x0, y0, x1, y1, pixel_size=0.0):
+        """Отрезки окна на подходящем уровне детализации: (массив (K, 4), уровень)"""
+        level = self.level_for(pixel_size)
+        return self.levels[level][1].query(x0, y0, x1, y1), level
+
+
+def rasterize_segments(image, segments, x0, y0, scale, value=0):
+    """Рисует отрезки (мм) в изображение: пиксель = (x - x0) * scale, (y - y0) * scale
+
+    Отрезки сначала обрезаются по окну (Лианг - Барски), затем каждый
+    заполняется точками с шагом не больше пикселя - всё векторно, без
+    цикла Python по отрезкам.
+    """
+    height, width = image.shape[:2]
+    if not len(segments):
+        return image
+    px0 = (segments[:, 0] - x0) * scale
+    py0 = (segments[:, 1] - y0) * scale
+    dx = (segments[:, 2] - x0) * scale - px0
+    dy = (segments[:, 3] - y0) * scale - py0
+
+    # Обрезка параметра t в [0, 1] по четырём сторонам окна
+    t0 = np.zeros(len(segments), dtype=np.float32)
+    t1 = np.ones(len(segments), dtype=np.float32)
+    keep = np.ones(len(segments), dtype=bool)
+    for p, q in ((-dx, px0), (dx, width - 1 - px0), (-dy, py0), (dy, height - 1 - py0)):
+        parallel = p == 0
+        keep &= ~(parallel & (q < 0))
+        with np.errstate(divide='ignore', invalid='ignore'):
+            r = np.where(parallel, 0.0, q / p)
+        entering = (p < 0) & ~parallel
+        leaving = (p > 0) & ~parallel
+        t0 = np.where(entering, np.maximum(t0, r), t0)
+        t1 = np.where(leaving, np.minimum(t1, r), t1)
+    keep &= t0 <= t1
+    if not keep.any():
+        return image
+    px0, py0, dx, dy, t0, t1 = (a[keep] for a in (px0, py0, dx, dy, t0, t1))
+    sx, sy = px0 + dx * t0, py0 + dy * t0
+    dx, dy = dx * (t1 - t0), dy * (t1 - t0)
+
+    steps = np.ceil(np.maximum(np.abs(dx), np.abs(dy))).astype(np.int64) + 1
+    owner = np.repeat(np.arange(len(steps)), steps)
+    first = np.cumsum(steps) - steps
+    t = (np.arange(owner.size) - first[owner]) / np.maximum(steps - 1, 1)[owner]
+    xs = np.clip(np.rint(sx[owner] + dx[owner] * t), 0, width - 1).astype(np.intp)
+    ys = np.clip(np.rint(sy[owner] + dy[owner] * t), 0, height - 1).astype(np.intp)
+    image[ys, xs] = value
+    return image
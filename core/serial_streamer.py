@@ -0,0 +1,230 @@
+import queue
+import threading
+import time
+from collections import deque
+from utils.metrics import metrics
+
+
+class SerialStreamer:
+    """Отправка программы в порт из отдельного потока ввода-вывода
+
+    Поток один владеет портом; GUI общается с ним только через очереди:
+    commands (пауза, продолжение, отмена) и events (лог, состояние, итог).
+
+    Поток не ждёт ответ на каждую строку: строки идут, пока их байты
+    помещаются в приёмный буфер контроллера (подсчёт символов, как у GRBL),
+    поэтому следующая строка уже лежит в контроллере, когда он закончил
+    текущую. Каждое "ok"/"error" освобождает байты самой старой строки.
+
+    Пауза сразу прекращает подачу строк и поднимает перо (команда идёт
+    первой в очереди, перед остальной программой); продолжение опускает
+    перо обратно, если оно было опущено. Отмена прекращает подачу, поднимает
+    перо и дожидается ответов на уже отправленное.
+    """
+
+    def __init__(self, port, config=None, telemetry=None):
+        self.config = {
+            "rx_buffer": 64,              # Приёмный буфер контроллера, байт
+            "poll_interval": 0.05,        # Таймаут чтения порта - период проверки команд, сек
+            "ack_timeout": 30.0,          # Нет ответа так долго - ошибка связи, сек
+            "pen_up_command": "M5",
+            "pen_down_command": "M3 S0",
+            "feed_hold": None,            # Символ мгновенной остановки ("!" у GRBL)
+            "cycle_start": None,          # Символ продолжения ("~" у GRBL)
+            "soft_reset": None,           # Символ сброса при отмене ("\x18" у GRBL)
+            "log_lines": True             # Писать каждую строку и ответ в лог (debug)
+        }
+        if config:
+            self.config.update(config)
+        self.port = port
+        self.telemetry = telemetry
+        self.commands = queue.Queue()
+        self.events = queue.Queue()
+        self.state = "idle"
+        self.thread = None
+        self.sent = 0
+        self.acked = 0
+        self.sent_bytes = 0
+
+    # --- Вызовы из GUI ---
+
+    def start(self, gcode_lines):
+        """Запускает поток отправки; строки - уже готовые к передаче"""
+        self.lines = [line for line in gcode_lines if line and not line.startswith(';')]
+        self.sent = self.acked = self.sent_bytes = 0
+        if self.telemetry is not None:
+            self.telemetry.start(self.lines)
+        self._set_state("running")
+        self.thread = threading.Thread(target=self._run, name="serial-io", daemon=True)
+        self.thread.start()
+
+    def pause(self):
+        self.commands.put("pause")
+
+    def resume(self):
+        self.commands.put("resume")
+
+    def abort(self):
+        self.commands.put("abort")
+
+    def is_alive(self):
+        return self.thread is not None and self.thread.is_alive()
+
+    def drain_events(self):
+        """Все накопленные события без ожидания"""
+        events = []
+        while True:
+            try:
+                events.append(self.events.get_nowait())
+            except queue.Empty:
+                return events
+
+    # --- Поток ввода-вывода ---
+
+    def _set_state(self, state):
+        self.state = state
+        self.events.put(("state", state))
+
+    def _log(self, message, level="info"):
+        self.events.put(("log", level, message))
+
+    def _run(self):
+        port = self.port
+        old_timeout = port.timeout
+        port.timeout = self.config["poll_interval"]
+        self.rx = bytearray()
+        self.in_flight = deque()      # (байт, строка программы?) - отправлено, ответа нет
+        self.urgent = deque()         # Служебные строки вне очереди (перо при паузе)
+        self.pen_down = False
+        self.pen_down_at_pause = False
+        self.stopping = False
+        self.last_response = time.monotonic()
+        started = time.perf_counter()
+        index = 0
+        final_state = "done"
+
+        try:
+            with metrics.stage("serial_send") as stage:
+                while True:
+                    self._handle_commands()
+                    if self.stopping:
+                        index = len(self.lines)
+
+                    # Буфер контроллера заполняется до предела: сначала служебные строки
+                    while self.urgent and self._fits(self.urgent[0]):
+                        self._write(self.urgent.popleft(), False)
+                    while (self.state == "running" and not self.urgent and index < len(self.lines)
+                           and self._fits(self.lines[index])):
+                        self._write(self.lines[index], True)
+                        index += 1
+
+                    if index >= len(self.lines) and not self.in_flight and not self.urgent:
+                        break
+                    if not self.in_flight:
+                        # Пауза и всё подтверждено - ждём команду, порт не опрашиваем
+                        try:
+                            self._handle_command(self.commands.get(timeout=self.config["poll_interval"]))
+                        except queue.Empty:
+                            pass
+                        self.last_response = time.monotonic()
+                        continue
+                    self._read_responses()
+                    if time.monotonic() - self.last_response > self.config["ack_timeout"]:
+                        raise TimeoutError(f"Нет ответа контроллера {self.config['ack_timeout']:.0f} с")
+                stage.count(self.acked)
+            final_state = "aborted" if self.stopping else "done"
+        except Exception as e:
+            self._log(f"✗ Ошибка отправки: {e}", "error")
+            final_state = "error"
+        finally:
+            port.timeout = old_timeout
+
+        if self.telemetry is not None:
+            self.telemetry.finish(ok=final_state == "done")
+        elapsed = time.perf_counter() - started
+        self._set_state(final_state)
+        self.events.put(("finished", final_state, {
+            'lines': self.acked, 'total': len(self.lines),
+            'bytes': self.sent_bytes, 'elapsed': elapsed
+        }))
+
+    def _handle_commands(self):
+        while True:
+            try:
+                self._handle_command(self.commands.get_nowait())
+            except queue.Empty:
+                return
+
+    def _handle_command(self, command):
+        if command == "pause" and self.state == "running":
+            self._realtime(self.config["feed_hold"])
+            self.pen_down_at_pause = self.pen_down
+            if self.pen_down:
+                self.urgent.append(self.config["pen_up_command"])
+            self._set_state("paused")
+        elif command == "resume" and self.state == "paused":
+            if self.pen_down_at_pause:
+                self.urgent.append(self.config["pen_down_command"])
+            self._realtime(self.config["cycle_start"])
+            self._set_state("running")
+        elif command == "abort" and not self.stopping:
+            self.stopping = True
+            if self.config["soft_reset"]:
+                # Сброс контроллера: буфер и движение сброшены, ответов не будет
+                self._realtime(self.config["soft_reset"])
+                self.in_flight.clear()
+                self.urgent.clear()
+            elif self.pen_down:
+                self.urgent.append(self.config["pen_up_command"])
+            self._set_state("aborting")
+
+    def _realtime(self, symbol):
+        """Символ мгновенного действия - в порт сразу, мимо буфера строк"""
+        if symbol:
+            self.port.write(symbol.encode())
+
+    def _fits(self, line):
+        # Пустой буфер принимает любую строку, иначе длинная строка не ушла бы никогда
+        used = sum(size for size, _ in self.in_flight)
+        return not self.in_flight or used + len(line) + 1 <= self.config["rx_buffer"]
+
+    def _write(self, line, from_program):
+        data = (line + '\n').encode()
+        self.port.write(data)
+        self.in_flight.append((len(data), from_program))
+        self.sent_bytes += len(data)
+        if from_program:
+            self.sent += 1
+        command = line[:3].upper()
+        if command.startswith("M3") or command.startswith("M4"):
+            self.pen_down = True
+        elif command.startswith("M5"):
+            self.pen_down = False
+        if self.config["log_lines"]:
+            self._log(f"> {line}", "debug")
+
+    def _read_responses(self):
+        data = self.port.read(self.port.in_waiting or 1)
+        if not data:
+            return
+        self.rx.extend(data)
+        while b'\n' in self.rx:
+            raw, _, rest = self.rx.partition(b'\n')
+            self.rx = bytearray(rest)
+            response = raw.decode(errors='replace').strip()
+            if not response:
+                continue
+            self.last_response = time.monotonic()
+            if self.config["log_lines"]:
+                self._log(f"< {response}", "debug")
+            lowered = response.lower()
+            if not (lowered.startswith("ok") or lowered.startswith("error")):
+                continue   # Сообщения контроллера ("Ready", "Homed") - не подтверждения
+            if lowered.startswith("error"):
+                self._log(f"Контроллер: {response}", "warning")
+            if self.in_flight:
+                _, from_program = self.in_flight.popleft()
+                if from_program:
+                    self.acked += 1
+                    if self.telemetry is not None:
+                        self.telemetry.ack()
@@ -0,0 +1,166 @@
+import math
+import time
+import numpy as np
+from scipy.spatial import cKDTree
+from utils.metrics import metrics
+
+# Сколько пикселей сетки плотности приходится на одну точку (меньше - быстрее, грубее)
+_SAMPLES_PER_POINT = 8
+# Размер списка ближайших соседей для 2-opt
+_NEIGHBORS = 8
+
+
+def density_grid(gray, n_points):
+    """Плотность тона (1 - яркость) на сетке не крупнее, чем нужно для n_points точек
+
+    Возвращает координаты центров ячеек в пикселях исходного изображения и их веса
+    (только ячейки с ненулевым весом).
+    """
+    height, width = gray.shape
+    step = max(1, int(math.sqrt(height * width / (n_points * _SAMPLES_PER_POINT))))
+    rows, cols = height // step, width // step
+    tone = 1.0 - gray[:rows * step, :cols * step].astype(np.float32) / 255.0
+    # Среднее по ячейке step x step
+    weights = tone.reshape(rows, step, cols, step).mean(axis=(1, 3)).ravel()
+    ys, xs = np.divmod(np.arange(rows * cols), cols)
+    coords = np.column_stack([xs, ys]).astype(np.float64) * step + (step - 1) / 2.0
+    keep = weights > 1e-3
+    return coords[keep], weights[keep].astype(np.float64), step
+
+
+def stipple_points(gray, n_points, iterations=10, seed=0):
+    """Точки пунктира взвешенной релаксацией Ллойда (центроидная диаграмма Вороного)
+
+    Каждая итерация приписывает ячейки сетки ближайшей точке (KD-дерево) и
+    переносит точку в центр тяжести своих ячеек с весом - плотностью тона.
+    Центры считаются сразу для всех точек через np.bincount.
+    """
+    coords, weights, step = density_grid(gray, n_points)
+    if len(weights) == 0 or n_points <= 0:
+        return np.empty((0, 2))
+    n_points = min(n_points, len(weights))
+
+    # Начальные точки - выборка ячеек с вероятностью по плотности, со сдвигом внутри ячейки
+    rng = np.random.default_rng(seed)
+    chosen = rng.choice(len(weights), n_points, replace=False, p=weights / weights.sum())
+    points = coords[chosen] + rng.uniform(-step / 2, step / 2, (n_points, 2))
+
+    weighted_x = weights * coords[:, 0]
+    weighted_y = weights * coords[:, 1]
+    with metrics.stage("stipple.lloyd", n_points):
+        for _ in range(iterations):
+            _, labels = cKDTree(points).query(coords, workers=-1)
+            mass = np.bincount(labels, weights, minlength=n_points)
+            filled = mass > 0   # Точка без ячеек остаётся на месте
+            points[filled, 0] = np.bincount(labels, weighted_x, n_points)[filled] / mass[filled]
+            points[filled, 1] = np.bincount(labels, weighted_y, n_points)[filled] / mass[filled]
+    return points
+
+
+def nearest_neighbor_tour(points):
+    """Жадный обход: каждый раз к ближайшей непосещённой точке (KD-дерево)"""
+    n = len(points)
+    tree = cKDTree(points)
+    visited = np.zeros(n, dtype=bool)
+    tour = np.empty(n, dtype=np.int64)
+    # Начинаем с угла, ближайшего к началу координат станка
+    current = int(np.argmin(points[:, 0] + points[:, 1]))
+    visited[current] = True
+    tour[0] = current
+
+    for step in range(1, n):
+        k = _NEIGHBORS
+        nearest = -1
+        while k <= 256 and nearest < 0:
+            _, idx = tree.query(points[current], k=min(k, n))
+            candidates = idx[~visited[idx]]
+            if len(candidates):
+                nearest = int(candidates[0])
+            k *= 4
+        if nearest < 0:
+            # Все соседи уже посещены - полный перебор оставшихся
+            remaining = np.flatnonzero(~visited)
+            offsets = points[remaining] - points[current]
+            nearest = int(remaining[np.argmin(np.einsum('ij,ij->i', offsets, offsets))])
+        visited[nearest] = True
+        tour[step] = nearest
+        current = nearest
+    return tour
+
+
+def two_opt(points, tour, time_limit=2.0):
+    """Улучшение незамкнутого обхода 2-opt по спискам ближайших соседей
+
+    Для ребра (a, b) проверяются только рёбра, начинающиеся у соседей a, которые
+    ближе b, - это O(n * k) проверок за проход вместо O(n^2). Останавливается,
+    когда проход ничего не улучшил или истекло time_limit секунд.
+    """
+    n = len(tour)
+    if n < 4:
+        return tour
+    deadline = time.perf_counter() + time_limit
+    _, neighbors = cKDTree(points).query(points, k=min(_NEIGHBORS + 1, n))
+    neighbors = neighbors[:, 1:].tolist()
+    xs = points[:, 0].tolist()
+    ys = points[:, 1].tolist()
+    tour = tour.copy()
+    position = np.empty(n, dtype=np.int64)
+    position[tour] = np.arange(n)
+
+    def dist(p, q):
+        return math.hypot(xs[p] - xs[q], ys[p] - ys[q])
+
+    improved = True
+    while improved and time.perf_counter() < deadline:
+        improved = False
+        for i in range(n - 1):
+            a = int(tour[i])
+            b = int(tour[i + 1])
+            ab = dist(a, b)
+            for c in neighbors[a]:
+                ac = dist(a, c)
+                if ac >= ab:
+                    break   # Соседи отсортированы - дальше выигрыша нет
+                j = int(position[c])
+                if i - 1 <= j <= i + 1:
+                    continue
+                if j > i:
+                    # a-b ... c-d  ->  a-c ... b-d (разворот b..c)
+                    d = int(tour[j + 1]) if j + 1 < n else -1
+                    delta = ac - ab + ((dist(b, d) - dist(c, d)) if d >= 0 else 0.0)
+                    first, last = i + 1, j
+                else:
+                    # c-d ... a-b  ->  c-a ... d-b (разворот d..a)
+                    d = int(tour[j + 1])
+                    delta = ac + dist(d, b) - dist(c, d) - ab
+                    first, last = j + 1, i
+                if delta < -1e-9:
+                    segment = tour[first:last + 1][::-1].copy()
+                    tour[first:last + 1] = segment
+                    position[segment] = np.arange(first, last + 1)
+                    improved = True
+                    break
+            if (i & 1023) == 0 and time.perf_counter() >= deadline:
+                break
+    return tour
+
+
+def tour_length(points, tour):
+    ordered = points[tour]
+    return float(np.hypot(*np.diff(ordered, axis=0).T).sum())
+
+
+def tsp_path(gray, n_points, iterations=10, time_limit=2.0, seed=0):
+    """Непрерывный путь через точки пунктира - один контур (N, 1, 2) int32 без подъёмов пера"""
+    points = stipple_points(gray, n_points, iterations, seed)
+    if len(points) < 2:
+        return np.empty((0, 1, 2), dtype=np.int32)
+    with metrics.stage("stipple.tour", len(points)):
+        tour = nearest_neighbor_tour(points)
+        tour = two_opt(points, tour, time_limit)
+
+    path = np.rint(points[tour]).astype(np.int32)
+    # Точки, попавшие в один пиксель, дали бы перемещения нулевой длины
+    keep = np.ones(len(path), dtype=bool)
+    keep[1:] = np.any(path[1:] != path[:-1], axis=1)
+    return path[keep].reshape(-1, 1, 2)
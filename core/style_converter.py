@@ -1,171 +1,362 @@
 import cv2
 import numpy as np
-import random
+from utils.metrics import metrics
+from .buffer_pool import local_pool
+from .path_set import PathSet
+from .stippling import tsp_path
 
 class StyleConverter:
-    def __init__(self):
-        self.styles = {
-            "pencil": self._pencil_style,
-            "pen_hatching": self._pen_hatching_style,
-            "makelangelo5": self._makelangelo5_style,
-            "portrait": self._portrait_style,
-            "sketch": self._sketch_style,
-            "contour": self._contour_style,
-            "silhouette": self._silhouette_style,
-            "blurred": self._blurred_style
-        }
-    
-    def _sketch_style(self, image):
-        """Стиль эскиза из первого проекта"""
-        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-        inverted = 255 - gray
-        blurred = cv2.GaussianBlur(inverted, (21, 21), 0)
-        sketch = cv2.divide(gray, 255 - blurred, scale=256)
-        return sketch
-    
-    def _contour_style(self, image):
-        """Стиль контура из первого проекта"""
-        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-        edges = cv2.Canny(gray, threshold1=50, threshold2=150)
-        kernel = np.ones((1, 1), np.uint8)
-        edges_dilated = cv2.dilate(edges, kernel, iterations=1)
-        contours = np.zeros_like(gray)
-        contours[edges_dilated != 0] = 255
-        return contours
-    
-    def _silhouette_style(self, image):
-        """Стиль силуэта из первого проекта"""
-        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-        _, binary = cv2.threshold(gray, 127, 255, cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU)
-        return binary
-    
-    def _blurred_style(self, image):
-        """Размытый контур из первого проекта"""
-        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-        blurred_gray = cv2.medianBlur(gray, 7)
-        edges_soft = cv2.Laplacian(blurred_gray, cv2.CV_8U, ksize=5)
-        _, edge_mask = cv2.threshold(edges_soft, 80, 255, cv2.THRESH_BINARY_INV)
-        return edge_mask
-    
-    def _pencil_style(self, image):
-        """Карандашный стиль из второго проекта"""
-        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-        inverted = cv2.bitwise_not(gray)
-        blurred = cv2.GaussianBlur(inverted, (21, 21), 0, 0)
-        pencil_sketch = cv2.divide(gray, 255 - blurred, scale=256.0)
-        noise = np.random.normal(0, 15, pencil_sketch.shape).astype(np.uint8)
-        pencil_sketch = cv2.add(pencil_sketch, noise)
-        pencil_sketch = cv2.equalizeHist(pencil_sketch)
-        return pencil_sketch
-    
-    def _pen_hatching_style(self, image):
-        """Штриховка ручкой из второго проекта"""
-        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-        hatching_layers = []
-        angles = [45, 135]
-        
-        for angle in angles:
-            kernel = self._create_hatching_kernel(angle, length=7)
-            hatched = cv2.filter2D(gray, cv2.CV_32F, kernel)
-            hatching_layers.append(hatched)
-        
-        combined = np.zeros_like(gray, dtype=np.float32)
-        for layer in hatching_layers:
-            combined = np.maximum(combined, layer)
-        
-        combined = cv2.normalize(combined, None, 0, 255, cv2.NORM_MINMAX)
-        combined = np.uint8(combined)
-        result = cv2.bitwise_not(combined)
-        result = cv2.adaptiveThreshold(result, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, 
-                                      cv2.THRESH_BINARY, 11, 2)
-        return result
-    
+    """Стили как небольшой граф именованных операций
+
+    Каждая операция объявляет свои входы ("image" - исходное изображение).
+    Для одного изображения каждая операция считается один раз, поэтому общие
+    шаги (серый канал, осветление, инверсия) разделяются между стилями.
+    Промежуточные результаты лежат в буферах пула под именем операции и
+    не должны изменяться потребителями; итоговый стиль - всегда новый массив.
+
+    Новый стиль подключается без правки класса:
+
+        @register_style("my_style", "gray")
+        def _my_style(converter, gray):
+            return cv2.Canny(gray, 10, 50)
+    """
+
+    DEFAULT_PARAMS = {
+        "blur_ksize": 21,            # Размер ядра размытия (sketch, pencil)
+        "canny_low": 50,             # Нижний порог Canny
+        "canny_high": 150,           # Верхний порог Canny
+        "binary_threshold": 128,     # Порог бинаризации (makelangelo5)
+        "median_ksize": 7,           # Медианное размытие (blurred)
+        "edge_threshold": 80,        # Порог краев Лапласиана (blurred)
+        "pencil_noise": 15,          # Шум карандаша
+        "makelangelo_noise": 5,      # Шум Makelangelo
+        "hatching_length": 7,        # Длина штриха
+        "portrait_threshold": 100,   # Минимальная интенсивность для портрета
+        "portrait_step": 3,          # Шаг линий портрета
+        "stipple_points": 20000,     # Точек пунктира на мегапиксель изображения
+        "stipple_iterations": 10,    # Итераций релаксации Ллойда
+        "tsp_time_limit": 2.0,       # Время на улучшение обхода точек (2-opt), сек
+        "noise_seed": 0              # Зерно текстур шума (None - новое на каждый пул)
+    }
+
+    # Параметры в пикселях изображения: имя -> нужно ли нечётное значение (размер ядра)
+    SPATIAL_PARAMS = {
+        "blur_ksize": True,
+        "median_ksize": True,
+        "hatching_length": False,
+        "portrait_step": False
+    }
+
+    # Имя операции -> (функция(converter, *входы), имена входов)
+    OPERATIONS = {}
+    # Операции, которые можно выбрать как стиль
+    STYLES = []
+    # Векторные стили: стиль -> операция, возвращающая готовые пути для G-code
+    VECTOR_STYLES = {}
+
+    @classmethod
+    def register_operation(cls, name, *inputs):
+        """Декоратор: промежуточная операция графа"""
+        def decorator(func):
+            cls.OPERATIONS[name] = (func, inputs)
+            return func
+        return decorator
+
+    @classmethod
+    def register_style(cls, name, *inputs, paths=None):
+        """Декоратор: операция-стиль (должна возвращать новый массив)
+
+        paths - операция, которая даёт пути стиля напрямую (поиск контуров не нужен).
+        """
+        def decorator(func):
+            cls.OPERATIONS[name] = (func, inputs)
+            if name not in cls.STYLES:
+                cls.STYLES.append(name)
+            if paths is not None:
+                cls.VECTOR_STYLES[name] = paths
+            return func
+        return decorator
+
+    def __init__(self, params=None, pool=None):
+        self.params = dict(self.DEFAULT_PARAMS)
+        if params:
+            self.params.update(params)
+        # Промежуточные буферы и текстуры шума; None - пул того потока, где идёт вызов
+        self._pool = pool
+        self._kernels = {}
+
+    @property
+    def pool(self):
+        """Заданный пул или пул текущего потока (конвертер может вызываться из разных)"""
+        return self._pool if self._pool is not None else local_pool()
+
+    @pool.setter
+    def pool(self, pool):
+        self._pool = pool
+
+    def scaled(self, ratio):
+        """Конвертер для копии изображения, уменьшенной в 1/ratio раз
+
+        Пиксельные параметры (ядра, шаги) умножаются на ratio, поэтому стиль
+        на копии выглядит как уменьшенный стиль исходного изображения.
+        """
+        params = dict(self.params)
+        for name, odd in self.SPATIAL_PARAMS.items():
+            value = max(1, int(round(params[name] * ratio)))
+            params[name] = value // 2 * 2 + 1 if odd else value
+        return type(self)(params, self._pool)
+
+    @property
+    def styles(self):
+        """Стиль -> функция(image), включая подключённые позже"""
+        return {name: (lambda image, name=name: self.apply_style(image, name))
+                for name in self.STYLES}
+
+    def buffer(self, name, shape, dtype=np.uint8):
+        """Буфер промежуточного результата операции name"""
+        return self.pool.get(name, shape, dtype)
+
+    def noise(self, sigma, shape):
+        return self.pool.noise(sigma, self.params["noise_seed"], shape)
+
+    def hatching_kernel(self, angle, length):
+        key = (angle, length)
+        if key not in self._kernels:
+            self._kernels[key] = self._create_hatching_kernel(angle, length=length)
+        return self._kernels[key]
+
     def _create_hatching_kernel(self, angle, length=5):
         kernel_size = max(7, length * 2 + 1)
         kernel = np.zeros((kernel_size, kernel_size), dtype=np.float32)
         center = kernel_size // 2
         radians = np.radians(angle)
-        
+
         for i in range(-length, length + 1):
             x = int(center + i * np.cos(radians))
             y = int(center + i * np.sin(radians))
-            
+
             if 0 <= x < kernel_size and 0 <= y < kernel_size:
                 weight = 1.0 - abs(i) / (length + 1)
                 kernel[y, x] = weight
-        
+
         kernel_sum = np.sum(kernel)
         if kernel_sum > 0:
             kernel /= kernel_sum
-        
+
         return kernel - np.mean(kernel)
-    
-    def _makelangelo5_style(self, image):
-        """Стиль Makelangelo 5 из второго проекта"""
-        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-        inverted = cv2.bitwise_not(gray)
-        _, binary = cv2.threshold(inverted, 128, 255, cv2.THRESH_BINARY)
-        edges = cv2.Canny(binary, 50, 150)
-        contours, _ = cv2.findContours(edges, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-        canvas = np.zeros_like(gray)
-        cv2.drawContours(canvas, contours, -1, 255, 1)
-        noise = np.random.normal(0, 5, canvas.shape).astype(np.uint8)
-        canvas = cv2.add(canvas, noise)
-        return canvas
-
-    def _portrait_style(self, image):
-        """Портретный стиль из второго проекта"""
-        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-        gray = cv2.equalizeHist(gray)
-        inverted = cv2.bitwise_not(gray)
-        
-        height, width = inverted.shape
-        step = 3
-        lines = []
-        
-        # Горизонтальные линии
-        for y in range(0, height, step):
-            line = []
-            for x in range(width):
-                intensity = inverted[y, x]
-                if intensity > 100 and random.random() < intensity / 255.0:
-                    line.append((x, y))
-            if len(line) > 2:
-                lines.append(line)
-        
-        # Вертикальные линии
-        for x in range(0, width, step):
-            line = []
-            for y in range(height):
-                intensity = inverted[y, x]
-                if intensity > 100 and random.random() < intensity / 255.0:
-                    line.append((x, y))
-            if len(line) > 2:
-                lines.append(line)
-        
-        # Диагональные линии
-        for d in range(-height//2, width//2, step*2):
-            line = []
-            for x in range(max(0, d), min(width, d + height)):
-                y = x - d
-                if 0 <= y < height:
-                    intensity = inverted[y, x]
-                    if intensity > 100 and random.random() < intensity / 255.0:
-                        line.append((x, y))
-            if len(line) > 2:
-                lines.append(line)
-        
-        canvas = np.zeros_like(gray)
-        for line in lines:
-            for i in range(len(line)-1):
-                x1, y1 = line[i]
-                x2, y2 = line[i+1]
-                cv2.line(canvas, (x1, y1), (x2, y2), 255, 1)
-        
-        return canvas
+
+    def _evaluate(self, name, results):
+        """Считает операцию и её входы, запоминая результаты в results"""
+        if name not in results:
+            func, inputs = self.OPERATIONS[name]
+            args = [self._evaluate(dependency, results) for dependency in inputs]
+            with metrics.stage(f"style.{name}"):
+                results[name] = func(self, *args)
+        return results[name]
+
+    def apply_styles(self, image, style_names):
+        """Несколько стилей одного изображения с общими промежуточными шагами"""
+        results = {"image": image}
+        output = {}
+        for requested in style_names:
+            name = requested if requested in self.STYLES else "sketch"  # fallback
+            output[requested] = self._evaluate(name, results)
+        return output
 
     def apply_style(self, image, style_name):
         """Применяет выбранный стиль к изображению"""
-        if style_name in self.styles:
-            return self.styles[style_name](image)
-        return self._sketch_style(image)  # fallback
\ No newline at end of file
+        return self.apply_styles(image, [style_name])[style_name]
+
+    def apply_vector_style(self, image, style_name):
+        """Изображение векторного стиля и его пути - за один проход графа"""
+        paths_name = self.VECTOR_STYLES[style_name]
+        results = {"image": image}
+        return self._evaluate(style_name, results), self._evaluate(paths_name, results)
+
+
+register_operation = StyleConverter.register_operation
+register_style = StyleConverter.register_style
+
+
+# Общие промежуточные операции
+
+@register_operation("gray", "image")
+def _gray(converter, image):
+    return cv2.cvtColor(image, cv2.COLOR_BGR2GRAY,
+                        dst=converter.buffer("gray", image.shape[:2]))
+
+
+@register_operation("inverted", "gray")
+def _inverted(converter, gray):
+    return cv2.bitwise_not(gray, dst=converter.buffer("inverted", gray.shape))
+
+
+@register_operation("dodge", "gray", "inverted")
+def _dodge(converter, gray, inverted):
+    """Осветление: gray / (255 - blur(255 - gray)) - основа sketch и pencil"""
+    blurred = converter.buffer("dodge.blur", gray.shape)
+    ksize = converter.params["blur_ksize"]
+    cv2.GaussianBlur(inverted, (ksize, ksize), 0, dst=blurred)
+    cv2.bitwise_not(blurred, dst=blurred)
+    return cv2.divide(gray, blurred, dst=converter.buffer("dodge", gray.shape), scale=256)
+
+
+@register_operation("canny", "gray")
+def _canny(converter, gray):
+    return cv2.Canny(gray, converter.params["canny_low"], converter.params["canny_high"],
+                     edges=converter.buffer("canny", gray.shape))
+
+
+@register_operation("binary", "inverted")
+def _binary(converter, inverted):
+    _, binary = cv2.threshold(inverted, converter.params["binary_threshold"], 255,
+                              cv2.THRESH_BINARY, dst=converter.buffer("binary", inverted.shape))
+    return binary
+
+
+@register_operation("equalized_inverted", "gray")
+def _equalized_inverted(converter, gray):
+    result = converter.buffer("equalized_inverted", gray.shape)
+    cv2.equalizeHist(gray, dst=result)
+    return cv2.bitwise_not(result, dst=result)
+
+
+@register_operation("stipple_path", "gray")
+def _stipple_path(converter, gray):
+    """Пунктир с весами по тону, соединённый в один путь обходом TSP"""
+    params = converter.params
+    megapixels = gray.shape[0] * gray.shape[1] / 1e6
+    path = tsp_path(gray, int(round(params["stipple_points"] * megapixels)),
+                    params["stipple_iterations"], params["tsp_time_limit"],
+                    params["noise_seed"])
+    return PathSet.from_contours([path] if len(path) >= 2 else [])
+
+
+# Стили
+
+@register_style("sketch", "dodge")
+def _sketch_style(converter, dodge):
+    """Стиль эскиза из первого проекта"""
+    return dodge.copy()
+
+
+@register_style("contour", "canny")
+def _contour_style(converter, edges):
+    """Стиль контура из первого проекта"""
+    # Canny уже даёт 0/255, а дилатация ядром 1x1 ничего не меняла
+    return edges.copy()
+
+
+@register_style("silhouette", "gray")
+def _silhouette_style(converter, gray):
+    """Стиль силуэта из первого проекта"""
+    _, binary = cv2.threshold(gray, 127, 255, cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU,
+                              dst=np.empty_like(gray))
+    return binary
+
+
+@register_style("blurred", "gray")
+def _blurred_style(converter, gray):
+    """Размытый контур из первого проекта"""
+    blurred_gray = converter.buffer("blurred.median", gray.shape)
+    edges_soft = converter.buffer("blurred.laplacian", gray.shape)
+    cv2.medianBlur(gray, converter.params["median_ksize"], dst=blurred_gray)
+    cv2.Laplacian(blurred_gray, cv2.CV_8U, dst=edges_soft, ksize=5)
+    _, edge_mask = cv2.threshold(edges_soft, converter.params["edge_threshold"], 255,
+                                 cv2.THRESH_BINARY_INV, dst=np.empty_like(gray))
+    return edge_mask
+
+
+@register_style("pencil", "dodge")
+def _pencil_style(converter, dodge):
+    """Карандашный стиль из второго проекта"""
+    noisy = converter.buffer("pencil.noisy", dodge.shape)
+    cv2.add(dodge, converter.noise(converter.params["pencil_noise"], dodge.shape), dst=noisy)
+    return cv2.equalizeHist(noisy, dst=np.empty_like(dodge))
+
+
+@register_style("pen_hatching", "gray")
+def _pen_hatching_style(converter, gray):
+    """Штриховка ручкой из второго проекта"""
+    combined = converter.buffer("pen_hatching.max", gray.shape, np.float32)
+    layer = converter.buffer("pen_hatching.layer", gray.shape, np.float32)
+    scaled = converter.buffer("pen_hatching.u8", gray.shape)
+
+    # Максимум по слоям штриховки (и нулю - как раньше при старте с np.zeros)
+    combined.fill(0)
+    for angle in (45, 135):
+        kernel = converter.hatching_kernel(angle, converter.params["hatching_length"])
+        cv2.filter2D(gray, cv2.CV_32F, kernel, dst=layer)
+        cv2.max(combined, layer, dst=combined)
+
+    cv2.normalize(combined, combined, 0, 255, cv2.NORM_MINMAX)
+    np.copyto(scaled, combined, casting="unsafe")   # Отбрасывание дробной части, как np.uint8
+    cv2.bitwise_not(scaled, dst=scaled)
+    return cv2.adaptiveThreshold(scaled, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C,
+                                 cv2.THRESH_BINARY, 11, 2, dst=np.empty_like(gray))
+
+
+@register_style("makelangelo5", "binary")
+def _makelangelo5_style(converter, binary):
+    """Стиль Makelangelo 5 из второго проекта"""
+    edges = converter.buffer("makelangelo5.edges", binary.shape)
+    cv2.Canny(binary, converter.params["canny_low"], converter.params["canny_high"],
+              edges=edges)
+    contours, _ = cv2.findContours(edges, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    canvas = np.zeros_like(binary)
+    cv2.drawContours(canvas, contours, -1, 255, 1)
+    cv2.add(canvas, converter.noise(converter.params["makelangelo_noise"], binary.shape),
+            dst=canvas)
+    return canvas
+
+
+@register_style("portrait", "equalized_inverted")
+def _portrait_style(converter, inverted):
+    """Портретный стиль из второго проекта"""
+    height, width = inverted.shape
+    step = converter.params["portrait_step"]
+
+    # Точка рисуется с вероятностью intensity / 255, если ярче порога:
+    # одна маска на всё изображение вместо random.random() на каждый пиксель
+    keep = converter.buffer("portrait.keep", inverted.shape)
+    bright = converter.buffer("portrait.bright", inverted.shape)
+    cv2.compare(converter.pool.uniform(converter.params["noise_seed"], inverted.shape),
+                inverted, cv2.CMP_LT, dst=keep)
+    cv2.threshold(inverted, converter.params["portrait_threshold"], 255, cv2.THRESH_BINARY,
+                  dst=bright)
+    cv2.bitwise_and(keep, bright, dst=keep)
+
+    lines = []
+
+    # Горизонтальные линии
+    for y in range(0, height, step):
+        xs = np.flatnonzero(keep[y]).astype(np.int32)
+        if len(xs) > 2:
+            lines.append(np.column_stack([xs, np.full_like(xs, y)]))
+
+    # Вертикальные линии
+    for x in range(0, width, step):
+        ys = np.flatnonzero(keep[:, x]).astype(np.int32)
+        if len(ys) > 2:
+            lines.append(np.column_stack([np.full_like(ys, x), ys]))
+
+    # Диагональные линии (x - y = d - это диагональ матрицы со смещением d)
+    for d in range(-height//2, width//2, step*2):
+        xs = np.flatnonzero(np.diagonal(keep, d)).astype(np.int32) + max(0, d)
+        if len(xs) > 2:
+            lines.append(np.column_stack([xs, xs - d]))
+
+    canvas = np.zeros_like(inverted)
+    if lines:
+        cv2.polylines(canvas, lines, False, 255, 1)
+
+    return canvas
+
+
+@register_style("stipple", "gray", "stipple_path", paths="stipple_path")
+def _stipple_style(converter, gray, paths):
+    """Пунктир TSP: все точки одной линией, перо не поднимается"""
+    canvas = np.zeros_like(gray)
+    if len(paths):
+        cv2.polylines(canvas, paths.to_contours(), False, 255, 1)
+    return canvas
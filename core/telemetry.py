@@ -0,0 +1,142 @@
+import threading
+import time
+from collections import deque
+
+import numpy as np
+
+from utils.helpers import GCodeTimeEstimator
+
+
+def program_model(gcode_lines, default_feed=500.0, line_overhead=0.0):
+    """Модель времени программы по строкам (по GCodeTimeEstimator)
+
+    Возвращает накопленное время до каждой строки (n + 1 значение, сек) и
+    заданную позицию X, Y после каждой строки.
+    """
+    count = len(gcode_lines)
+    times = np.zeros(count + 1)
+    positions = np.zeros((count, 2))
+    estimator = GCodeTimeEstimator(default_feed, line_overhead)
+    for index, line_text in enumerate(gcode_lines):
+        estimator.add(line_text)
+        times[index + 1] = estimator.total_time
+        positions[index] = (estimator.x, estimator.y)
+    return times, positions
+
+
+class Telemetry:
+    """Телеметрия отправки: подтверждённые строки, позиция и оценка остатка
+
+    Поток отправки только вызывает ack() - это счётчик и запись в кольцевой
+    буфер, без блокировок и вывода. Всё остальное (скорость, ETA, позиция)
+    считает snapshot(), который GUI вызывает по таймеру.
+
+    ETA - модельное время оставшихся строк, умноженное на поправку по
+    последним window подтверждениям (во сколько раз станок реально
+    медленнее или быстрее модели).
+    """
+
+    def __init__(self, config=None):
+        self.config = {
+            "window": 50,            # Подтверждений в кольцевом буфере скорости
+            "default_feed": 500.0,   # Подача до первой команды F, мм/мин
+            "line_overhead": 0.0     # Обмен с контроллером на строку, сек
+        }
+        if config:
+            self.config.update(config)
+        self._lock = threading.Lock()
+        self.state = "idle"
+        self.total = 0
+        self.acked = 0
+        self.times = np.zeros(1)
+        self.positions = np.zeros((0, 2))
+        self.samples = deque(maxlen=self.config["window"])
+        self.started = None
+        self.finished = None
+
+    def start(self, gcode_lines):
+        """Начало задания: модель времени строится до отправки первой строки"""
+        times, positions = program_model(gcode_lines, self.config["default_feed"],
+                                         self.config["line_overhead"])
+        with self._lock:
+            self.times = times
+            self.positions = positions
+            self.total = len(gcode_lines)
+            self.acked = 0
+            self.samples = deque(maxlen=self.config["window"])
+            self.started = time.monotonic()
+            self.samples.append((self.started, 0))
+            self.finished = None
+            self.state = "running"
+
+    def ack(self, count=1):
+        """Строки подтверждены контроллером (вызывается из цикла отправки)"""
+        self.acked += count
+        self.samples.append((time.monotonic(), self.acked))
+
+    def finish(self, ok=True):
+        self.finished = time.monotonic()
+        self.state = "done" if ok else "error"
+
+    def snapshot(self):
+        """Текущее состояние для вывода: доли, позиция, скорость и ETA"""
+        with self._lock:
+            acked = min(self.acked, self.total)
+            samples = list(self.samples)
+            state = self.state
+            total = self.total
+            times = self.times
+            positions = self.positions
+            started = self.started
+            finished = self.finished
+
+        now = finished or time.monotonic()
+        total_time = times[-1]
+        done_time = times[acked]
+        snapshot = {
+            'state': state,
+            'acked': acked,
+            'total': total,
+            'fraction': done_time / total_time if total_time > 0 else
+                        (acked / total if total else 0.0),
+            'position': tuple(positions[acked - 1]) if acked else None,
+            'elapsed': now - started if started else 0.0,
+            'lines_per_second': 0.0,
+            'speed_factor': 1.0,
+            'eta': max(0.0, total_time - done_time)
+        }
+
+        if len(samples) >= 2:
+            (first_time, first_acked), (last_time, last_acked) = samples[0], samples[-1]
+            actual = last_time - first_time
+            if actual > 0:
+                snapshot['lines_per_second'] = (last_acked - first_acked) / actual
+            modeled = times[min(last_acked, total)] - times[min(first_acked, total)]
+            if actual > 0 and modeled > 0:
+                snapshot['speed_factor'] = actual / modeled
+                snapshot['eta'] *= snapshot['speed_factor']
+            elif snapshot['lines_per_second'] > 0:
+                # Окно из одних мгновенных строк - оцениваем по темпу строк
+                snapshot['eta'] = (total - acked) / snapshot['lines_per_second']
+        if state in ("done", "error"):
+            snapshot['eta'] = 0.0
+        return snapshot
+
+
+def format_duration(seconds):
+    seconds = int(round(seconds))
+    hours, rest = divmod(seconds, 3600)
+    minutes, seconds = divmod(rest, 60)
+    return f"{hours}:{minutes:02d}:{seconds:02d}" if hours else f"{minutes}:{seconds:02d}"
+
+
+def format_snapshot(snapshot):
+    """Строка состояния для статус-бара"""
+    text = (f"{snapshot['acked']}/{snapshot['total']} строк ({snapshot['fraction']:.0%}), "
+            f"прошло {format_duration(snapshot['elapsed'])}, "
+            f"осталось ~{format_duration(snapshot['eta'])}, "
+            f"{snapshot['lines_per_second']:.1f} стр/с")
+    if snapshot['position'] is not None:
+        x, y = snapshot['position']
+        text += f", X{x:.1f} Y{y:.1f}"
+    return text
@@ -0,0 +1,682 @@
+import argparse
+import math
+import re
+import xml.etree.ElementTree as ET
+from pathlib import Path
+import numpy as np
+from .path_set import PathSet
+from utils.metrics import metrics
+
+# Миллиметров в единице длины SVG/CSS (без единицы - px, 96 на дюйм)
+_MM_PER_UNIT = {"mm": 1.0, "cm": 10.0, "in": 25.4, "pt": 25.4 / 72, "pc": 25.4 / 6,
+                "px": 25.4 / 96, "": 25.4 / 96}
+# Миллиметров в единице DXF по $INSUNITS (0 - без единиц, считаем мм)
+_DXF_UNITS = {0: 1.0, 1: 25.4, 2: 304.8, 4: 1.0, 5: 10.0, 6: 1000.0, 8: 25.4e-6, 9: 0.0254,
+              10: 914.4, 13: 1e-3, 14: 100.0}
+_NUMBER = re.compile(r"[-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?")
+_LENGTH = re.compile(r"^\s*([-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?)\s*([a-z]*)\s*$")
+_TRANSFORM = re.compile(r"(matrix|translate|scale|rotate|skewX|skewY)\s*\(([^)]*)\)")
+# Содержимое этих элементов само не рисуется
+_SVG_HIDDEN = {"defs", "clipPath", "mask", "symbol", "marker", "pattern", "metadata", "title",
+               "desc", "style"}
+_SVG_SHAPES = {"path", "line", "polyline", "polygon", "rect", "circle", "ellipse"}
+# Глубина деления сплайнов DXF: 2^16 участков на пролёт узлов - заведомо хватает
+_MAX_DEPTH = 16
+
+
+def bezier_points(control, tolerance):
+    """Точки кривой Безье (степень 2 или 3) без первой, отклонение не больше tolerance
+
+    Число участков - по формуле Ванга из вторых разностей контрольных точек:
+    пологая кривая даёт пару точек, крутая - столько, сколько нужно. Считается
+    на числах Python: у кривой в пути обычно единицы точек, и вызов NumPy на
+    каждую дороже самой арифметики.
+    """
+    degree = len(control) - 1
+    curvature = 0.0
+    for (ax, ay), (bx, by), (cx, cy) in zip(control, control[1:], control[2:]):
+        curvature = max(curvature, math.hypot(ax - 2 * bx + cx, ay - 2 * by + cy))
+    count = max(1, math.ceil(math.sqrt(degree * (degree - 1) / 8.0 * curvature / tolerance)))
+    points = []
+    if degree == 2:
+        (x0, y0), (x1, y1), (x2, y2) = control
+        for i in range(1, count + 1):
+            t = i / count
+            u = 1 - t
+            a, b, c = u * u, 2 * u * t, t * t
+            points.append((a * x0 + b * x1 + c * x2, a * y0 + b * y1 + c * y2))
+    else:
+        (x0, y0), (x1, y1), (x2, y2), (x3, y3) = control
+        for i in range(1, count + 1):
+            t = i / count
+            u = 1 - t
+            a, b, c, d = u * u * u, 3 * u * u * t, 3 * u * t * t, t * t * t
+            points.append((a * x0 + b * x1 + c * x2 + d * x3, a * y0 + b * y1 + c * y2 + d * y3))
+    return points
+
+
+def arc_steps(radius, sweep, tolerance):
+    """Число хорд дуги радиуса radius, чтобы стрелка не превышала tolerance"""
+    if radius <= tolerance:
+        return max(1, math.ceil(abs(sweep) / (math.pi / 2)))
+    step = 2 * math.acos(1 - tolerance / radius)
+    return max(1, math.ceil(abs(sweep) / step))
+
+
+def ellipse_points(center, axis_x, axis_y, start, sweep, tolerance):
+    """Точки эллиптической дуги c + ax cos t + ay sin t, t от start на sweep (без первой)"""
+    radius = max(math.hypot(*axis_x), math.hypot(*axis_y))
+    count = arc_steps(radius, sweep, tolerance)
+    t = start + sweep * np.arange(1, count + 1) / count
+    return (np.asarray(center, dtype=np.float64) + np.cos(t)[:, None] * np.asarray(axis_x)
+            + np.sin(t)[:, None] * np.asarray(axis_y))
+
+
+def flatten_parametric(func, breaks, tolerance):
+    """Ломаная по кривой func(t) с отклонением середин участков не больше tolerance
+
+    breaks - начальное разбиение параметра (например, узлы сплайна). Все
+    участки одного уровня делятся пополам одним векторным вызовом func.
+    """
+    t = np.asarray(breaks, dtype=np.float64)
+    for _ in range(_MAX_DEPTH):
+        points = func(t)
+        mids = (t[:-1] + t[1:]) * 0.5
+        middle = func(mids)
+        chord = points[1:] - points[:-1]
+        offset = middle - points[:-1]
+        length = np.maximum(np.hypot(chord[:, 0], chord[:, 1]), 1e-12)
+        deviation = np.abs(chord[:, 0] * offset[:, 1] - chord[:, 1] * offset[:, 0]) / length
+        split = deviation > tolerance
+        if not split.any():
+            return points
+        t = np.sort(np.concatenate([t, mids[split]]))
+    return func(t)
+
+
+def _parse_length(value, default=None):
+    """Длина SVG в мм ("210mm", "8.5in", "300") или default"""
+    if value is None:
+        return default
+    match = _LENGTH.match(value)
+    if not match or match.group(2) not in _MM_PER_UNIT:
+        return default
+    return float(match.group(1)) * _MM_PER_UNIT[match.group(2)]
+
+
+def _parse_transform(text):
+    """Атрибут transform как матрица 3x3"""
+    matrix = np.eye(3)
+    for name, args in _TRANSFORM.findall(text or ""):
+        values = [float(v) for v in _NUMBER.findall(args)]
+        step = np.eye(3)
+        if name == "matrix" and len(values) == 6:
+            step[:2] = np.array(values).reshape(3, 2).T
+        elif name == "translate" and values:
+            step[0, 2] = values[0]
+            step[1, 2] = values[1] if len(values) > 1 else 0.0
+        elif name == "scale" and values:
+            step[0, 0] = values[0]
+            step[1, 1] = values[1] if len(values) > 1 else values[0]
+        elif name == "rotate" and values:
+            angle = math.radians(values[0])
+            cos, sin = math.cos(angle), math.sin(angle)
+            step[:2, :2] = [[cos, -sin], [sin, cos]]
+            if len(values) == 3:
+                cx, cy = values[1], values[2]
+                step[:2, 2] = [cx - cos * cx + sin * cy, cy - sin * cx - cos * cy]
+        elif name == "skewX" and values:
+            step[0, 1] = math.tan(math.radians(values[0]))
+        elif name == "skewY" and values:
+            step[1, 0] = math.tan(math.radians(values[0]))
+        matrix = matrix @ step
+    return matrix
+
+
+def _stretch(matrix):
+    """Наибольшее растяжение линейной части матрицы (спектральная норма 2x2 без SVD)"""
+    (a, b), (c, d) = matrix[:2, :2].tolist()
+    root = math.sqrt(((a - d) ** 2 + (b + c) ** 2) * ((a + d) ** 2 + (b - c) ** 2))
+    return math.sqrt(max((a * a + b * b + c * c + d * d + root) / 2, 0.0))
+
+
+def _apply(matrix, points):
+    points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+    return points @ matrix[:2, :2].T + matrix[:2, 2]
+
+
+# Лексемы пути: команда или число (флаги дуг разбираются отдельно)
+_PATH_TOKEN = re.compile(r"[A-Za-z]|[-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?")
+
+
+class _PathTokens:
+    """Лексемы атрибута d, разобранные одним регулярным выражением
+
+    Флаги дуг могут идти слитно с числами ("a5 5 0 015 5"): флаг - первая
+    цифра лексемы, остаток возвращается в поток как следующее число.
+    """
+
+    def __init__(self, text):
+        self.tokens = _PATH_TOKEN.findall(text)
+        self.pos = 0
+
+    def command(self):
+        if self.pos < len(self.tokens) and self.tokens[self.pos].isalpha():
+            self.pos += 1
+            return self.tokens[self.pos - 1]
+        return None
+
+    def has_number(self):
+        return self.pos < len(self.tokens) and not self.tokens[self.pos].isalpha()
+
+    def number(self):
+        if not self.has_number():
+            raise ValueError(f"Ожидалось число в лексеме {self.pos}")
+        self.pos += 1
+        return float(self.tokens[self.pos - 1])
+
+    def flag(self):
+        token = self.tokens[self.pos] if self.pos < len(self.tokens) else ""
+        if not token or token[0] not in "01":
+            raise ValueError(f"Ожидался флаг дуги в лексеме {self.pos}")
+        if len(token) > 1:
+            self.tokens[self.pos] = token[1:]
+        else:
+            self.pos += 1
+        return token[0] == "1"
+
+    def point(self, base):
+        return (base[0] + self.number(), base[1] + self.number())
+
+
+def _svg_arc(start, rx, ry, rotation, large, sweep_flag, end, tolerance):
+    """Эллиптическая дуга SVG (концы) -> точки без первой (SVG 1.1, прил. F.6)"""
+    if rx == 0 or ry == 0:
+        return [end]
+    rx, ry = abs(rx), abs(ry)
+    phi = math.radians(rotation)
+    cos, sin = math.cos(phi), math.sin(phi)
+    dx, dy = (start[0] - end[0]) / 2, (start[1] - end[1]) / 2
+    x1 = cos * dx + sin * dy
+    y1 = -sin * dx + cos * dy
+    scale = x1 * x1 / (rx * rx) + y1 * y1 / (ry * ry)
+    if scale > 1:
+        rx, ry = rx * math.sqrt(scale), ry * math.sqrt(scale)
+    numerator = rx * rx * ry * ry - rx * rx * y1 * y1 - ry * ry * x1 * x1
+    denominator = rx * rx * y1 * y1 + ry * ry * x1 * x1
+    factor = math.sqrt(max(0.0, numerator / denominator)) if denominator else 0.0
+    if large == sweep_flag:
+        factor = -factor
+    cx1, cy1 = factor * rx * y1 / ry, -factor * ry * x1 / rx
+    center = (cos * cx1 - sin * cy1 + (start[0] + end[0]) / 2,
+              sin * cx1 + cos * cy1 + (start[1] + end[1]) / 2)
+    theta = math.atan2((y1 - cy1) / ry, (x1 - cx1) / rx)
+    delta = math.atan2((-y1 - cy1) / ry, (-x1 - cx1) / rx) - theta
+    if sweep_flag and delta < 0:
+        delta += 2 * math.pi
+    elif not sweep_flag and delta > 0:
+        delta -= 2 * math.pi
+    points = ellipse_points(center, (rx * cos, rx * sin), (-ry * sin, ry * cos),
+                            theta, delta, tolerance).tolist()
+    points[-1] = end
+    return points
+
+
+def svg_path_points(d, matrix, tolerance):
+    """Подпути атрибута d как массивы (N, 2) в мм; замкнутые - с повтором первой точки
+
+    Кривые делятся в координатах пути с допуском, делённым на растяжение
+    матрицы, а матрица применяется один раз ко всему подпути.
+    """
+    tolerance = tolerance / max(_stretch(matrix), 1e-12)
+    tokens = _PathTokens(d)
+    paths = []
+    points = []
+    current = start = (0.0, 0.0)
+    last_control = None
+    command = None
+
+    def finish():
+        if len(points) >= 2:
+            paths.append(_apply(matrix, points))
+        points.clear()
+
+    while True:
+        letter = tokens.command()
+        if letter is None:
+            if command is None or not tokens.has_number():
+                break
+            # Повтор команды без буквы; после M - это L
+            letter = {"M": "L", "m": "l"}.get(command, command)
+        command = letter
+        upper = letter.upper()
+        base = current if letter.islower() else (0.0, 0.0)
+
+        if upper == "Z":
+            if points and current != start:
+                points.append(start)
+            finish()
+            current = start
+            last_control = None
+            continue
+        if upper == "M":
+            finish()
+            current = start = tokens.point(base)
+            points.append(current)
+            last_control = None
+            continue
+        if not points:
+            points.append(current)
+
+        if upper == "L":
+            current, last_control = tokens.point(base), None
+            points.append(current)
+        elif upper == "H":
+            current, last_control = (base[0] + tokens.number(), current[1]), None
+            points.append(current)
+        elif upper == "V":
+            current, last_control = (current[0], base[1] + tokens.number()), None
+            points.append(current)
+        elif upper in "CS":
+            if upper == "C":
+                first = tokens.point(base)
+            elif last_control is not None and last_control[0] == 3:
+                first = (2 * current[0] - last_control[1][0], 2 * current[1] - last_control[1][1])
+            else:
+                first = current
+            second = tokens.point(base)
+            target = tokens.point(base)
+            points.extend(bezier_points((current, first, second, target), tolerance))
+            current, last_control = target, (3, second)
+        elif upper in "QT":
+            if upper == "Q":
+                first = tokens.point(base)
+            elif last_control is not None and last_control[0] == 2:
+                first = (2 * current[0] - last_control[1][0], 2 * current[1] - last_control[1][1])
+            else:
+                first = current
+            target = tokens.point(base)
+            points.extend(bezier_points((current, first, target), tolerance))
+            current, last_control = target, (2, first)
+        elif upper == "A":
+            rx, ry, rotation = tokens.number(), tokens.number(), tokens.number()
+            large, sweep = tokens.flag(), tokens.flag()
+            target = tokens.point(base)
+            points.extend(_svg_arc(current, rx, ry, rotation, large, sweep, target, tolerance))
+            current, last_control = target, None
+        else:
+            raise ValueError(f"Неизвестная команда пути: {letter}")
+    finish()
+    return paths
+
+
+def _svg_shape(tag, attrib, matrix, tolerance):
+    """Простые фигуры SVG -> список путей в мм"""
+    def number(name, default=0.0):
+        value = attrib.get(name)
+        return float(_NUMBER.match(value.strip()).group()) if value else default
+
+    if tag == "path":
+        return svg_path_points(attrib.get("d", ""), matrix, tolerance)
+    if tag == "line":
+        return [_apply(matrix, [(number("x1"), number("y1")), (number("x2"), number("y2"))])]
+    if tag in ("polyline", "polygon"):
+        values = [float(v) for v in _NUMBER.findall(attrib.get("points", ""))]
+        points = np.array(values[:len(values) // 2 * 2]).reshape(-1, 2)
+        if len(points) < 2:
+            return []
+        if tag == "polygon":
+            points = np.vstack([points, points[:1]])
+        return [_apply(matrix, points)]
+    if tag == "rect":
+        x, y, width, height = number("x"), number("y"), number("width"), number("height")
+        rx = number("rx", None) if attrib.get("rx") else None
+        ry = number("ry", None) if attrib.get("ry") else None
+        rx, ry = rx if rx is not None else ry, ry if ry is not None else rx
+        if width <= 0 or height <= 0:
+            return []
+        if rx:
+            # Скруглённый прямоугольник - тот же путь из дуг
+            rx, ry = min(rx, width / 2), min(ry, height / 2)
+            d = (f"M{x + rx},{y} H{x + width - rx} A{rx},{ry} 0 0 1 {x + width},{y + ry} "
+                 f"V{y + height - ry} A{rx},{ry} 0 0 1 {x + width - rx},{y + height} "
+                 f"H{x + rx} A{rx},{ry} 0 0 1 {x},{y + height - ry} "
+                 f"V{y + ry} A{rx},{ry} 0 0 1 {x + rx},{y} Z")
+            return svg_path_points(d, matrix, tolerance)
+        corners = [(x, y), (x + width, y), (x + width, y + height), (x, y + height), (x, y)]
+        return [_apply(matrix, corners)]
+    if tag in ("circle", "ellipse"):
+        cx, cy = number("cx"), number("cy")
+        if tag == "circle":
+            rx = ry = number("r")
+        else:
+            rx, ry = number("rx"), number("ry")
+        if rx <= 0 or ry <= 0:
+            return []
+        # Окружность в мм после матрицы - тоже эллипс: оси - образы осей
+        axis_x = matrix[:2, :2] @ (rx, 0.0)
+        axis_y = matrix[:2, :2] @ (0.0, ry)
+        center = _apply(matrix, [(cx, cy)])[0]
+        points = ellipse_points(center, axis_x, axis_y, 0.0, 2 * math.pi, tolerance)
+        return [np.vstack([center + axis_x, points[:-1], center + axis_x])]
+    return []
+
+
+def _svg_root_matrix(attrib):
+    """Перевод пользовательских единиц корневого <svg> в мм (viewBox, width, height)"""
+    view_box = [float(v) for v in _NUMBER.findall(attrib.get("viewBox", ""))]
+    width = _parse_length(attrib.get("width"))
+    height = _parse_length(attrib.get("height"))
+    matrix = np.eye(3)
+    if len(view_box) == 4 and view_box[2] > 0 and view_box[3] > 0:
+        # preserveAspectRatio по умолчанию (xMidYMid meet): равный масштаб по осям
+        scales = [size / box for size, box in ((width, view_box[2]), (height, view_box[3]))
+                  if size]
+        scale = min(scales) if scales else _MM_PER_UNIT["px"]
+        matrix[0, 0] = matrix[1, 1] = scale
+        matrix[:2, 2] = [-view_box[0] * scale, -view_box[1] * scale]
+        if width and height:
+            matrix[0, 2] += (width - view_box[2] * scale) / 2
+            matrix[1, 2] += (height - view_box[3] * scale) / 2
+    else:
+        matrix[0, 0] = matrix[1, 1] = _MM_PER_UNIT["px"]
+    return matrix
+
+
+def _hidden(attrib):
+    style = attrib.get("style", "").replace(" ", "")
+    return attrib.get("display") == "none" or "display:none" in style
+
+
+def _dxf_pairs(f):
+    """Пары (код группы, значение) DXF построчно - файл не читается целиком"""
+    while True:
+        code = f.readline()
+        value = f.readline()
+        if not code or not value:
+            return
+        try:
+            yield int(code), value.strip()
+        except ValueError:
+            return
+
+
+def _bulge_points(p1, p2, bulge, tolerance):
+    """Участок полилинии DXF от p1 до p2: отрезок или дуга с выпуклостью bulge (без p1)"""
+    if abs(bulge) < 1e-12:
+        return np.array([p2], dtype=np.float64)
+    p1, p2 = np.asarray(p1, dtype=np.float64), np.asarray(p2, dtype=np.float64)
+    theta = 4 * math.atan(bulge)
+    chord = p2 - p1
+    length = math.hypot(*chord)
+    if length == 0:
+        return np.array([p2])
+    normal = np.array([-chord[1], chord[0]]) / length
+    center = (p1 + p2) / 2 + normal * (length / 2) / math.tan(theta / 2)
+    radius = math.hypot(*(p1 - center))
+    start = math.atan2(p1[1] - center[1], p1[0] - center[0])
+    points = ellipse_points(center, (radius, 0.0), (0.0, radius), start, theta, tolerance)
+    points[-1] = p2
+    return points
+
+
+def _dxf_polyline(vertices, closed, tolerance):
+    """Вершины [(x, y, bulge)] -> точки полилинии с дугами"""
+    if len(vertices) < 2:
+        return None
+    if closed:
+        vertices = vertices + [vertices[0]]
+    pieces = [np.array([vertices[0][:2]], dtype=np.float64)]
+    for (x1, y1, bulge), (x2, y2, _) in zip(vertices[:-1], vertices[1:]):
+        pieces.append(_bulge_points((x1, y1), (x2, y2), bulge, tolerance))
+    return np.concatenate(pieces)
+
+
+def _dxf_spline(pairs, tolerance):
+    from scipy.interpolate import BSpline
+
+    degree = 3
+    knots = []
+    control = []
+    fit = []
+    for code, value in pairs:
+        if code == 71:
+            degree = int(value)
+        elif code == 40:
+            knots.append(float(value))
+        elif code == 10:
+            control.append([float(value), 0.0])
+        elif code == 20 and control:
+            control[-1][1] = float(value)
+        elif code == 11:
+            fit.append([float(value), 0.0])
+        elif code == 21 and fit:
+            fit[-1][1] = float(value)
+    if len(control) > degree and len(knots) == len(control) + degree + 1:
+        spline = BSpline(np.array(knots), np.array(control), degree)
+        breaks = np.unique(np.clip(knots, knots[degree], knots[-degree - 1]))
+        return flatten_parametric(spline, breaks, tolerance)
+    # Сплайн только по точкам прохождения - ломаная через них
+    return np.array(fit, dtype=np.float64) if len(fit) >= 2 else None
+
+
+def _dxf_entity(kind, pairs, tolerance):
+    """Сущность DXF -> путь (N, 2) в единицах чертежа или None"""
+    values = {}
+    for code, value in pairs:
+        values.setdefault(code, value)
+
+    def number(code, default=0.0):
+        return float(values.get(code, default))
+
+    if kind == "LINE":
+        return np.array([(number(10), number(20)), (number(11), number(21))])
+    if kind == "LWPOLYLINE":
+        vertices = []
+        for code, value in pairs:
+            if code == 10:
+                vertices.append([float(value), 0.0, 0.0])
+            elif code == 20 and vertices:
+                vertices[-1][1] = float(value)
+            elif code == 42 and vertices:
+                vertices[-1][2] = float(value)
+        return _dxf_polyline([tuple(v) for v in vertices], int(number(70)) & 1, tolerance)
+    if kind in ("CIRCLE", "ARC"):
+        radius = number(40)
+        if radius <= 0:
+            return None
+        if kind == "CIRCLE":
+            start, sweep = 0.0, 2 * math.pi
+        else:
+            start = math.radians(number(50))
+            sweep = (math.radians(number(51)) - start) % (2 * math.pi) or 2 * math.pi
+        center = (number(10), number(20))
+        first = np.array([[center[0] + radius * math.cos(start),
+                           center[1] + radius * math.sin(start)]])
+        return np.vstack([first, ellipse_points(center, (radius, 0.0), (0.0, radius),
+                                                start, sweep, tolerance)])
+    if kind == "ELLIPSE":
+        center = np.array([number(10), number(20)])
+        major = np.array([number(11), number(21)])
+        minor = number(40, 1.0) * np.array([-major[1], major[0]])
+        start = number(41)
+        end = number(42, 2 * math.pi)
+        sweep = (end - start) % (2 * math.pi) or 2 * math.pi
+        first = center + major * math.cos(start) + minor * math.sin(start)
+        return np.vstack([first, ellipse_points(center, major, minor, start, sweep, tolerance)])
+    if kind == "SPLINE":
+        return _dxf_spline(pairs, tolerance)
+    return None
+
+
+class VectorImporter:
+    """Импорт векторных чертежей (SVG, DXF) сразу в пути для GCodeGenerator
+
+    Минуя растр: кривые Безье, дуги и сплайны делятся на хорды с отклонением
+    не больше tolerance мм, результат - PathSet в миллиметрах. Файл читается
+    потоком: SVG - через iterparse с очисткой разобранных элементов, DXF -
+    построчно, поэтому большой чертёж не держится в памяти целиком.
+
+    Замкнутые пути повторяют первую точку в конце, поэтому в генератор они
+    передаются с closed=False. Оси как у изображения: Y вниз (DXF переворачивается).
+    """
+
+    def __init__(self, config=None):
+        self.config = {
+            "tolerance": 0.1,        # Допустимое отклонение хорд от кривой, мм
+            "normalize": True,       # Сдвинуть чертёж к началу координат
+            "max_size_mm": None      # Вписать чертёж в квадрат такого размера (None - 1:1)
+        }
+        if config:
+            self.config.update(config)
+        self.report = {}
+
+    def iter_paths(self, path):
+        """Пути чертежа по одному, (N, 2) в мм, в порядке файла"""
+        suffix = Path(path).suffix.lower()
+        self.report = {'format': suffix.lstrip('.'), 'skipped': {}}
+        if suffix == ".svg":
+            return self._iter_svg(path)
+        if suffix == ".dxf":
+            return self._iter_dxf(path)
+        raise ValueError(f"Неподдерживаемый формат: {suffix}")
+
+    def _skip(self, kind):
+        skipped = self.report['skipped']
+        skipped[kind] = skipped.get(kind, 0) + 1
+
+    def _iter_svg(self, path):
+        tolerance = self.config["tolerance"]
+        matrices = []
+        hidden_depth = 0
+        for event, element in ET.iterparse(str(path), events=("start", "end")):
+            tag = element.tag.rsplit('}', 1)[-1]
+            if event == "start":
+                parent = matrices[-1] if matrices else np.eye(3)
+                if not matrices and tag == "svg":
+                    parent = _svg_root_matrix(element.attrib)
+                transform = element.get("transform")
+                matrices.append(parent @ _parse_transform(transform) if transform else parent)
+                if hidden_depth or tag in _SVG_HIDDEN or _hidden(element.attrib):
+                    hidden_depth += 1
+                continue
+
+            matrix = matrices.pop()
+            if hidden_depth:
+                hidden_depth -= 1
+            elif tag in _SVG_SHAPES:
+                for points in _svg_shape(tag, element.attrib, matrix, tolerance):
+                    if len(points) >= 2:
+                        yield points
+            elif tag in ("use", "text", "image"):
+                self._skip(tag)
+            # Разобранный элемент больше не нужен - память не растёт с размером файла
+            element.clear()
+
+    def _iter_dxf(self, path):
+        tolerance = self.config["tolerance"]
+        unit = 1.0
+        section = None
+        kind = None
+        pairs = []
+        polyline = None          # (вершины, замкнут) для POLYLINE ... SEQEND
+        with open(path, 'r', encoding='utf-8', errors='replace') as f:
+            previous = None
+            for code, value in _dxf_pairs(f):
+                if code == 2 and previous == (0, "SECTION"):
+                    section = value
+                    kind = None
+                    previous = (code, value)
+                    continue
+                if section == "HEADER" and code == 9:
+                    kind = value
+                elif section == "HEADER" and code == 70 and kind == "$INSUNITS":
+                    unit = _DXF_UNITS.get(int(value), 1.0)
+                previous = (code, value)
+                if section != "ENTITIES":
+                    continue
+
+                if code != 0:
+                    pairs.append((code, value))
+                    continue
+                # Код 0 - конец предыдущей сущности
+                if kind == "POLYLINE":
+                    polyline = ([], int(dict(pairs).get(70, 0)) & 1)
+                elif kind == "VERTEX" and polyline is not None:
+                    values = dict(pairs)
+                    polyline[0].append((float(values.get(10, 0)), float(values.get(20, 0)),
+                                        float(values.get(42, 0))))
+                elif kind == "SEQEND" and polyline is not None:
+                    points = _dxf_polyline(polyline[0], polyline[1], tolerance / unit)
+                    polyline = None
+                    if points is not None:
+                        yield points * (unit, -unit)
+                elif kind is not None and kind != "ENDSEC":
+                    points = _dxf_entity(kind, pairs, tolerance / unit)
+                    if points is not None and len(points) >= 2:
+                        yield points * (unit, -unit)
+                    elif points is None:
+                        self._skip(kind)
+                if value == "ENDSEC":
+                    section = None
+                kind = value
+                pairs = []
+
+    def load(self, path):
+        """Чертёж целиком как PathSet в мм (отчёт - в self.report)"""
+        with metrics.stage("vector_import") as stage:
+            paths = PathSet.from_contours(list(self.iter_paths(path)), np.float64)
+            stage.count(len(paths))
+        if len(paths.points):
+            low = paths.points.min(axis=0)
+            high = paths.points.max(axis=0)
+            size = float((high - low).max())
+            max_size = self.config["max_size_mm"]
+            scale = max_size / size if max_size and size > 0 else 1.0
+            offset = -low * scale if self.config["normalize"] else np.zeros(2)
+            if scale != 1.0 or offset.any():
+                paths = paths.transform(scale, offset)
+            self.report['size_mm'] = tuple(float(v) for v in (high - low) * scale)
+        self.report['paths'] = len(paths)
+        self.report['points'] = len(paths.points)
+        return paths
+
+
+def format_report(report):
+    text = f"{report['format'].upper()}: путей {report['paths']}, точек {report['points']}"
+    if report.get('size_mm'):
+        text += f", размер {report['size_mm'][0]:.1f} x {report['size_mm'][1]:.1f} мм"
+    if report['skipped']:
+        skipped = ", ".join(f"{kind} x{count}" for kind, count in report['skipped'].items())
+        text += f"; пропущено: {skipped}"
+    return text
+
+
+def main():
+    from core.gcode_generator import GCodeGenerator
+    from utils.config import AppConfig
+
+    parser = argparse.ArgumentParser(description="SVG/DXF -> G-code без растра")
+    parser.add_argument("drawing", help="Файл SVG или DXF")
+    parser.add_argument("output", help="Файл G-code")
+    parser.add_argument("--tolerance", type=float, help="Отклонение хорд от кривых, мм")
+    parser.add_argument("--size", type=float, help="Вписать в квадрат SIZE мм")
+    args = parser.parse_args()
+
+    config = dict(AppConfig.VECTOR_CONFIG)
+    if args.tolerance is not None:
+        config["tolerance"] = args.tolerance
+    if args.size is not None:
+        config["max_size_mm"] = args.size
+    importer = VectorImporter(config)
+    paths = importer.load(args.drawing)
+    print(format_report(importer.report))
+
+    # Пути уже в мм: масштаб генератора 1, сдвиг и калибровка - как в конфиге
+    generator = GCodeGenerator({**AppConfig.GCODE_CONFIG, "scale_x": 1.0, "scale_y": 1.0})
+    count = generator.write_gcode(paths, args.output, closed=False)
+    print(f"G-code: {args.output} ({count} строк)")
+
+
+if __name__ == "__main__":
+    main()
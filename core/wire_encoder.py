@@ -0,0 +1,354 @@
+import argparse
+from decimal import Decimal
+
+from utils.helpers import split_gcode_words
+
+_AXES = "XYZ"
+_SERIAL_BITS_PER_BYTE = 10   # 8N1: старт + 8 бит + стоп
+
+
+def _words(line_text):
+    """Слова строки как [(буква, Decimal)] - без потерь точности"""
+    return [(letter, Decimal(value)) for letter, value in split_gcode_words(line_text)]
+
+
+def _is_move(line_text):
+    return any(letter in _AXES for letter, _ in _words(line_text))
+
+
+def count_moves(gcode_lines):
+    """Число строк с перемещением по осям (как 'moves' в отчёте кодировщика)"""
+    return sum(1 for line_text in gcode_lines if _is_move(line_text))
+
+
+class WireEncoder:
+    """Кодирование G-code для передачи по последовательному порту
+
+    Все приёмы не меняют смысла программы:
+    - compact: без пробелов и комментариев ("G1X50Y20");
+    - trim_zeros: минимальная запись чисел ("X50.00" -> "X50", "Y216.50" -> "Y216.5");
+    - decimals: округление до заданного числа знаков (None - без округления);
+    - modal: не повторять G0/G1, F и неизменные координаты;
+    - relative: перемещения в G91 (приращения короче абсолютных координат).
+    Текущая прошивка требует "G0"/"G1" в начале строки и считает пропущенную
+    ось нулём, поэтому modal и relative - только для контроллеров по стандарту.
+    """
+
+    def __init__(self, config=None):
+        self.config = {
+            "compact": True,
+            "trim_zeros": True,
+            "decimals": None,
+            "modal": False,
+            "relative": False
+        }
+        if config:
+            self.config.update(config)
+        self.report = {}
+
+    def _reset(self):
+        # Состояние станка после уже отправленных строк
+        self.mode = None          # 90 / 91
+        self.motion = None        # 0 / 1
+        self.feed = None
+        self.position = {axis: None for axis in _AXES}
+        # Состояние исходной программы
+        self.source_relative = False
+        self.source_position = {axis: None for axis in _AXES}
+
+    def _number(self, value):
+        decimals = self.config["decimals"]
+        if decimals is not None:
+            value = value.quantize(Decimal(1).scaleb(-decimals))
+        if value == 0:
+            return "0"
+        if self.config["trim_zeros"]:
+            text = f"{value.normalize():f}"
+        else:
+            text = f"{value:f}"
+        return text
+
+    def _join(self, words):
+        separator = "" if self.config["compact"] else " "
+        return separator.join(f"{letter}{self._number(value)}" for letter, value in words)
+
+    def _target(self, words):
+        """Абсолютная цель перемещения исходной программы по осям"""
+        target = {}
+        for letter, value in words:
+            if letter in _AXES:
+                base = self.source_position[letter]
+                if self.source_relative:
+                    value = None if base is None else base + value
+                target[letter] = value
+        return target
+
+    def _encode_move(self, motion, words, feed):
+        target = self._target(words)
+        for axis, value in target.items():
+            self.source_position[axis] = value
+        if any(value is None for value in target.values()):
+            # Исходная программа в G91 от неизвестной точки - передаём как есть
+            output = self._ensure_source_mode()
+            self.position = {axis: None for axis in _AXES}
+            self.motion = motion
+            if feed is not None:
+                self.feed = feed
+            feed_words = [("F", feed)] if feed is not None else []
+            return output + [self._join([("G", Decimal(motion))] + words + feed_words)]
+
+        decimals = self.config["decimals"]
+        if decimals is not None:
+            step = Decimal(1).scaleb(-decimals)
+            target = {axis: value.quantize(step) for axis, value in target.items()}
+
+        modal = self.config["modal"]
+        relative = self.config["relative"] and all(
+            self.position[axis] is not None for axis in target)
+        mode = 91 if relative else 90
+
+        out_words = []
+        if not modal or motion != self.motion:
+            out_words.append(("G", Decimal(motion)))
+        for axis in _AXES:
+            if axis not in target:
+                continue
+            value = target[axis]
+            current = self.position[axis]
+            if relative:
+                delta = value - current
+                if delta != 0 or not modal:
+                    out_words.append((axis, delta))
+            elif not modal or value != current:
+                out_words.append((axis, value))
+        if feed is not None and (not modal or feed != self.feed):
+            out_words.append(("F", feed))
+
+        moves_axes = any(letter in _AXES for letter, _ in out_words)
+        if modal and not moves_axes and not any(letter == "F" for letter, _ in out_words):
+            return []   # Ни движения, ни новой подачи - станку нечего делать
+
+        output = []
+        if moves_axes and mode != self.mode:
+            output.append(self._join([("G", Decimal(mode))]))
+            self.mode = mode
+        output.append(self._join(out_words))
+
+        self.motion = motion
+        if feed is not None:
+            self.feed = feed
+        for axis, value in target.items():
+            self.position[axis] = value
+        return output
+
+    def encode_line(self, line_text):
+        """Одна исходная строка -> список строк для отправки (может быть пустым)"""
+        stripped = line_text.strip()
+        words = _words(stripped)
+        if not words:
+            return []
+        if '*' in stripped or any(letter == "N" for letter, _ in words):
+            # Номера строк и контрольные суммы не трогаем
+            return [stripped]
+
+        g_codes = [value for letter, value in words if letter == "G"]
+        others = [(letter, value) for letter, value in words if letter != "G"]
+        motion_codes = [g for g in g_codes if g in (0, 1)]
+        has_axes = any(letter in _AXES for letter, _ in others)
+
+        # Переключение режима координат исходной программы
+        if g_codes and all(g in (90, 91) for g in g_codes) and not others:
+            self.source_relative = g_codes[-1] == 91
+            if self.config["relative"] or (self.config["modal"] and self.mode == g_codes[-1]):
+                return []   # Режим станка выставляется перед перемещениями сам
+            self.mode = int(g_codes[-1])
+            return [self._join(words)]
+
+        simple_move = (len(g_codes) == len(motion_codes) <= 1
+                       and all(letter in _AXES or letter == "F" for letter, _ in others))
+        if simple_move and (motion_codes or (has_axes and self.motion is not None)):
+            motion = int(motion_codes[0]) if motion_codes else self.motion
+            feed = next((value for letter, value in others if letter == "F"), None)
+            return self._encode_move(motion, [(l, v) for l, v in others if l in _AXES], feed)
+
+        # Прочие команды (M, G4, G21, ...) - как есть, только компактно
+        if any(g in (28, 30, 92) for g in g_codes):
+            self.position = {axis: None for axis in _AXES}
+            self.source_position = {axis: None for axis in _AXES}
+        for g in g_codes:
+            if g in (90, 91):
+                self.source_relative = g == 91
+                self.mode = int(g)
+            elif g in (0, 1):
+                self.motion = int(g)
+        # Команды с координатами идут в режиме исходной программы
+        output = self._ensure_source_mode() if has_axes else []
+        output.append(self._join(words))
+        return output
+
+    def _ensure_source_mode(self):
+        mode = 91 if self.source_relative else 90
+        if self.mode == mode:
+            return []
+        self.mode = mode
+        return [self._join([("G", Decimal(mode))])]
+
+    def encode(self, gcode_lines, baud_rate=115200):
+        """Кодирует программу целиком; отчёт об экономии - в self.report"""
+        self._reset()
+        encoded = []
+        source_bytes = 0
+        moves = 0
+        for line_text in gcode_lines:
+            stripped = line_text.strip()
+            if not stripped:
+                continue
+            source_bytes += len(stripped.encode()) + 1
+            if _is_move(stripped):
+                moves += 1
+            encoded.extend(self.encode_line(stripped))
+        if self.mode == 91 and not self.source_relative:
+            encoded.append(self._join([("G", Decimal(90))]))   # Вернуть станок в G90
+
+        encoded_bytes = sum(len(line.encode()) + 1 for line in encoded)
+        self.report = self._make_report(source_bytes, encoded_bytes, moves,
+                                        len(encoded), baud_rate)
+        return encoded
+
+    @staticmethod
+    def _make_report(source_bytes, encoded_bytes, moves, lines, baud_rate):
+        bytes_per_second = baud_rate / _SERIAL_BITS_PER_BYTE
+        source_time = source_bytes / bytes_per_second
+        encoded_time = encoded_bytes / bytes_per_second
+        return {
+            'source_bytes': source_bytes,
+            'encoded_bytes': encoded_bytes,
+            'lines': lines,
+            'moves': moves,
+            'saved_ratio': 1 - encoded_bytes / source_bytes if source_bytes else 0.0,
+            # Предел канала: сколько перемещений в секунду пропускает порт
+            'source_moves_per_second': moves / source_time if source_time else 0.0,
+            'encoded_moves_per_second': moves / encoded_time if encoded_time else 0.0
+        }
+
+
+def _differs(a, b, tolerance):
+    if a is None or b is None:
+        return (a is None) != (b is None)
+    return abs(a - b) > tolerance
+
+
+def _words_differ(a, b, tolerance):
+    a = [(l, v) for l, v in a if l != "G" or v not in (90, 91)]
+    b = [(l, v) for l, v in b if l != "G" or v not in (90, 91)]
+    return len(a) != len(b) or any(la != lb or _differs(va, vb, tolerance)
+                                   for (la, va), (lb, vb) in zip(a, b))
+
+
+def canonical_program(gcode_lines, tolerance=Decimal(0)):
+    """Программа как последовательность действий станка (для проверки кодирования)
+
+    Перемещения - абсолютные цели с подачей; нулевые перемещения и смены режимов
+    без движения пропускаются; прочие команды - нормализованные слова.
+    """
+    relative = False
+    motion = None
+    feed = None
+    position = {axis: None for axis in _AXES}
+    events = []
+
+    for line_text in gcode_lines:
+        words = _words(line_text)
+        if not words:
+            continue
+        g_codes = [value for letter, value in words if letter == "G"]
+        others = [(letter, value) for letter, value in words if letter != "G"]
+        for g in g_codes:
+            if g in (90, 91):
+                relative = g == 91
+            elif g in (0, 1):
+                motion = int(g)
+        for letter, value in others:
+            if letter == "F":
+                feed = value
+
+        other_g = [g for g in g_codes if g not in (0, 1, 90, 91)]
+        has_axes = any(letter in _AXES for letter, _ in others)
+        if other_g or (not has_axes and any(letter not in "F" for letter, _ in others)):
+            events.append(("cmd", tuple(words)))
+            if any(g in (28, 30, 92) for g in other_g):
+                position = {axis: None for axis in _AXES}
+            continue
+        if not has_axes or motion is None:
+            continue
+
+        target = dict(position)
+        for letter, value in others:
+            if letter in _AXES:
+                base = position[letter]
+                target[letter] = (base + value if base is not None else None) if relative \
+                    else value
+        if any(_differs(target[axis], position[axis], tolerance) for axis in _AXES):
+            events.append(("move", motion, tuple(target[axis] for axis in _AXES), feed))
+        position = target
+    return events
+
+
+def programs_equal(source_lines, encoded_lines, decimals=None):
+    """Совпадают ли действия станка для исходной и закодированной программы"""
+    tolerance = Decimal(0) if decimals is None else Decimal(5).scaleb(-decimals - 1)
+    source = canonical_program(source_lines, tolerance)
+    encoded = canonical_program(encoded_lines, tolerance)
+    if len(source) != len(encoded):
+        return False
+    for a, b in zip(source, encoded):
+        if a[0] != b[0]:
+            return False
+        if a[0] == "cmd":
+            if _words_differ(a[1], b[1], tolerance):
+                return False
+        elif a[1] != b[1] or _differs(a[3], b[3], tolerance) or \
+                any(_differs(va, vb, tolerance) for va, vb in zip(a[2], b[2])):
+            return False
+    return True
+
+
+def format_report(report):
+    return (f"Байт: {report['source_bytes']} -> {report['encoded_bytes']} "
+            f"(-{report['saved_ratio'] * 100:.0f}%), перемещений/с по каналу: "
+            f"{report['source_moves_per_second']:.0f} -> {report['encoded_moves_per_second']:.0f}")
+
+
+def main():
+    from utils.config import AppConfig
+
+    parser = argparse.ArgumentParser(description="Компактное кодирование G-code для порта")
+    parser.add_argument("gcode", help="Файл G-code")
+    parser.add_argument("--output", help="Сохранить закодированную программу")
+    parser.add_argument("--modal", action="store_true", help="Подавлять модальные слова")
+    parser.add_argument("--relative", action="store_true", help="Перемещения в G91")
+    parser.add_argument("--decimals", type=int, help="Округлять до N знаков")
+    args = parser.parse_args()
+
+    config = dict(AppConfig.WIRE_CONFIG)
+    config.pop("enabled", None)
+    config["modal"] = config["modal"] or args.modal
+    config["relative"] = config["relative"] or args.relative
+    if args.decimals is not None:
+        config["decimals"] = args.decimals
+
+    with open(args.gcode, encoding='utf-8') as f:
+        source = f.read().splitlines()
+    encoder = WireEncoder(config)
+    encoded = encoder.encode(source, AppConfig.WIRE_CONFIG.get("baud_rate", 115200))
+
+    print(format_report(encoder.report))
+    print("Проверка смысла:", "совпадает" if programs_equal(source, encoded, config["decimals"])
+          else "РАСХОДИТСЯ")
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write('\n'.join(encoded) + '\n')
+
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,9 @@
 import tkinter as tk
 from tkinter import filedialog, messagebox, ttk
 import serial
-import time
+from core.serial_streamer import SerialStreamer
+from core.wire_encoder import WireEncoder, count_moves, format_report
+from utils.config import AppConfig
 
 class GCodeSender:
     def __init__(self, root):
@@ -11,7 +13,8 @@ class GCodeSender:
 
         self.serial_conn = None
         self.gcode_lines = []
-        self.current_line = 0
+        self.moves = 0
+        self.streamer = None
 
         self.setup_ui()
 
@@ -39,8 +42,14 @@ class GCodeSender:
         self.status.pack(pady=5)
 
         # Кнопка отправки
-        self.send_btn = tk.Button(self.root, text="Отправить G-code", command=self.send_gcode, state=tk.DISABLED)
-        self.send_btn.pack(pady=10)
+        job_frame = tk.Frame(self.root)
+        job_frame.pack(pady=10)
+        self.send_btn = tk.Button(job_frame, text="Отправить G-code", command=self.send_gcode, state=tk.DISABLED)
+        self.send_btn.grid(row=0, column=0, padx=5)
+        self.pause_btn = tk.Button(job_frame, text="Пауза", command=self.toggle_pause, state=tk.DISABLED)
+        self.pause_btn.grid(row=0, column=1, padx=5)
+        self.abort_btn = tk.Button(job_frame, text="Отмена", command=self.abort, state=tk.DISABLED)
+        self.abort_btn.grid(row=0, column=2, padx=5)
 
     def update_ports(self):
         import serial.tools.list_ports
@@ -55,7 +64,7 @@ class GCodeSender:
             messagebox.showerror("Ошибка", "Выберите COM-порт")
             return
         try:
-            self.serial_conn = serial.Serial(port, 115200, timeout=10)
+            self.serial_conn = serial.Serial(port, AppConfig.WIRE_CONFIG["baud_rate"], timeout=10)
             messagebox.showinfo("Успех", f"Подключено к {port}")
             self.send_btn['state'] = tk.NORMAL
         except Exception as e:
@@ -67,25 +76,75 @@ class GCodeSender:
             return
         with open(file_path, 'r') as f:
             self.gcode_lines = [line.strip() for line in f if line.strip() and not line.startswith(';')]
-        self.status.config(text=f"Загружено {len(self.gcode_lines)} строк G-code")
+        loaded = len(self.gcode_lines)
+
+        # Компактная запись для порта (смысл программы тот же)
+        text = f"Загружено {loaded} строк G-code"
+        if AppConfig.WIRE_CONFIG["enabled"]:
+            encoder = WireEncoder(AppConfig.WIRE_CONFIG)
+            self.gcode_lines = encoder.encode(self.gcode_lines, AppConfig.WIRE_CONFIG["baud_rate"])
+            self.moves = encoder.report['moves']
+            text += f"\n{format_report(encoder.report)}"
+        else:
+            self.moves = count_moves(self.gcode_lines)
+        self.status.config(text=text)
 
     def send_gcode(self):
         if not self.serial_conn or not self.gcode_lines:
             return
+        if self.streamer is not None and self.streamer.is_alive():
+            return
 
-        total_lines = len(self.gcode_lines)
-        self.progress['maximum'] = total_lines
-
-        for i, line in enumerate(self.gcode_lines):
-            self.serial_conn.write((line + '\n').encode())
-            response = self.serial_conn.readline().decode().strip()
-            self.status.config(text=f"Отправлено {i+1}/{total_lines}: {line}")
-            self.progress['value'] = i+1
-            self.root.update_idletasks()
-            time.sleep(0.1)
-
-        self.status.config(text="G-code отправлен!")
-        messagebox.showinfo("Успех", "G-code успешно отправлен!")
+        # Отправка идёт в своём потоке, окно только показывает ход
+        self.streamer = SerialStreamer(self.serial_conn, AppConfig.STREAM_CONFIG)
+        self.streamer.start(self.gcode_lines)
+        self.progress['maximum'] = len(self.streamer.lines)
+        self.progress['value'] = 0
+        self.send_btn['state'] = tk.DISABLED
+        self.pause_btn['state'] = tk.NORMAL
+        self.abort_btn['state'] = tk.NORMAL
+        self.root.after(100, self.poll_streamer)
+
+    def toggle_pause(self):
+        if self.streamer.state == "paused":
+            self.streamer.resume()
+            self.pause_btn.config(text="Пауза")
+        else:
+            self.streamer.pause()
+            self.pause_btn.config(text="Продолжить")
+
+    def abort(self):
+        self.streamer.abort()
+        self.pause_btn['state'] = tk.DISABLED
+        self.abort_btn['state'] = tk.DISABLED
+
+    def poll_streamer(self):
+        total_lines = len(self.streamer.lines)
+        for event in self.streamer.drain_events():
+            if event[0] == "finished":
+                self.on_finished(event[1], event[2])
+                return
+        self.progress['value'] = self.streamer.acked
+        state = "пауза, перо поднято" if self.streamer.state == "paused" else "отправка"
+        self.status.config(text=f"Подтверждено {self.streamer.acked}/{total_lines} ({state})")
+        self.root.after(100, self.poll_streamer)
+
+    def on_finished(self, state, stats):
+        self.progress['value'] = stats['lines']
+        self.send_btn['state'] = tk.NORMAL
+        self.pause_btn['state'] = tk.DISABLED
+        self.abort_btn['state'] = tk.DISABLED
+        self.pause_btn.config(text="Пауза")
+        elapsed = stats['elapsed']
+        if state == "done":
+            self.status.config(text=f"G-code отправлен! {stats['bytes']} байт за {elapsed:.1f} с, "
+                                    f"{self.moves / max(elapsed, 1e-9):.1f} перемещений/с")
+            messagebox.showinfo("Успех", "G-code успешно отправлен!")
+        elif state == "aborted":
+            self.status.config(text=f"Отправка отменена на строке {stats['lines']}/{stats['total']}")
+        else:
+            self.status.config(text="Ошибка отправки")
+            messagebox.showerror("Ошибка", "Не удалось отправить G-code")
 
 if __name__ == "__main__":
     root = tk.Tk()
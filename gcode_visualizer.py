@@ -1,53 +1,125 @@
 import tkinter as tk
 from tkinter import filedialog
 import numpy as np
+from PIL import Image, ImageTk
+from core.segment_index import SegmentIndex, gcode_segments, rasterize_segments
 
 class GCodeVisualizer:
+    """Просмотр G-code с масштабом и перемещением
+
+    Колесо мыши - масштаб относительно курсора, перетаскивание - сдвиг,
+    двойной щелчок - показать всё. Кадр рисуется в изображение только из
+    отрезков окна (сетка SegmentIndex), при отдалении - на огрублённом уровне.
+    """
+
     def __init__(self, root):
         self.root = root
         self.root.title("Визуализация G-code")
         self.root.geometry("800x600")
 
-        self.canvas = tk.Canvas(self.root, bg="white")
+        self.canvas = tk.Canvas(self.root, bg="white", highlightthickness=0)
         self.canvas.pack(fill=tk.BOTH, expand=True)
 
-        tk.Button(self.root, text="Загрузить G-code", command=self.load_gcode).pack()
+        bottom = tk.Frame(self.root)
+        bottom.pack(fill=tk.X)
+        tk.Button(bottom, text="Загрузить G-code", command=self.load_gcode).pack(side=tk.LEFT)
+        self.show_travel = tk.BooleanVar(value=False)
+        tk.Checkbutton(bottom, text="Холостые перемещения", variable=self.show_travel,
+                       command=self.schedule_redraw).pack(side=tk.LEFT)
+        self.info = tk.Label(bottom, text="", anchor="w")
+        self.info.pack(side=tk.LEFT, fill=tk.X, expand=True)
+
+        self.draw_index = None
+        self.travel_index = None
+        self.scale = 1.0             # Пикселей на мм
+        self.view_x = 0.0            # Координаты (мм) левого верхнего угла окна
+        self.view_y = 0.0
+        self.drag_start = None
+        self.photo = None
+        self.redraw_pending = False
 
-        self.lines = []
-        self.pen_down = False
+        self.canvas.bind("<Configure>", lambda event: self.schedule_redraw())
+        self.canvas.bind("<ButtonPress-1>", self.on_press)
+        self.canvas.bind("<B1-Motion>", self.on_drag)
+        self.canvas.bind("<Double-Button-1>", lambda event: self.fit_view())
+        self.canvas.bind("<MouseWheel>", lambda event: self.zoom(event, event.delta > 0))
+        self.canvas.bind("<Button-4>", lambda event: self.zoom(event, True))
+        self.canvas.bind("<Button-5>", lambda event: self.zoom(event, False))
 
     def load_gcode(self):
         file_path = filedialog.askopenfilename(filetypes=[("G-code", "*.gcode")])
         if not file_path:
             return
 
-        self.canvas.delete("all")
-        self.lines = []
-        x, y = 0, 0
-        scale = 1
-
         with open(file_path, 'r') as f:
-            for line in f:
-                line = line.strip()
-                if line.startswith('G0') or line.startswith('G1'):
-                    new_x = x
-                    new_y = y
-                    if 'X' in line:
-                        new_x = float(line.split('X')[1].split()[0]) * scale
-                    if 'Y' in line:
-                        new_y = float(line.split('Y')[1].split()[0]) * scale
-
-                    if 'G0' in line:
-                        self.pen_down = False
-                    elif 'G1' in line:
-                        self.pen_down = True
-
-                    if self.pen_down:
-                        self.canvas.create_line(x, y, new_x, new_y, fill="black", width=1)
-
-                    x, y = new_x, new_y
+            draw, travel = gcode_segments(f)
+        self.draw_index = SegmentIndex(draw)
+        self.travel_index = SegmentIndex(travel)
+        self.fit_view()
+
+    def fit_view(self):
+        """Масштаб, при котором видна вся программа"""
+        if self.draw_index is None:
+            return
+        x0, y0, x1, y1 = self.draw_index.bounds
+        width = max(self.canvas.winfo_width(), 1)
+        height = max(self.canvas.winfo_height(), 1)
+        self.scale = 0.95 * min(width / max(x1 - x0, 1e-3), height / max(y1 - y0, 1e-3))
+        self.view_x = (x0 + x1) / 2 - width / 2 / self.scale
+        self.view_y = (y0 + y1) / 2 - height / 2 / self.scale
+        self.schedule_redraw()
+
+    def on_press(self, event):
+        self.drag_start = (event.x, event.y, self.view_x, self.view_y)
+
+    def on_drag(self, event):
+        if self.drag_start is None:
+            return
+        start_x, start_y, view_x, view_y = self.drag_start
+        self.view_x = view_x - (event.x - start_x) / self.scale
+        self.view_y = view_y - (event.y - start_y) / self.scale
+        self.schedule_redraw()
+
+    def zoom(self, event, zoom_in):
+        """Масштаб относительно курсора: точка под курсором остаётся на месте"""
+        factor = 1.25 if zoom_in else 0.8
+        x = self.view_x + event.x / self.scale
+        y = self.view_y + event.y / self.scale
+        self.scale = min(max(self.scale * factor, 1e-3), 1e4)
+        self.view_x = x - event.x / self.scale
+        self.view_y = y - event.y / self.scale
+        self.schedule_redraw()
+
+    def schedule_redraw(self):
+        """События мыши копятся, кадр рисуется один раз, когда Tk освободится"""
+        if not self.redraw_pending:
+            self.redraw_pending = True
+            self.root.after_idle(self.redraw)
+
+    def redraw(self):
+        self.redraw_pending = False
+        if self.draw_index is None:
+            return
+        width = max(self.canvas.winfo_width(), 1)
+        height = max(self.canvas.winfo_height(), 1)
+        x1 = self.view_x + width / self.scale
+        y1 = self.view_y + height / self.scale
+        pixel_size = 1.0 / self.scale
+
+        frame = np.full((height, width), 255, dtype=np.uint8)
+        if self.show_travel.get():
+            travel, _ = self.travel_index.query(self.view_x, self.view_y, x1, y1, pixel_size)
+            rasterize_segments(frame, travel, self.view_x, self.view_y, self.scale, value=200)
+        segments, level = self.draw_index.query(self.view_x, self.view_y, x1, y1, pixel_size)
+        rasterize_segments(frame, segments, self.view_x, self.view_y, self.scale, value=0)
+
+        self.photo = ImageTk.PhotoImage(Image.fromarray(frame))
+        self.canvas.delete("all")
+        self.canvas.create_image(0, 0, image=self.photo, anchor=tk.NW)
+        self.info.config(text=f"Отрезков: {self.draw_index.count}, в окне: {len(segments)}, "
+                              f"детализация: {level}, масштаб: {self.scale:.2f} пикс/мм")
 
 if __name__ == "__main__":
     root = tk.Tk()
     app = GCodeVisualizer(root)
-    root.mainloop()
\ No newline at end of file
+    root.mainloop()
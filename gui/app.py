@@ -2,15 +2,18 @@ import tkinter as tk
 from tkinter import filedialog, messagebox
 import os
 import cv2
-from datetime import datetime
 
+from core.budget_planner import format_report as format_budget_report
 from core.project_manager import ProjectManager
 from core.image_processor import ImageProcessor
+from core.telemetry import Telemetry
 from gui.components.control_panel import ControlPanel
 from gui.components.preview_panel import PreviewPanel
 from gui.components.serial_controller import SerialController
+from gui.components.telemetry_panel import TelemetryPanel
 from utils.config import AppConfig
 from utils.helpers import cv2_to_tk
+from utils.metrics import metrics
 
 class AdvancedCNCApp:
     def __init__(self, root):
@@ -28,7 +31,11 @@ class AdvancedCNCApp:
         
         self.image_path = None
         self.original_image = None
-        self.processed_images = {}
+        self.working_image = None      # Рабочее разрешение для итогового стиля и G-code
+        self.proxy_image = None        # Маленькая копия для превью стилей
+        self.processed_images = {}     # Превью стилей (на прокси)
+        self.full_images = {}          # Стили в рабочем разрешении (по запросу)
+        self.full_paths = {}           # Готовые пути векторных стилей в рабочем разрешении
         self.final_png_path = None
         self.last_gcode_path = None
     
@@ -38,9 +45,15 @@ class AdvancedCNCApp:
         # Создаем полную конфигурацию, включая G-code настройки
         full_config = AppConfig.IMAGE_CONFIG.copy()
         full_config['GCODE_CONFIG'] = AppConfig.GCODE_CONFIG
+        full_config['STYLE_CONFIG'] = AppConfig.STYLE_CONFIG
         
         self.processor = ImageProcessor(self.pm, full_config)
+        self.telemetry = Telemetry({**AppConfig.TELEMETRY_CONFIG,
+                                    "default_feed": AppConfig.GCODE_CONFIG["feed_rate_drawing"]})
         self.serial_controller = SerialController(self)
+        
+        if AppConfig.METRICS_CONFIG["enabled"]:
+            metrics.enable(AppConfig.METRICS_CONFIG["track_memory"])
     
     def setup_gui_components(self):
         """Инициализация GUI компонентов"""
@@ -105,6 +118,9 @@ class AdvancedCNCApp:
 
         self.progress = tk.ttk.Progressbar(self.root, mode='indeterminate')
         self.progress.pack(side=tk.BOTTOM, fill=tk.X, padx=20, pady=5)
+
+        # Ход отправки на станок: доля программы, позиция и оставшееся время
+        self.telemetry_panel = TelemetryPanel(self.root, self.root, self.telemetry, self.progress)
     
     # Основные методы приложения
     def load_image(self):
@@ -115,12 +131,21 @@ class AdvancedCNCApp:
         if not self.image_path:
             return
 
-        self.original_image = cv2.imread(self.image_path)
-        if self.original_image is None:
+        try:
+            # Декодирование сразу в уменьшенном виде, с учётом ориентации EXIF
+            self.original_image = self.processor.read_image(self.image_path)
+        except ValueError:
             self.show_error("Ошибка", "Не удалось загрузить изображение.")
             return
 
-        self.display_image(self.original_image, "original")
+        # Пирамида разрешений: рабочее для экспорта, прокси для превью
+        self.working_image = self.processor.prepare_image(self.original_image)
+        self.proxy_image = self.processor.make_proxy(self.working_image)
+        self.processed_images = {}
+        self.full_images = {}
+        self.full_paths = {}
+
+        self.display_image(self.proxy_image, "original")
         self.file_label.config(text=os.path.basename(self.image_path))
         self.update_status("Фото загружено. Выберите стиль и нажмите 'Обработать'.")
         self.convert_btn['state'] = 'normal'
@@ -133,6 +158,7 @@ class AdvancedCNCApp:
 
         self.progress.start()
         self.log("Начинаем обработку изображения...")
+        metrics.reset()
 
         try:
             # Определяем какие стили обрабатывать
@@ -143,11 +169,14 @@ class AdvancedCNCApp:
                 styles_to_process = AppConfig.STYLES["advanced"]
                 current_style = self.advanced_style_var.get()
 
-            # Обрабатываем все стили текущего режима
+            # Все стили текущего режима за один проход графа - общие шаги считаются
+            # один раз; на прокси это миллисекунды
+            converter = self.processor.proxy_style_converter(self.proxy_image,
+                                                             self.working_image)
+            self.processed_images.update(
+                converter.apply_styles(self.proxy_image, styles_to_process)
+            )
             for style in styles_to_process:
-                self.processed_images[style] = self.processor.style_converter.apply_style(
-                    self.original_image, style
-                )
                 self.log(f"Обработан стиль: {style}")
 
             # Обновляем превью
@@ -158,9 +187,10 @@ class AdvancedCNCApp:
             self.gcode_btn['state'] = 'normal'
 
             self.log("✓ Обработка завершена успешно!")
+            self.log_metrics()
 
         except Exception as e:
-            self.log(f"✗ Ошибка обработки: {e}")
+            self.log(f"✗ Ошибка обработки: {e}", "error")
             self.show_error("Ошибка", f"Не удалось обработать изображение:\n{e}")
         
         finally:
@@ -199,23 +229,40 @@ class AdvancedCNCApp:
     
     def display_current_images(self):
         """Отображает все текущие изображения"""
-        self.display_image(self.original_image, "original")
+        self.display_image(self.proxy_image, "original")
         for style, img in self.processed_images.items():
             if style in self.preview_panel.canvas_frames:
                 self.display_image(img, style)
     
+    def get_full_style(self, style):
+        """Стиль в рабочем разрешении - считается только для экспорта и кэшируется"""
+        if style not in self.full_images:
+            self.log(f"Стиль {style} в рабочем разрешении "
+                     f"{self.working_image.shape[1]}x{self.working_image.shape[0]}...")
+            converter = self.processor.style_converter
+            if style in converter.VECTOR_STYLES:
+                self.full_images[style], self.full_paths[style] = \
+                    converter.apply_vector_style(self.working_image, style)
+            else:
+                self.full_images[style] = converter.apply_style(self.working_image, style)
+        return self.full_images[style]
+    
     def update_previews(self):
         """Обновляет панель превью"""
         self.preview_panel.setup_previews()
         if self.original_image is not None:
             self.display_current_images()
     
-    def log(self, message):
-        """Добавляет запись в лог"""
-        timestamp = datetime.now().strftime("%H:%M:%S")
-        self.log_text.insert("end", f"[{timestamp}] {message}\n")
-        self.log_text.see("end")
-        self.root.update_idletasks()
+    def log(self, message, level="info"):
+        """Добавляет запись в лог (вывод в виджет - пачками)"""
+        self.log_panel.append(message, level)
+    
+    def log_metrics(self):
+        """Выводит время и память по этапам в лог"""
+        if not metrics.enabled:
+            return
+        for line in metrics.summary_lines():
+            self.log(f"  ⏱ {line}")
     
     def update_status(self, msg):
         """Обновляет статус бар"""
@@ -259,11 +306,11 @@ class AdvancedCNCApp:
         style_names = {
             "sketch": "Эскиз", "contour": "Контур", "silhouette": "Силуэт", "blurred": "Размыто",
             "pencil": "Карандаш", "pen_hatching": "Штриховка", 
-            "makelangelo5": "Makelangelo", "portrait": "Портрет"
+            "makelangelo5": "Makelangelo", "portrait": "Портрет", "stipple": "Пунктир"
         }
         style_name = style_names.get(current_style, current_style)
         
-        img = self.processed_images[current_style]
+        img = self.get_full_style(current_style)
         filename = f"{base_name}_{style_name}.png"
         path = os.path.join(output_dir, filename)
         cv2.imwrite(path, img)
@@ -291,60 +338,80 @@ class AdvancedCNCApp:
 
         self.progress.start()
         self.log("Создаем G-code...")
+        metrics.reset()
 
         try:
             base_name = os.path.splitext(os.path.basename(self.image_path))[0]
             
             # Используем конвертер для создания G-code
-            processed_image = self.processed_images[current_style]
-            contours = self.processor.find_contours(processed_image)
-            gcode_commands = self.processor.gcode_generator.contours_to_gcode(contours)
+            processed_image = self.get_full_style(current_style)
+            vector = current_style in self.full_paths
+            if vector:
+                contours = self.full_paths[current_style]   # Один путь без подъёмов пера
+            else:
+                contours = self.processor.find_contours(processed_image)
             
             # Сохраняем G-code
             style_names = {
                 "sketch": "sketch", "contour": "contour", "silhouette": "silhouette", 
                 "blurred": "blurred", "pencil": "pencil", "pen_hatching": "pen_hatching",
-                "makelangelo5": "makelangelo5", "portrait": "portrait"
+                "makelangelo5": "makelangelo5", "portrait": "portrait", "stipple": "stipple"
             }
             style_suffix = style_names.get(current_style, current_style)
             
             gcode_path = self.pm.get_unique_filename(f"{base_name}_{style_suffix}", "gcode", "gcode")
             
-            with open(gcode_path, 'w', encoding='utf-8') as f:
-                for command in gcode_commands:
-                    f.write(command + '\n')
+            # Рисунок в рабочем разрешении - на станке того же размера, что и раньше
+            self.processor.fit_gcode_scale(self.working_image)
+            weights = None if vector else self.processor.contour_weights(self.working_image,
+                                                                          contours)
+            commands_count = self.processor.gcode_generator.write_gcode(
+                contours, gcode_path, closed=False if vector else self.processor.contours_closed(),
+                weights=weights)
 
             self.last_gcode_path = str(gcode_path)
             self.send_btn['state'] = 'normal'
             
-            self.update_status(f"G-code создан: {len(gcode_commands)} команд, {len(contours)} контуров")
+            self.update_status(f"G-code создан: {commands_count} команд, {len(contours)} контуров")
             self.log(f"✓ G-code создан: {os.path.basename(gcode_path)}")
-            self.log(f"  Контуров: {len(contours)}, Команд: {len(gcode_commands)}")
+            self.log(f"  Контуров: {len(contours)}, Команд: {commands_count}")
+            feed_report = self.processor.gcode_generator.report.get('adaptive_feed')
+            if feed_report:
+                self.log(f"  Адаптивная подача: -{feed_report['time_saved']:.1f} с рисования, "
+                         f"смен F: {feed_report['feed_changes']}")
+            budget_report = self.processor.gcode_generator.report.get('budget')
+            if budget_report:
+                self.log(f"  {format_budget_report(budget_report)}")
+            self.log_metrics()
             
             self.show_info("Готово!", 
                           f"G-code файл создан успешно!\n\n"
                           f"Файл: {os.path.basename(gcode_path)}\n"
                           f"Контуров: {len(contours)}\n"
-                          f"Команд G-code: {len(gcode_commands)}")
+                          f"Команд G-code: {commands_count}")
 
         except Exception as e:
-            self.log(f"✗ Ошибка создания G-code: {e}")
+            self.log(f"✗ Ошибка создания G-code: {e}", "error")
             self.show_error("Ошибка", f"Не удалось создать G-code:\n{e}")
         
         finally:
             self.progress.stop()
 
     def send_gcode_to_printer(self):
-        """Отправляет G-code на принтер"""
+        """Запускает отправку G-code на принтер (итог - в on_send_finished)"""
         if not self.last_gcode_path:
             self.show_error("Ошибка", "Сначала создайте G-code")
             return
         
-        self.progress.start()
-        success = self.serial_controller.send_gcode_to_printer(self.last_gcode_path)
-        self.progress.stop()
+        metrics.reset()
+        if not self.serial_controller.send_gcode_to_printer(self.last_gcode_path):
+            self.show_error("Ошибка", "Не удалось отправить G-code на принтер")
+
+    def on_send_finished(self, state):
+        """Отправка завершена: done, aborted или error"""
+        self.log_metrics()
         
-        if success:
+        if state == "done":
             self.show_info("Успех", "G-code успешно отправлен на принтер!")
-        else:
+        elif state == "error":
             self.show_error("Ошибка", "Не удалось отправить G-code на принтер")
\ No newline at end of file
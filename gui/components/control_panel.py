@@ -2,6 +2,7 @@ import tkinter as tk
 from tkinter import ttk
 from utils.helpers import create_button
 from utils.config import AppConfig
+from gui.components.log_panel import LogPanel
 
 class ControlPanel:
     def __init__(self, parent, app):
@@ -80,7 +81,8 @@ class ControlPanel:
             ("✏️ Карандаш", "pencil"),
             ("🖊 Штриховка", "pen_hatching"),
             ("🔍 Makelangelo", "makelangelo5"),
-            ("🎨 Портрет", "portrait")
+            ("🎨 Портрет", "portrait"),
+            ("🖋 Пунктир TSP", "stipple")
         ]
         
         for text, value in advanced_styles:
@@ -145,7 +147,23 @@ class ControlPanel:
                                         AppConfig.COLORS["accent_orange"])
         self.app.send_btn.pack(fill=tk.X, padx=5, pady=2)
         self.app.send_btn['state'] = 'disabled'
-        
+
+        # Пауза и отмена идущей отправки
+        job_frame = tk.Frame(printer_frame, bg=AppConfig.COLORS["bg_secondary"])
+        job_frame.pack(fill=tk.X, padx=5, pady=2)
+
+        self.app.pause_btn = create_button(job_frame, "⏸ Пауза",
+                                         self.app.serial_controller.toggle_pause,
+                                         AppConfig.COLORS["accent_blue"])
+        self.app.pause_btn.pack(side=tk.LEFT, fill=tk.X, expand=True, padx=(0, 2))
+        self.app.pause_btn['state'] = 'disabled'
+
+        self.app.abort_btn = create_button(job_frame, "⏹ Отмена",
+                                         self.app.serial_controller.abort_sending,
+                                         AppConfig.COLORS["accent_red"])
+        self.app.abort_btn.pack(side=tk.LEFT, fill=tk.X, expand=True, padx=(2, 0))
+        self.app.abort_btn['state'] = 'disabled'
+
         # Статус подключения
         self.app.connection_status = tk.Label(printer_frame, text="❌ Не подключено", 
                                             bg=AppConfig.COLORS["bg_secondary"], 
@@ -160,12 +178,4 @@ class ControlPanel:
                                 font=("Segoe UI", 10, "bold"))
         log_frame.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
         
-        self.app.log_text = tk.Text(log_frame, height=8, width=30, 
-                                  bg=AppConfig.COLORS["bg_primary"], 
-                                  fg=AppConfig.COLORS["text_primary"],
-                                  font=("Consolas", 8), relief=tk.FLAT)
-        scrollbar = tk.Scrollbar(log_frame, command=self.app.log_text.yview)
-        self.app.log_text.config(yscrollcommand=scrollbar.set)
-        
-        self.app.log_text.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
-        scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
\ No newline at end of file
+        self.app.log_panel = LogPanel(log_frame, self.app.root)
\ No newline at end of file
@@ -0,0 +1,114 @@
+import threading
+import time
+import tkinter as tk
+from collections import deque
+from datetime import datetime
+from utils.config import AppConfig
+
+LEVELS = ("debug", "info", "warning", "error")
+LEVEL_LABELS = {"debug": "Отладка", "info": "Инфо", "warning": "Предупр.", "error": "Ошибки"}
+
+
+class LogPanel:
+    """Лог с кольцевым буфером: строки копятся в памяти и выводятся пачками по таймеру
+
+    Стоимость одной записи постоянна и не зависит от длины задания: добавление
+    в deque, а виджет обновляется не чаще раза в flush_interval_ms.
+    """
+
+    def __init__(self, parent, root, config=None):
+        self.root = root
+        self.config = dict(AppConfig.LOG_CONFIG)
+        if config:
+            self.config.update(config)
+
+        self.records = deque(maxlen=self.config["history_size"])
+        self.pending = deque(maxlen=self.config["max_lines"])
+        self.visible_levels = set(self.config["levels"])
+        self.interval = self.config["flush_interval_ms"] / 1000.0
+        self.last_flush = time.monotonic()
+
+        self.setup_ui(parent)
+        self.root.after(self.config["flush_interval_ms"], self._timer_flush)
+
+    def setup_ui(self, parent):
+        filter_frame = tk.Frame(parent, bg=AppConfig.COLORS["bg_secondary"])
+        filter_frame.pack(side=tk.TOP, fill=tk.X)
+
+        self.level_vars = {}
+        for level in LEVELS:
+            var = tk.BooleanVar(value=level in self.visible_levels)
+            self.level_vars[level] = var
+            tk.Checkbutton(filter_frame, text=LEVEL_LABELS[level], variable=var,
+                           command=self.apply_filter,
+                           bg=AppConfig.COLORS["bg_secondary"], fg="white",
+                           selectcolor=AppConfig.COLORS["bg_primary"],
+                           font=("Segoe UI", 7)).pack(side=tk.LEFT)
+
+        self.text = tk.Text(parent, height=8, width=30,
+                            bg=AppConfig.COLORS["bg_primary"],
+                            fg=AppConfig.COLORS["text_primary"],
+                            font=("Consolas", 8), relief=tk.FLAT)
+        scrollbar = tk.Scrollbar(parent, command=self.text.yview)
+        self.text.config(yscrollcommand=scrollbar.set)
+
+        self.text.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+
+    def append(self, message, level="info"):
+        """Добавляет запись; можно вызывать из любого потока"""
+        record = (datetime.now().strftime("%H:%M:%S"), level, message)
+        self.records.append(record)
+        if level in self.visible_levels:
+            self.pending.append(record)
+
+        # Если главный поток занят долгой операцией, таймер не сработает -
+        # сбрасываем пачку сами, но не чаще интервала
+        if (time.monotonic() - self.last_flush >= self.interval
+                and threading.current_thread() is threading.main_thread()):
+            self.flush()
+            self.root.update_idletasks()
+
+    def _format(self, records):
+        return "".join(f"[{timestamp}] {message}\n" for timestamp, _, message in records)
+
+    def flush(self):
+        """Выводит накопленные записи одной вставкой и обрезает старые строки"""
+        self.last_flush = time.monotonic()
+        if not self.pending:
+            return
+        batch = []
+        while self.pending:
+            batch.append(self.pending.popleft())
+
+        self.text.insert("end", self._format(batch))
+        self._trim()
+        self.text.see("end")
+
+    def _trim(self):
+        """Оставляет в виджете не больше max_lines строк текста
+
+        Строки считает сам виджет: запись с переносами (traceback) - это
+        несколько строк, а не одна.
+        """
+        # После последнего "\n" остаётся пустая строка - её не считаем
+        lines = int(self.text.index("end-1c").split(".")[0]) - 1
+        excess = lines - self.config["max_lines"]
+        if excess > 0:
+            self.text.delete("1.0", f"{excess + 1}.0")
+
+    def _timer_flush(self):
+        self.flush()
+        self.root.after(self.config["flush_interval_ms"], self._timer_flush)
+
+    def apply_filter(self):
+        """Перерисовывает видимую историю по выбранным уровням"""
+        self.visible_levels = {level for level, var in self.level_vars.items() if var.get()}
+        self.pending.clear()
+        visible = [r for r in self.records if r[1] in self.visible_levels]
+        visible = visible[-self.config["max_lines"]:]
+
+        self.text.delete("1.0", "end")
+        self.text.insert("end", self._format(visible))
+        self._trim()
+        self.text.see("end")
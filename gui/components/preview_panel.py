@@ -77,5 +77,6 @@ class PreviewPanel:
                 ("Карандаш", "pencil"),
                 ("Штриховка", "pen_hatching"), 
                 ("Makelangelo", "makelangelo5"),
-                ("Портрет", "portrait")
+                ("Портрет", "portrait"),
+                ("Пунктир TSP", "stipple")
             ]
\ No newline at end of file
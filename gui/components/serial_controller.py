@@ -1,11 +1,17 @@
 import serial
 import serial.tools.list_ports
+from core.serial_streamer import SerialStreamer
+from core.wire_encoder import WireEncoder, format_report
 from utils.config import AppConfig
 
 class SerialController:
+    EVENT_INTERVAL_MS = 50     # Период разбора событий потока отправки
+
     def __init__(self, app):
         self.app = app
         self.serial_conn = None
+        self.streamer = None
+        self.encoder = None
     
     def update_ports(self):
         """Обновляет список доступных COM-портов"""
@@ -16,7 +22,7 @@ class SerialController:
             self.app.log(f"Найдены порты: {', '.join(ports)}")
         else:
             self.app.port_var.set("")
-            self.app.log("COM-порты не найдены")
+            self.app.log("COM-порты не найдены", "warning")
     
     def connect_printer(self):
         """Подключается к принтеру"""
@@ -26,53 +32,105 @@ class SerialController:
             return
 
         try:
-            self.serial_conn = serial.Serial(port, 115200, timeout=10)
+            self.serial_conn = serial.Serial(port, AppConfig.WIRE_CONFIG["baud_rate"], timeout=10)
             self.app.connection_status.config(text=f"✅ Подключено к {port}", 
                                             fg=AppConfig.COLORS["accent_green"])
             self.app.log(f"Успешное подключение к {port}")
             self.app.show_info("Успех", f"Подключено к принтеру на порту {port}")
         except Exception as e:
-            self.app.log(f"Ошибка подключения: {e}")
+            self.app.log(f"Ошибка подключения: {e}", "error")
             self.app.connection_status.config(text="❌ Ошибка подключения", 
                                             fg=AppConfig.COLORS["accent_red"])
             self.app.show_error("Ошибка", f"Не удалось подключиться: {e}")
     
     def send_gcode_to_printer(self, gcode_path):
-        """Отправляет G-code на принтер"""
+        """Запускает отправку G-code в отдельном потоке; True - отправка началась"""
         if not self.serial_conn or not self.serial_conn.is_open:
             self.app.show_error("Ошибка", "Не подключено к принтеру")
             return False
+        if self.streamer is not None and self.streamer.is_alive():
+            self.app.show_warning("Внимание", "Отправка уже идёт")
+            return False
 
-        self.app.progress.start()
         try:
             with open(gcode_path, 'r') as f:
                 gcode_lines = [line.strip() for line in f if line.strip()]
+        except OSError as e:
+            self.app.log(f"✗ Ошибка отправки: {e}", "error")
+            return False
 
-            total_lines = len(gcode_lines)
-            sent_lines = 0
+        # Компактная запись для порта (смысл программы тот же)
+        if AppConfig.WIRE_CONFIG["enabled"]:
+            self.encoder = WireEncoder(AppConfig.WIRE_CONFIG)
+            gcode_lines = self.encoder.encode(gcode_lines, AppConfig.WIRE_CONFIG["baud_rate"])
+            self.app.log(format_report(self.encoder.report))
 
-            for line in gcode_lines:
-                if not line or line.startswith(';'):
-                    continue
+        # Порт дальше принадлежит потоку отправки, GUI только читает события
+        self.streamer = SerialStreamer(self.serial_conn, AppConfig.STREAM_CONFIG, self.app.telemetry)
+        self.streamer.start(gcode_lines)
+        self.app.telemetry_panel.start()
+        self.set_job_buttons(True)
+        self.app.update_status("Отправка G-code...")
+        self.app.root.after(self.EVENT_INTERVAL_MS, self.poll_events)
+        return True
+
+    def toggle_pause(self):
+        """Пауза (перо сразу поднимается) или продолжение отправки"""
+        if self.streamer is None or not self.streamer.is_alive():
+            return
+        if self.streamer.state == "paused":
+            self.streamer.resume()
+        else:
+            self.streamer.pause()
 
-                self.serial_conn.write((line + '\n').encode())
-                self.app.log(f"> {line}")
+    def abort_sending(self):
+        if self.streamer is not None and self.streamer.is_alive():
+            self.streamer.abort()
 
-                # Ждём ответ от принтера
-                response = self.serial_conn.readline().decode().strip()
-                if response:
-                    self.app.log(f"< {response}")
+    def set_job_buttons(self, sending):
+        self.app.send_btn['state'] = 'disabled' if sending else 'normal'
+        self.app.pause_btn['state'] = 'normal' if sending else 'disabled'
+        self.app.abort_btn['state'] = 'normal' if sending else 'disabled'
+        self.app.pause_btn.config(text="⏸ Пауза")
 
-                sent_lines += 1
-                if sent_lines % 10 == 0:
-                    self.app.update_status(f"Отправка: {sent_lines}/{total_lines}")
+    def poll_events(self):
+        """Разбирает события потока отправки (таймер Tk, главный поток)"""
+        for event in self.streamer.drain_events():
+            kind = event[0]
+            if kind == "log":
+                self.app.log(event[2], event[1])
+            elif kind == "state":
+                self.on_state(event[1])
+            elif kind == "finished":
+                self.on_finished(event[1], event[2])
+                return
+        self.app.root.after(self.EVENT_INTERVAL_MS, self.poll_events)
 
+    def on_state(self, state):
+        if state == "paused":
+            self.app.pause_btn.config(text="▶ Продолжить")
+            self.app.update_status("Пауза: перо поднято")
+            self.app.log("⏸ Отправка на паузе, перо поднято")
+        elif state == "running":
+            self.app.pause_btn.config(text="⏸ Пауза")
+            self.app.update_status("Отправка G-code...")
+        elif state == "aborting":
+            self.app.pause_btn['state'] = 'disabled'
+            self.app.abort_btn['state'] = 'disabled'
+            self.app.update_status("Отмена: ждём ответы на отправленные строки")
+
+    def on_finished(self, state, stats):
+        self.app.telemetry_panel.stop()
+        self.set_job_buttons(False)
+        if stats['elapsed'] > 0 and stats['lines']:
+            self.app.log(f"Отправлено {stats['bytes']} байт за {stats['elapsed']:.1f} с: "
+                         f"{stats['lines'] / stats['elapsed']:.1f} строк/с")
+        if state == "done":
             self.app.log("✓ G-code успешно отправлен на принтер!")
             self.app.update_status("G-code отправлен на принтер")
-            return True
-
-        except Exception as e:
-            self.app.log(f"✗ Ошибка отправки: {e}")
-            return False
-        finally:
-            self.app.progress.stop()
\ No newline at end of file
+        elif state == "aborted":
+            self.app.log(f"⏹ Отправка отменена на строке {stats['lines']}/{stats['total']}", "warning")
+            self.app.update_status("Отправка отменена")
+        else:
+            self.app.update_status("Ошибка отправки")
+        self.app.on_send_finished(state)
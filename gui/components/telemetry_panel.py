@@ -0,0 +1,47 @@
+import tkinter as tk
+from core.telemetry import format_snapshot
+from utils.config import AppConfig
+
+
+class TelemetryPanel:
+    """Прогресс отправки: определённый прогресс-бар и строка со статистикой
+
+    Читает только Telemetry.snapshot() по таймеру Tk; поток отправки
+    (SerialStreamer) лишь вызывает Telemetry.ack().
+    """
+
+    def __init__(self, parent, root, telemetry, progress):
+        self.root = root
+        self.telemetry = telemetry
+        self.progress = progress
+        self.interval_ms = AppConfig.TELEMETRY_CONFIG["refresh_interval_ms"]
+        self.active = False
+
+        self.label = tk.Label(parent, text="", bg=AppConfig.COLORS["bg_primary"],
+                              fg=AppConfig.COLORS["text_secondary"], font=("Consolas", 8))
+        self.label.pack(side=tk.BOTTOM, fill=tk.X)
+
+    def start(self):
+        """Переключает прогресс-бар в определённый режим на время задания"""
+        self.active = True
+        self.progress.stop()
+        self.progress.config(mode='determinate', maximum=1000, value=0)
+        self.refresh()
+        self.root.after(self.interval_ms, self._timer_refresh)
+
+    def stop(self):
+        self.active = False
+        self.refresh()
+        self.progress.config(mode='indeterminate', value=0)
+
+    def _timer_refresh(self):
+        if self.active:
+            self.refresh()
+            self.root.after(self.interval_ms, self._timer_refresh)
+
+    def refresh(self):
+        snapshot = self.telemetry.snapshot()
+        if snapshot['state'] == "idle":
+            return
+        self.progress.config(value=snapshot['fraction'] * 1000)
+        self.label.config(text=format_snapshot(snapshot))
@@ -0,0 +1,400 @@
+import argparse
+import base64
+import io
+import json
+import os
+import shutil
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from PIL import Image
+
+from core.gcode_generator import GCodeGenerator
+from core.image_processor import ImageProcessor
+from core.project_manager import ProjectManager
+from core.style_converter import StyleConverter
+from utils.config import AppConfig
+from utils.metrics import metrics
+
+# Форматы загрузки (PIL) -> расширение файла
+_FORMATS = {"JPEG": "jpg", "PNG": "png", "BMP": "bmp", "TIFF": "tif", "WEBP": "webp"}
+
+# Процессор воркера с базовыми настройками (создаётся один раз на процесс)
+_worker = {}
+
+
+def _base_config():
+    config = AppConfig.IMAGE_CONFIG.copy()
+    config['GCODE_CONFIG'] = dict(AppConfig.GCODE_CONFIG)
+    config['STYLE_CONFIG'] = dict(AppConfig.STYLE_CONFIG)
+    return config
+
+
+def _init_worker(project_root, track_memory):
+    _worker['pm'] = ProjectManager(project_root)
+    _worker['processor'] = ImageProcessor(_worker['pm'], _base_config())
+    metrics.enable(track_memory)
+
+
+def _run_job(image_path, name, style, options):
+    """Выполняется в процессе пула: обработка одного изображения"""
+    processor = _worker['processor']
+    if options:
+        config = _base_config()
+        config.update(options.get('image', {}))
+        config['GCODE_CONFIG'].update(options.get('gcode', {}))
+        config['STYLE_CONFIG'].update(options.get('style', {}))
+        processor = ImageProcessor(_worker['pm'], config)
+
+    metrics.reset()
+    started = time.perf_counter()
+    result = processor.process_image(image_path, output_name=name, style=style)
+    return {
+        'preview': str(result['preview']),
+        'gcode': str(result['gcode']),
+        'contours_count': result['contours_count'],
+        'commands_count': result['commands_count'],
+        'report': result['report'],
+        'metrics': result['metrics'],
+        'cached': result['cached'],
+        'processing_time': time.perf_counter() - started
+    }
+
+
+# Параметры с числовым значением по умолчанию, которые можно сбросить в null
+_NULLABLE = {'working_size', 'noise_seed'}
+
+
+def _is_number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def _check_value(name, default, value):
+    """Значение подходит по типу к значению по умолчанию; текст ошибки или None"""
+    if value is None and (default is None or name in _NULLABLE):
+        return None
+    if isinstance(default, bool):
+        valid = isinstance(value, bool)
+    elif default is None or _is_number(default):
+        # int и float взаимозаменяемы: 500 и 450.5 - обе подачи
+        valid = _is_number(value)
+    elif isinstance(default, str):
+        valid = isinstance(value, str)
+    elif isinstance(default, (tuple, list)):
+        valid = (isinstance(value, list) and len(value) > 0
+                 and all(_is_number(item) for item in value)
+                 and (len(value) == len(default) or name == 'iso_levels'))
+    else:
+        valid = isinstance(value, type(default))
+    return None if valid else f"неверный тип {name}: {json.dumps(value, ensure_ascii=False)}"
+
+
+def validate_options(style, options):
+    """Проверяет стиль и переопределения параметров, возвращает текст ошибки или None
+
+    Каждое значение сверяется с типом значения по умолчанию, чтобы ошибка
+    была ответом 400 сразу, а не падением задания в пуле.
+    """
+    if style not in StyleConverter.STYLES:
+        return f"неизвестный стиль: {style}"
+    defaults = {
+        'image': {key: value for key, value in AppConfig.IMAGE_CONFIG.items()
+                  if key != 'GCODE_CONFIG'},
+        'gcode': GCodeGenerator().config,
+        'style': StyleConverter.DEFAULT_PARAMS
+    }
+    for section, values in options.items():
+        if section not in defaults:
+            return f"неизвестный раздел параметров: {section}"
+        if not isinstance(values, dict):
+            return f"раздел {section} должен быть объектом"
+        unknown = set(values) - set(defaults[section])
+        if unknown:
+            return f"неизвестные параметры {section}: {', '.join(sorted(unknown))}"
+    if options.get('gcode', {}).get('calibration_file'):
+        return "calibration_file задаётся только в настройках сервера"
+    for section, values in options.items():
+        for name, value in values.items():
+            error = _check_value(name, defaults[section][name], value)
+            if error:
+                return f"{section}: {error}"
+    return None
+
+
+class JobQueue:
+    """Задания в пуле процессов с ограничением очереди
+
+    Заданий в работе и в очереди - не больше max_pending: следующее
+    отклоняется сразу (HTTP 429), а не копится в памяти сервера.
+    """
+
+    def __init__(self, config=None):
+        self.config = {
+            "project_root": AppConfig.PROJECT_ROOT,
+            "workers": None,          # Процессов в пуле (None - все ядра)
+            "max_pending": 8,         # Заданий в очереди и в работе одновременно
+            "history": 200,           # Сколько завершённых заданий помнить
+            "track_memory": False     # Пиковая память этапов (замедляет обработку)
+        }
+        if config:
+            self.config.update(config)
+        self.pm = ProjectManager(self.config["project_root"])
+        self.workers = self.config["workers"] or os.cpu_count() or 1
+        self.executor = ProcessPoolExecutor(
+            max_workers=self.workers, initializer=_init_worker,
+            initargs=(str(self.config["project_root"]), self.config["track_memory"]))
+        self.jobs = OrderedDict()
+        self.pending = 0
+        self._lock = threading.Lock()
+
+    def submit(self, data, extension, name, style, options):
+        """Ставит задание в очередь; None - очередь заполнена"""
+        with self._lock:
+            if self.pending >= self.config["max_pending"]:
+                return None
+            self.pending += 1
+            job_id = uuid.uuid4().hex[:12]
+            job = {'id': job_id, 'status': 'queued', 'style': style, 'name': name,
+                   'submitted': time.time(), 'finished': None, 'result': None, 'error': None,
+                   'future': None}
+            self.jobs[job_id] = job
+            self._trim()
+
+        try:
+            # Загрузка кладётся в хранилище по хешу: одинаковые файлы - один файл
+            _, image_path = self.pm.store.put_bytes(data, extension)
+            future = self.executor.submit(_run_job, str(image_path), name, style, options)
+        except Exception as e:
+            self._finish(job, error=str(e))
+            return job
+        job['future'] = future
+        future.add_done_callback(lambda done: self._done(job, done))
+        return job
+
+    def _done(self, job, future):
+        try:
+            self._finish(job, result=future.result())
+        except Exception as e:
+            self._finish(job, error=f"{type(e).__name__}: {e}")
+
+    def _finish(self, job, result=None, error=None):
+        with self._lock:
+            job['finished'] = time.time()
+            job['result'] = result
+            job['error'] = error
+            job['status'] = 'error' if error else 'done'
+            self.pending -= 1
+
+    def _trim(self):
+        """Забывает самые старые завершённые задания сверх history"""
+        finished = [job_id for job_id, job in self.jobs.items() if job['finished']]
+        for job_id in finished[:max(0, len(finished) - self.config["history"])]:
+            del self.jobs[job_id]
+
+    def get(self, job_id):
+        with self._lock:
+            job = self.jobs.get(job_id)
+            if job is None:
+                return None
+            job = dict(job)
+        if job['status'] == 'queued' and job['future'] is not None and job['future'].running():
+            job['status'] = 'running'
+        return job
+
+    def stats(self):
+        with self._lock:
+            return {'workers': self.workers, 'pending': self.pending,
+                    'max_pending': self.config["max_pending"], 'known_jobs': len(self.jobs)}
+
+    def shutdown(self):
+        self.executor.shutdown(wait=True, cancel_futures=True)
+
+
+def job_view(job):
+    """Задание для ответа клиенту: статус, время и ссылки на результаты"""
+    view = {'id': job['id'], 'status': job['status'], 'style': job['style'],
+            'name': job['name'], 'url': f"/jobs/{job['id']}"}
+    if job['finished']:
+        view['wall_time'] = job['finished'] - job['submitted']
+    if job['error']:
+        view['error'] = job['error']
+    result = job['result']
+    if result:
+        view.update({key: result[key] for key in ('contours_count', 'commands_count', 'report',
+                                                  'metrics', 'cached', 'processing_time')})
+        view['queue_time'] = max(0.0, view['wall_time'] - result['processing_time'])
+        view['preview_url'] = f"/jobs/{job['id']}/preview"
+        view['gcode_url'] = f"/jobs/{job['id']}/gcode"
+    return view
+
+
+class JobRequestHandler(BaseHTTPRequestHandler):
+    """HTTP API:
+
+    POST /jobs?style=sketch&name=photo   тело - изображение (image/*)
+    POST /jobs                           JSON {"image": base64, "style", "name",
+                                               "options": {"image"|"gcode"|"style": {...}}}
+    GET  /jobs/<id>                      статус и результат задания
+    GET  /jobs/<id>/preview | /gcode     файлы результата
+    GET  /health                         загрузка пула
+    """
+
+    server_version = "DrawlerJobServer/1.0"
+
+    def log_message(self, format, *args):
+        if not self.server.quiet:
+            super().log_message(format, *args)
+
+    def _send_json(self, status, payload, headers=None):
+        body = json.dumps(payload, ensure_ascii=False, default=str).encode('utf-8')
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_error(self, status, message, headers=None):
+        self._send_json(status, {'error': message}, headers)
+
+    def _send_file(self, path, content_type):
+        if not os.path.exists(path):
+            self._send_error(410, "файл результата удалён")
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(os.path.getsize(path)))
+        self.end_headers()
+        with open(path, 'rb') as f:
+            shutil.copyfileobj(f, self.wfile)
+
+    def do_GET(self):
+        parts = [part for part in urlparse(self.path).path.split('/') if part]
+        if parts == ['health']:
+            self._send_json(200, self.server.queue.stats())
+            return
+        if len(parts) < 2 or parts[0] != 'jobs':
+            self._send_error(404, "не найдено")
+            return
+
+        job = self.server.queue.get(parts[1])
+        if job is None:
+            self._send_error(404, "задание не найдено")
+        elif len(parts) == 2:
+            self._send_json(200, job_view(job))
+        elif job['result'] is None:
+            self._send_error(409, f"задание в состоянии {job['status']}")
+        elif parts[2:] == ['preview']:
+            self._send_file(job['result']['preview'], "image/png")
+        elif parts[2:] == ['gcode']:
+            self._send_file(job['result']['gcode'], "text/plain; charset=utf-8")
+        else:
+            self._send_error(404, "не найдено")
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        if url.path.rstrip('/') != '/jobs':
+            self._send_error(404, "не найдено")
+            return
+
+        length = int(self.headers.get("Content-Length") or 0)
+        if length <= 0:
+            self._send_error(411, "нужен Content-Length")
+            return
+        if length > self.server.max_upload:
+            self._send_error(413, f"файл больше {self.server.max_upload // (1024 * 1024)} МБ")
+            return
+        body = self.rfile.read(length)
+
+        query = {key: values[-1] for key, values in parse_qs(url.query).items()}
+        content_type = self.headers.get("Content-Type", "").split(';')[0].strip()
+        if content_type == "application/json":
+            try:
+                request = json.loads(body)
+                data = base64.b64decode(request['image'], validate=True)
+            except (ValueError, KeyError, TypeError) as e:
+                self._send_error(400, f"неверный JSON: {e}")
+                return
+            style = request.get('style', 'sketch')
+            name = request.get('name', 'upload')
+            options = request.get('options') or {}
+        else:
+            data = body
+            style = query.get('style', 'sketch')
+            name = query.get('name', 'upload')
+            options = {}
+
+        try:
+            with Image.open(io.BytesIO(data)) as img:
+                extension = _FORMATS.get(img.format)
+        except OSError:
+            extension = None
+        if extension is None:
+            self._send_error(415, "не изображение или неподдерживаемый формат")
+            return
+        if not isinstance(options, dict):
+            self._send_error(400, "options должен быть объектом")
+            return
+        error = validate_options(style, options)
+        if error:
+            self._send_error(400, error)
+            return
+
+        name = "".join(ch for ch in str(name) if ch.isalnum() or ch in "-_")[:64] or "upload"
+        job = self.server.queue.submit(data, extension, name, style, options)
+        if job is None:
+            self._send_error(429, "очередь заполнена, повторите позже",
+                             {"Retry-After": str(self.server.retry_after)})
+            return
+        self._send_json(202, job_view(job), {"Location": f"/jobs/{job['id']}"})
+
+
+class JobServer(ThreadingHTTPServer):
+    """HTTP-сервер заданий: каждый клиент в своём потоке, обработка - в пуле процессов"""
+
+    daemon_threads = True
+
+    def __init__(self, address, queue, max_upload_mb=50, retry_after=5, quiet=False):
+        super().__init__(address, JobRequestHandler)
+        self.queue = queue
+        self.max_upload = int(max_upload_mb * 1024 * 1024)
+        self.retry_after = retry_after
+        self.quiet = quiet
+
+
+def main():
+    config = AppConfig.SERVER_CONFIG
+    parser = argparse.ArgumentParser(description="Локальный сервис обработки изображений в G-code")
+    parser.add_argument("--host", default=config["host"], help="Адрес (по умолчанию только localhost)")
+    parser.add_argument("--port", type=int, default=config["port"])
+    parser.add_argument("--workers", type=int, default=config["workers"], help="Процессов обработки")
+    parser.add_argument("--max-pending", type=int, default=config["max_pending"],
+                        help="Заданий в очереди и в работе, дальше - ответ 429")
+    parser.add_argument("--project", default=AppConfig.PROJECT_ROOT, help="Папка проекта")
+    parser.add_argument("--quiet", action="store_true", help="Не писать журнал запросов")
+    args = parser.parse_args()
+
+    queue = JobQueue({"project_root": args.project, "workers": args.workers,
+                      "max_pending": args.max_pending, "history": config["history"]})
+    server = JobServer((args.host, args.port), queue, config["max_upload_mb"],
+                       config["retry_after"], args.quiet)
+    host, port = server.server_address[:2]
+    print(f"Сервис заданий: http://{host}:{port} (процессов: {queue.workers}, "
+          f"очередь: {args.max_pending})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        queue.shutdown()
+
+
+if __name__ == "__main__":
+    main()
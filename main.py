@@ -1,7 +1,73 @@
-import tkinter as tk
-from gui.app import AdvancedCNCApp
+import argparse
+import sys
+
+
+def run_headless(args):
+    """Обработка без GUI: изображение или SVG/DXF → превью и G-code, метрики в JSON"""
+    from core.project_manager import ProjectManager
+    from core.image_processor import ImageProcessor
+    from utils.config import AppConfig
+    from utils.metrics import metrics
+
+    config = AppConfig.IMAGE_CONFIG.copy()
+    config['GCODE_CONFIG'] = AppConfig.GCODE_CONFIG
+    if args.budget is not None:
+        config['GCODE_CONFIG'] = {**AppConfig.GCODE_CONFIG, "time_budget": args.budget}
+    config['STYLE_CONFIG'] = AppConfig.STYLE_CONFIG
+    config['VECTOR_CONFIG'] = AppConfig.VECTOR_CONFIG
+    if args.contours:
+        config['contour_extractor'] = args.contours
+
+    if args.metrics:
+        metrics.enable(track_memory=not args.no_memory)
+
+    processor = ImageProcessor(ProjectManager(AppConfig.PROJECT_ROOT), config)
+    if args.image.lower().endswith((".svg", ".dxf")):
+        # Векторный чертёж - сразу в G-code, стиль не применяется
+        result = processor.process_vector(args.image)
+    else:
+        result = processor.process_image(args.image, style=args.style)
+
+    if result.get('import_report'):
+        from core.vector_import import format_report
+        print(format_report(result['import_report']))
+    if result['cached']:
+        print("Результат взят из хранилища (то же изображение и параметры)")
+    print(f"Превью: {result['preview']}")
+    print(f"G-code: {result['gcode']} ({result['commands_count']} команд, "
+          f"{result['contours_count']} контуров)")
+    feed_report = result['report'].get('adaptive_feed')
+    if feed_report:
+        print(f"Адаптивная подача: рисование {feed_report['time_constant']:.1f} -> "
+              f"{feed_report['time_adaptive']:.1f} с, смен F: {feed_report['feed_changes']}")
+    budget_report = result['report'].get('budget')
+    if budget_report:
+        from core.budget_planner import format_report as format_budget_report
+        print(format_budget_report(budget_report))
+    if args.metrics:
+        metrics.dump_json(args.metrics)
+        print(f"Метрики: {args.metrics}")
+
+
+def run_gui():
+    import tkinter as tk
+    from gui.app import AdvancedCNCApp
 
-if __name__ == "__main__":
     root = tk.Tk()
     app = AdvancedCNCApp(root)
-    root.mainloop()
\ No newline at end of file
+    root.mainloop()
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        parser = argparse.ArgumentParser(description="Фото → G-code без графического интерфейса")
+        parser.add_argument("image", help="Путь к изображению или чертежу SVG/DXF")
+        parser.add_argument("--style", default="sketch", help="Стиль обработки")
+        parser.add_argument("--budget", type=float, help="Минут на рисунок (лучшие контуры)")
+        parser.add_argument("--contours", choices=["findContours", "isolines"],
+                            help="Поиск контуров: границы пикселей или субпиксельные изолинии")
+        parser.add_argument("--metrics", help="Сохранить метрики этапов в JSON")
+        parser.add_argument("--no-memory", action="store_true", help="Не замерять пиковую память")
+        run_headless(parser.parse_args())
+    else:
+        run_gui()
@@ -7,7 +7,7 @@ class AppConfig:
     # Стили изображений
     STYLES = {
         "simple": ["sketch", "contour", "silhouette", "blurred"],
-        "advanced": ["pencil", "pen_hatching", "makelangelo5", "portrait"]
+        "advanced": ["pencil", "pen_hatching", "makelangelo5", "portrait", "stipple"]
     }
     
     # Настройки G-code - ВЫКЛЮЧАЕМ случайности для точного соответствия
@@ -21,17 +21,140 @@ class AppConfig:
         "pen_up_delay": 0.3,
         "pen_down_delay": 0.3,
         "randomize_contours": False,  # ВЫКЛЮЧЕНО - контуры в естественном порядке
-        "add_noise": False           # ВЫКЛЮЧЕНО - без случайных смещений
+        "add_noise": False,          # ВЫКЛЮЧЕНО - без случайных смещений
+        "calibration_file": None,    # JSON модели калибровки (calibration/calibration_model.py)
+        "remove_overdraw": False,    # Вырезать участки, повторяющие нарисованные линии
+        "pen_width": 0.5,            # Ширина линии пера, мм
+        "adaptive_feed": False,      # Подача по кривизне (быстрее на прямых, медленнее в изгибах)
+        "feed_rate_min": 300,        # мм/мин в крутых изгибах
+        "feed_rate_max": 1500,       # мм/мин на длинных прямых
+        "feed_corner_angle": 90,     # Поворот в градусах, считающийся острым углом
+        "feed_straight_length": 5.0, # мм - отрезок такой длины идёт на максимальной подаче
+        "feed_step": 100,            # Шаг квантования подачи (реже команды F)
+        "time_budget": None,         # Минут на рисунок (None - рисовать всё)
+        "budget_area_weight": 0.5    # Вклад площади контура в его ценность
     }
     
     # Настройки обработки изображений - улучшаем качество контуров
     IMAGE_CONFIG = {
-        "image_size": (400, 400),
+        "image_size": (400, 400),    # Если working_size не задан - жёсткий размер
+        "fit_mode": "pad",           # Приведение к image_size: pad (поля), fit или stretch
+        "working_size": 1000,        # Рабочее разрешение (бо́льшая сторона) для стиля и G-code
+        "preview_size": 320,         # Разрешение прокси для сравнения стилей в превью
         "epsilon_factor": 0.005,     # Уменьшено для более точных контуров
         "min_contour_length": 5,     # Увеличено для фильтрации мелких шумов
+        "contour_workers": None,     # Потоки для упрощения контуров (None - все ядра)
+        "contour_batch_size": 2000,  # Контуров в одной пачке упрощения
+        "contour_extractor": "findContours",  # Или "isolines" - субпиксельные изолинии серого
+        "iso_levels": (128,),        # Уровни яркости изолиний
+        "iso_smoothing": 0.0,        # Сигма размытия перед изолиниями, пиксели (0 - без)
         "GCODE_CONFIG": GCODE_CONFIG
     }
     
+    # Параметры стилей (см. StyleConverter.DEFAULT_PARAMS)
+    STYLE_CONFIG = {}
+    
+    # Автоподбор параметров: сетка значений для перебора
+    AUTOTUNE_CONFIG = {
+        "grid": {
+            "epsilon_factor": [0.001, 0.0025, 0.005, 0.01, 0.02],
+            "min_contour_length": [5, 15, 40]
+        },
+        "style_grid": {
+            "sketch": {"blur_ksize": [11, 21, 31]},
+            "pencil": {"blur_ksize": [11, 21, 31]},
+            "contour": {"canny_low": [30, 50, 80], "canny_high": [120, 150, 200]},
+            "blurred": {"edge_threshold": [60, 80, 110]},
+            "makelangelo5": {"binary_threshold": [96, 128, 160]},
+            "portrait": {"portrait_step": [3, 5, 8]}
+        },
+        "tolerance": 2,          # Допуск совпадения линий, пиксели
+        "line_overhead": 0.02,   # Задержка на строку G-code (обмен с контроллером), сек
+        "workers": None          # None - все ядра
+    }
+    
+    # Планировщик движения (core/motion_planner.py)
+    MOTION_CONFIG = {
+        "steps_per_mm": (10.0, 10.0, 100.0),
+        "max_step_rate": (500, 500, 500),   # шаг/с по осям
+        "acceleration": 50.0,               # мм/с²
+        "junction_deviation": 0.05,         # мм
+        "start_step_rate": 250,             # шаг/с - текущая прошивка шагает так без разгона
+        "pen_z_mm": 0.0,                    # Ход пера по Z, 0 - перо управляется флагом блока
+        "honor_feed": True                  # F из файла ограничивает скорость (False - предел осей)
+    }
+    
+    # Оптимизатор готового G-code (core/gcode_optimizer.py)
+    GCODE_OPTIMIZER_CONFIG = {
+        "tolerance": None,       # Допуск слияния, мм (None - полшага сетки GCODE_CONFIG scale_x/scale_y)
+        "min_move": 1e-6,        # Перемещения короче считаются нулевыми, мм
+        "max_merge": 256,        # Предел точек в одной серии слияния
+        "line_overhead": 0.02    # Задержка на строку (как в AUTOTUNE_CONFIG), сек
+    }
+    
+    # Кодирование G-code для порта (core/wire_encoder.py)
+    WIRE_CONFIG = {
+        "enabled": True,
+        "baud_rate": 115200,
+        "compact": True,         # Без пробелов и комментариев - прошивка это понимает
+        "trim_zeros": True,      # X50.00 -> X50
+        "decimals": None,        # Без округления
+        "modal": False,          # Текущая прошивка требует G0/G1 и все оси в каждой строке
+        "relative": False        # G91 - только для контроллеров по стандарту (GRBL и т.п.)
+    }
+    
+    # Импорт SVG/DXF (core/vector_import.py)
+    VECTOR_CONFIG = {
+        "tolerance": 0.1,            # Отклонение хорд от кривых Безье, дуг и сплайнов, мм
+        "normalize": True,           # Левый верхний угол чертежа - в начало координат
+        "max_size_mm": None          # Вписать в квадрат такого размера (None - масштаб 1:1)
+    }
+    
+    # Поток отправки в порт (core/serial_streamer.py)
+    STREAM_CONFIG = {
+        "rx_buffer": 64,             # Приёмный буфер Arduino, байт
+        "poll_interval": 0.05,       # Период проверки паузы/отмены при ожидании ответа, сек
+        "ack_timeout": 30.0,         # Нет ответа так долго - ошибка связи, сек
+        "pen_up_command": "M5",
+        "pen_down_command": "M3 S0",
+        "feed_hold": None,           # Мгновенная остановка: "!" у GRBL, прошивка проекта не умеет
+        "cycle_start": None,         # "~" у GRBL
+        "soft_reset": None,          # "\x18" у GRBL
+        "log_lines": True            # Каждая строка и ответ - в лог (уровень "Отладка")
+    }
+    
+    # Локальный сервис заданий (job_server.py)
+    SERVER_CONFIG = {
+        "host": "127.0.0.1",         # Только локальная машина; 0.0.0.0 - вся сеть цеха
+        "port": 8765,
+        "workers": None,             # Процессов обработки (None - все ядра)
+        "max_pending": 8,            # Заданий в очереди и в работе, дальше - ответ 429
+        "history": 200,              # Сколько завершённых заданий помнить
+        "max_upload_mb": 50,         # Предел размера загрузки
+        "retry_after": 5             # Подсказка клиенту при 429, сек
+    }
+    
+    # Телеметрия отправки (core/telemetry.py)
+    TELEMETRY_CONFIG = {
+        "window": 50,                # Подтверждений в окне скорости
+        "line_overhead": 0.0,        # Обмен с контроллером на строку, сек
+        "refresh_interval_ms": 250   # Период обновления прогресса в GUI
+    }
+    
+    # Метрики этапов (utils/metrics.py)
+    METRICS_CONFIG = {
+        "enabled": True,         # Время по этапам - одна проверка флага и perf_counter на этап
+        "track_memory": False    # Пиковая память через tracemalloc (замедляет Python-код)
+    }
+    
+    # Лог в GUI (gui/components/log_panel.py)
+    LOG_CONFIG = {
+        "max_lines": 500,            # Видимая история в виджете
+        "history_size": 5000,        # Кольцевой буфер для перефильтрации
+        "flush_interval_ms": 100,    # Период вывода пачек в виджет
+        "levels": ["info", "warning", "error"]   # Уровни, видимые по умолчанию
+    }
+    
     # Цвета интерфейса
     COLORS = {
         "bg_primary": "#2c3e50",
@@ -1,3 +1,4 @@
+import re
 import cv2
 from PIL import Image, ImageTk
 import tkinter as tk
@@ -12,6 +13,15 @@ def cv2_to_tk(image):
     pil_img = Image.fromarray(rgb)
     return ImageTk.PhotoImage(pil_img)
 
+def resize_to_fit(image, max_side):
+    """Уменьшает изображение до max_side по большей стороне с сохранением пропорций"""
+    h, w = image.shape[:2]
+    scale = max_side / max(h, w)
+    if scale >= 1:
+        return image
+    new_size = (max(1, round(w * scale)), max(1, round(h * scale)))
+    return cv2.resize(image, new_size, interpolation=cv2.INTER_AREA)
+
 def create_button(parent, text, command, color, **kwargs):
     """Создает стилизованную кнопку"""
     return tk.Button(
@@ -20,12 +30,121 @@ def create_button(parent, text, command, color, **kwargs):
         cursor="hand2", padx=10, pady=8, overrelief="solid", **kwargs
     )
 
+_pygcode_line = None
+
+
 def validate_gcode_line(line_text):
     """Валидирует строку G-code (если доступен pygcode)"""
+    global _pygcode_line
+    if _pygcode_line is None:
+        # Импорт проверяем один раз, а не на каждой строке
+        try:
+            from pygcode import Line
+            _pygcode_line = Line
+        except ImportError:
+            _pygcode_line = False
+    if not _pygcode_line:
+        return True
     try:
-        from pygcode import Line
-        Line(line_text)
+        _pygcode_line(line_text)
+        return True
+    except Exception:
+        # Если произошла ошибка разбора, пропускаем валидацию
         return True
-    except (ImportError, Exception):
-        # Если pygcode недоступен или произошла ошибка, пропускаем валидацию
-        return True
\ No newline at end of file
+
+# Слово G-code: буква и число - и в обычной, и в компактной записи без пробелов (G1X10Y5)
+_GCODE_WORD = re.compile(r"([A-Za-z])\s*([-+]?(?:\d+\.?\d*|\.\d+))")
+_GCODE_COMMENT = re.compile(r"\([^)]*\)|;.*")
+
+
+def split_gcode_words(line_text):
+    """Слова строки G-code без комментариев: [(буква, число как текст)]"""
+    return [(letter.upper(), value)
+            for letter, value in _GCODE_WORD.findall(_GCODE_COMMENT.sub("", line_text))]
+
+
+def parse_gcode_words(line_text):
+    """Разбирает строку G-code в словарь {буква: число}"""
+    return {letter: float(value) for letter, value in split_gcode_words(line_text)}
+
+
+def move_time(distance, feed):
+    """Время перемещения distance (мм) на подаче feed (мм/мин), сек
+
+    Общая модель времени оценщика, планировщика бюджета и генератора;
+    работает и с массивами NumPy.
+    """
+    return distance / feed * 60.0
+
+
+class GCodeTimeEstimator:
+    """Пошаговая оценка времени G-code: строки подаются по одной через add()
+
+    Учитывает подачу F, паузы G4, G90/G91 и модальный G0/G1 (строка без G
+    после перемещения). Время и позиция после строки - total_time, x, y.
+    """
+
+    def __init__(self, default_feed=500.0, line_overhead=0.0):
+        self.line_overhead = line_overhead
+        self.x = self.y = 0.0
+        self.feed = default_feed
+        self.motion = None
+        self.relative = False
+        self.draw_distance = 0.0
+        self.travel_distance = 0.0
+        self.total_time = 0.0
+        self.lines_count = 0
+
+    def add(self, line_text):
+        words = parse_gcode_words(line_text)
+        if not words:
+            return
+        self.lines_count += 1
+        self.total_time += self.line_overhead
+
+        code = words.get('G')
+        if code in (0, 1):
+            self.motion = code
+        elif code == 90:
+            self.relative = False
+        elif code == 91:
+            self.relative = True
+        if 'F' in words:
+            self.feed = words['F']
+        if code == 4:
+            self.total_time += words.get('P', 0.0)
+            return
+        if self.motion is None or code not in (None, 0, 1) or \
+                ('X' not in words and 'Y' not in words):
+            return
+
+        if self.relative:
+            new_x = self.x + words.get('X', 0.0)
+            new_y = self.y + words.get('Y', 0.0)
+        else:
+            new_x = words.get('X', self.x)
+            new_y = words.get('Y', self.y)
+        distance = ((new_x - self.x) ** 2 + (new_y - self.y) ** 2) ** 0.5
+        if self.motion == 0:
+            self.travel_distance += distance
+        else:
+            self.draw_distance += distance
+        if self.feed > 0:
+            self.total_time += move_time(distance, self.feed)
+        self.x, self.y = new_x, new_y
+
+    def result(self):
+        return {
+            'time': self.total_time,
+            'draw_distance': self.draw_distance,
+            'travel_distance': self.travel_distance,
+            'lines': self.lines_count
+        }
+
+
+def estimate_gcode_time(gcode_lines, default_feed=500.0, line_overhead=0.0):
+    """Оценивает время выполнения G-code (секунды) и длины рисования/перемещений (мм)"""
+    estimator = GCodeTimeEstimator(default_feed, line_overhead)
+    for line_text in gcode_lines:
+        estimator.add(line_text)
+    return estimator.result()
@@ -0,0 +1,162 @@
+import functools
+import json
+import threading
+import time
+import tracemalloc
+
+
+class _NullStage:
+    """Заглушка этапа при выключенных метриках - ничего не делает"""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+    def count(self, items):
+        pass
+
+
+_NULL_STAGE = _NullStage()
+
+
+class _Stage:
+    """Замер одного этапа: время, пиковая память, число элементов
+
+    Пик tracemalloc общий на весь процесс, поэтому память меряет только этап,
+    начатый, когда никакой другой её не мерил (внешний): вложенные этапы и
+    этапы других потоков пик не сбрасывают и память не записывают.
+    """
+
+    def __init__(self, metrics, name, items):
+        self.metrics = metrics
+        self.name = name
+        self.items = items
+        self.start_time = 0.0
+        self.start_memory = 0
+
+    def count(self, items):
+        self.items = items
+
+    def __enter__(self):
+        metrics = self.metrics
+        if metrics.track_memory and tracemalloc.is_tracing():
+            with metrics._lock:
+                if metrics._memory_owner is None:
+                    metrics._memory_owner = self
+                    tracemalloc.reset_peak()
+                    self.start_memory = tracemalloc.get_traced_memory()[0]
+        self.start_time = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        elapsed = time.perf_counter() - self.start_time
+        metrics = self.metrics
+
+        peak_memory = 0
+        if metrics._memory_owner is self:
+            with metrics._lock:
+                metrics._memory_owner = None
+                if tracemalloc.is_tracing():
+                    peak_memory = tracemalloc.get_traced_memory()[1] - self.start_memory
+
+        metrics._record(self.name, elapsed, peak_memory, self.items)
+        return False
+
+
+class Metrics:
+    """Сбор времени и памяти по этапам конвейера
+
+    Выключенный сборщик возвращает заглушку, поэтому накладные расходы -
+    одна проверка флага на этап. Пиковая память пишется только для внешних
+    этапов (см. _Stage).
+    """
+
+    def __init__(self, enabled=False, track_memory=True):
+        self.enabled = False
+        self.track_memory = track_memory
+        self.stages = {}
+        self._lock = threading.Lock()
+        self._memory_owner = None   # этап, который сейчас меряет память
+        self._started_tracing = False   # tracemalloc запущен нами, а не кем-то ещё
+        if enabled:
+            self.enable(track_memory)
+
+    def enable(self, track_memory=True):
+        self.enabled = True
+        self.track_memory = track_memory
+        if track_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracing = True
+
+    def disable(self):
+        self.enabled = False
+        # Чужую трассировку (отладчик, профилировщик) не останавливаем
+        if self._started_tracing and tracemalloc.is_tracing():
+            tracemalloc.stop()
+        self._started_tracing = False
+
+    def reset(self):
+        with self._lock:
+            self.stages = {}
+
+    def _record(self, name, elapsed, peak_memory, items):
+        with self._lock:
+            stage = self.stages.get(name)
+            if stage is None:
+                stage = self.stages[name] = {'calls': 0, 'time': 0.0, 'peak_memory': 0,
+                                             'items': 0}
+            stage['calls'] += 1
+            stage['time'] += elapsed
+            stage['peak_memory'] = max(stage['peak_memory'], peak_memory)
+            if items:
+                stage['items'] += items
+
+    def stage(self, name, items=None):
+        """Контекстный менеджер замера этапа"""
+        if not self.enabled:
+            return _NULL_STAGE
+        return _Stage(self, name, items)
+
+    def timed(self, name=None):
+        """Декоратор замера функции"""
+        def decorator(func):
+            stage_name = name or func.__qualname__
+
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return func(*args, **kwargs)
+                with _Stage(self, stage_name, None):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def to_dict(self):
+        """Снимок метрик: {этап: {calls, time, peak_memory, items}}"""
+        with self._lock:
+            return {name: dict(stage) for name, stage in self.stages.items()}
+
+    def summary_lines(self):
+        """Строки для лога: самые долгие этапы первыми"""
+        lines = []
+        stages = sorted(self.to_dict().items(), key=lambda item: item[1]['time'], reverse=True)
+        for name, stage in stages:
+            line = f"{name}: {stage['time'] * 1000:.1f} мс"
+            if stage['calls'] > 1:
+                line += f" ({stage['calls']} вызовов)"
+            if stage['peak_memory']:
+                line += f", пик {stage['peak_memory'] / 1024 / 1024:.1f} МБ"
+            if stage['items']:
+                line += f", {stage['items']} шт."
+            lines.append(line)
+        return lines
+
+    def dump_json(self, path):
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.to_dict(), f, ensure_ascii=False, indent=2)
+
+
+# Общий сборщик для всего приложения
+metrics = Metrics()